@@ -21,12 +21,14 @@ from database.database_manager import DatabaseManager
 from logic.performance_evaluator import PerformanceEvaluator
 from logic.result_generator import ResultGenerator
 from logic.testcase_pipeline import TestcasePipeline
+from logic.calibration import Calibration
 from logic.oralexam_functions import OralExamFunctions
 from logic.mark_manual import Manual
 from util.argument_extractor import ArgumentExtractor
 from util.lockfile import LockFile
 from util.playground import Playground
 
+# only held by commands writing to the database
 LOCK_FILE_PATH='/run/lock/check.lock'
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
@@ -50,7 +52,8 @@ def run():
         argument_extractor=ArgumentExtractor()
         global args
         args=argument_extractor.get_arguments()
-        database_manager=DatabaseManager()
+        # the schema is only updated while holding the lock, see writes_database()
+        database_manager=DatabaseManager(migrate=writes_database(args))
 
         # If -f or --fetch-only: Fetch new submission from moodle.
         # If not fetch only also executes and evaluates them
@@ -62,6 +65,11 @@ def run():
             if args.fetch_only:
                 exit(0)
 
+        # Measures the resource usage of the reference solution for all testcases. Requires flag --calibrate
+        if args.calibrate:
+            calibration=Calibration(args)
+            calibration.run()
+
         if args.check or args.all or args.unpassed:
             pipeline=TestcasePipeline(args)
             pipeline.run()
@@ -123,6 +131,25 @@ def run():
             pass
 
 
+def writes_database(arguments):
+    """
+    Decides whether the commandline arguments contain a command which writes to the database.
+    Only one process writing to the database may run at a time. Reports (-s, -d, -g, -p) only read,
+    so they can run while submissions are checked. They do not update the schema of the database either.
+    Parameters:
+        arguments (Namespace object): commandline arguments
+    Returns:
+        Boolean
+    """
+    return bool(arguments.fetch or arguments.fetch_only or arguments.load_tests or arguments.calibrate
+                or arguments.check or arguments.all or arguments.unpassed
+                or arguments.mail_to_all or arguments.mailto or arguments.oralexam or arguments.revert
+                or arguments.mark_manual or arguments.test or arguments.playground)
+
+
 if __name__=="__main__":
-    with LockFile(LOCK_FILE_PATH):
+    if writes_database(ArgumentExtractor().get_arguments()):
+        with LockFile(LOCK_FILE_PATH):
+            run()
+    else:
         run()
@@ -5,12 +5,14 @@ from util.absolute_path_resolver import resolve_absolute_path
 
 """
 The eval pipline uses an SQLite database. Here the connection to the database is established.
+The database is used in WAL mode, so reports can read it while submissions are checked and written to it.
+Only one process writes to the database at a time, see check.py. The schema is only updated by this process.
 """
 
 from util.config_reader import ConfigReader
 from util.colored_massages import Warn
 
-from sqlalchemy import create_engine, and_, or_
+from sqlalchemy import create_engine, inspect, event, and_, or_
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, backref, sessionmaker
 from database.base import Base
@@ -20,21 +22,37 @@ import database.runs as r
 import database.testcases as tc
 from database.testcase_results import TestcaseResult
 from database.valgrind_outputs import ValgrindOutput
+from database.run_summaries import RunSummary
 
 session=None
 
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
 
+# pragmas set on every connection, can be overwritten by SQLITE_PRAGMAS in config_database_manager.config.
+# With WAL, readers do not block the writer and the other way round. synchronous=NORMAL only syncs the WAL
+# at checkpoints, a commit can therefore be lost on power failure, but the database stays consistent.
+SQLITE_PRAGMAS={
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+    # milliseconds a connection waits for a lock held by another process
+    "busy_timeout": 30000,
+}
+
 
 class DatabaseManager:
 
-    def __init__(self):
+    def __init__(self, migrate=False):
         """
         Creates a new database at the location described by the config_database_manager.config at DATABASE_PATH.
         
         Parameters:
-            None. Requires file "/resources/config_database_manager.config" exists and has the entry "DATABASE_PATH".
+            migrate (Boolean): Whether missing tables, columns and indexes are created. Only the process holding
+                the lock of check.py may do so, others only warn about an outdated database. Optional.
+            Requires file "/resources/config_database_manager.config" exists and has the entry "DATABASE_PATH".
             
         Return:
             Nothing
@@ -44,8 +62,85 @@ class DatabaseManager:
         configuration=ConfigReader().read_file(str(p))
         db_path=resolve_absolute_path(configuration["DATABASE_PATH"])
         engine=create_engine('sqlite:///'+str(db_path), echo=False)
-        Base.metadata.create_all(engine, checkfirst=True)
+        pragmas=dict(SQLITE_PRAGMAS, **configuration.get("SQLITE_PRAGMAS", {}))
+        event.listen(engine, "connect", lambda connection, record: set_pragmas(connection, pragmas))
+        if migrate:
+            Base.metadata.create_all(engine, checkfirst=True)
+            add_missing_columns(engine)
+        else:
+            tables, columns, indexes=missing_schema(engine)
+            if tables or columns or indexes:
+                logging.warning(f"The database lacks {len(tables)} tables, {len(columns)} columns and {len(indexes)} "
+                                f"indexes. They are added by the next command writing to the database, e.g. check -f.")
         Session=sessionmaker(bind=engine)
         global session
         session=Session()
         logging.info("Database created/accessed:"+str(db_path))
+
+
+def set_pragmas(connection, pragmas):
+    """
+    Sets pragmas on a new connection to the database.
+
+    Parameters:
+        connection (sqlite3.Connection object): DBAPI connection
+        pragmas (dict): values of the pragmas by name
+
+    Returns:
+        Nothing
+    """
+    cursor=connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def missing_schema(engine):
+    """
+    Compares the database with the models without changing it.
+
+    Parameters:
+        engine (Engine object): engine connected to the database
+
+    Returns:
+        tables (list of Table objects): tables which do not exist
+        columns (list of Column objects): columns which do not exist in existing tables
+        indexes (list of Index objects): indexes which do not exist on existing tables
+    """
+    inspector=inspect(engine)
+    existing_tables=inspector.get_table_names()
+    tables, columns, indexes=[], [], []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            tables.append(table)
+            continue
+        existing=[column["name"] for column in inspector.get_columns(table.name)]
+        columns+=[column for column in table.columns if column.name not in existing]
+        existing_indexes=[index["name"] for index in inspector.get_indexes(table.name)]
+        indexes+=[index for index in table.indexes if index.name not in existing_indexes]
+    return tables, columns, indexes
+
+
+def add_missing_columns(engine):
+    """
+    Adds columns and indexes which were added to the models after the database was created.
+    create_all() only creates missing tables, so new nullable columns of existing tables and missing indexes
+    are added here. If indexes were added, the statistics of the query planner are updated, so it uses them.
+    Must only be called by the process holding the lock of check.py.
+
+    Parameters:
+        engine (Engine object): engine connected to the database
+
+    Returns:
+        Nothing
+    """
+    _, columns, indexes=missing_schema(engine)
+    for column in columns:
+        column_type=column.type.compile(engine.dialect)
+        engine.execute(f'ALTER TABLE "{column.table.name}" ADD COLUMN "{column.name}" {column_type}')
+        logging.info(f"Added column {column.name} to table {column.table.name}.")
+    for index in indexes:
+        index.create(engine)
+        logging.info(f"Added index {index.name} to table {index.table.name}.")
+    if indexes:
+        engine.execute("ANALYZE")
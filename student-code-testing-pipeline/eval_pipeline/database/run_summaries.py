@@ -0,0 +1,146 @@
+"""
+SQL Alchemy classed used to create table "RunSummary". Also contains functions that query the database for table "RunSummary".
+A RunSummary contains the number of failed testcases per type and failure reason, whether the testcases passed
+and aggregated timings of a run. It is written once at the end of every check (see TestcasePipeline.finish_check()),
+so reports and mails do not have to count the TestcaseResults of a run again.
+"""
+
+import logging
+from sqlalchemy import *
+from database.base import Base
+from sqlalchemy.orm import relationship, backref
+from sqlalchemy.sql import expression
+from database.testcase_results import TestcaseResult
+from database.testcases import Testcase
+from database.valgrind_outputs import ValgrindOutput
+import database.database_manager as dbm
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+
+class RunSummary(Base):
+    __tablename__='RunSummary'
+    # Columns for the table "RunSummary"
+    id=Column(Integer, primary_key=True)
+    run_id=Column(Integer, ForeignKey("Run.id"), nullable=False, unique=True)
+
+    # number of executed testcases per type
+    bad_count=Column(Integer, default=0, server_default='0')
+    good_count=Column(Integer, default=0, server_default='0')
+    bad_or_output_count=Column(Integer, default=0, server_default='0')
+
+    # failed testcases as returned by TestcaseResult.get_failed_bad(), get_failed_good()
+    # and get_failed_output_bad_or_output()
+    bad_failed=Column(Integer, default=0, server_default='0')
+    good_failed=Column(Integer, default=0, server_default='0')
+    bad_or_output_failed=Column(Integer, default=0, server_default='0')
+
+    # failed testcases of all types per failure reason
+    output_failed=Column(Integer, default=0, server_default='0')
+    valgrind_failed=Column(Integer, default=0, server_default='0')
+    timeouts=Column(Integer, default=0, server_default='0')
+    segfaults=Column(Integer, default=0, server_default='0')
+    output_overflows=Column(Integer, default=0, server_default='0')
+
+    # the run compiled and none of its testcases failed
+    passed=Column(Boolean, default=False, server_default=expression.false())
+
+    # timings of the testcases with type "GOOD"
+    cpu_time_total=Column(Float)
+    tictoc_avg=Column(Float)
+    tictoc_max=Column(Float)
+    mrss_avg=Column(Float)
+    mrss_max=Column(Integer)
+
+    run=relationship("Run", backref=backref("summary", uselist=False))
+
+    def __init__(self, run_id):
+        self.run_id=run_id
+
+    def __repr__(self):
+        return ("(RunSummary: "+str(self.id)+","+
+                str(self.run_id)+","+
+                str(self.bad_failed)+"/"+str(self.bad_count)+","+
+                str(self.good_failed)+"/"+str(self.good_count)+","+
+                str(self.bad_or_output_failed)+"/"+str(self.bad_or_output_count)+","+
+                str(self.passed)+")")
+
+    def count(self, run):
+        """
+        Counts the TestcaseResults of a run with a single query and sets all columns of the summary.
+        Parameters:
+            run (Run object)
+        Returns: Nothing
+        """
+        failed=or_(ValgrindOutput.ok==False, TestcaseResult.output_correct==False)
+        bad=or_(Testcase.type=="BAD", Testcase.type=="BAD_OR_OUTPUT")
+        good=Testcase.type=="GOOD"
+
+        def number(condition):
+            return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+        def of_good(column):
+            return case((good, column), else_=None)
+
+        row=dbm.session.query(
+            number(Testcase.type=="BAD"),
+            number(good),
+            number(Testcase.type=="BAD_OR_OUTPUT"),
+            number(and_(bad, failed)),
+            number(and_(good, failed)),
+            number(and_(Testcase.type=="BAD_OR_OUTPUT", TestcaseResult.output_correct==False)),
+            number(TestcaseResult.output_correct==False),
+            number(ValgrindOutput.ok==False),
+            number(failed),
+            number(TestcaseResult.timeout==True),
+            number(TestcaseResult.segfault==True),
+            number(TestcaseResult.output_overflow==True),
+            func.sum(of_good(TestcaseResult.cpu_time)),
+            func.avg(of_good(TestcaseResult.tictoc)),
+            func.max(of_good(TestcaseResult.tictoc)),
+            func.avg(of_good(TestcaseResult.mrss)),
+            func.max(of_good(TestcaseResult.mrss))) \
+            .select_from(TestcaseResult) \
+            .join(Testcase, Testcase.id==TestcaseResult.testcase_id) \
+            .join(ValgrindOutput, ValgrindOutput.testcase_result_id==TestcaseResult.id, isouter=True) \
+            .filter(TestcaseResult.run_id==run.id) \
+            .one()
+        (self.bad_count, self.good_count, self.bad_or_output_count,
+         self.bad_failed, self.good_failed, self.bad_or_output_failed,
+         self.output_failed, self.valgrind_failed, all_failed, self.timeouts, self.segfaults, self.output_overflows,
+         self.cpu_time_total, self.tictoc_avg, self.tictoc_max, self.mrss_avg, self.mrss_max)=row
+        self.passed=all_failed==0 and run.compilation_return_code==0
+
+    @classmethod
+    def update_for_run(cls, run):
+        """
+        Creates or updates the summary of a run from its TestcaseResults. Does not commit to database!
+        Parameters:
+            run (Run object)
+        Returns:
+            RunSummary object
+        """
+        summary=dbm.session.query(RunSummary).filter_by(run_id=run.id).first()
+        if summary is None:
+            summary=RunSummary(run.id)
+            summary.run=run
+            dbm.session.add(summary)
+        summary.count(run)
+        return summary
+
+    @classmethod
+    def get_for_run(cls, run):
+        """
+        Gets the summary of a run. It is not queried again if it was loaded together with the run.
+        For runs which were checked before summaries were stored, the summary is computed but not added to the database.
+        Parameters:
+            run (Run object)
+        Returns:
+            RunSummary object
+        """
+        summary=run.summary
+        if summary is None:
+            summary=RunSummary(run.id)
+            summary.count(run)
+        return summary
@@ -9,12 +9,13 @@ import logging
 from functools import cmp_to_key
 from sqlalchemy import *
 from database.base import Base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, joinedload
 from sqlalchemy.sql import expression
 import database.database_manager as dbm
 from database.testcase_results import TestcaseResult
 from database.valgrind_outputs import ValgrindOutput
 from database.testcases import Testcase
+from database.run_summaries import RunSummary
 import database.submissions as sub
 import database.students as stud
 
@@ -39,6 +40,10 @@ class Run(Base):
     # foreign key relationship to table TestcaseResult
     testcase_results=relationship("TestcaseResult", backref="Run.id")
 
+    # existing runs are looked up by submission and compilation, see insert_run()
+    __table_args__=(Index('ix_Run_submission_id_command_line_careless_flag',
+                          submission_id, command_line, careless_flag),)
+
     def __init__(self, submission_id, command_line, careless_flag, compilation_return_code, compiler_output):
         """
         Create new row for table "Run".
@@ -62,27 +67,12 @@ class Run(Base):
                 str(self.compilation_return_code)+","+
                 str(self.compiler_output)+")")
 
-    @classmethod
-    def is_passed(cls, r):
-        """
-        Check for run r if it is  passed.
-        Parameters:
-            r (Run object)
-        Returns:
-            Boolean
-        """
-        count=dbm.session.query(TestcaseResult) \
-            .join(ValgrindOutput, isouter=True) \
-            .filter(TestcaseResult.run_id==r.id) \
-            .filter(or_(ValgrindOutput.ok==False, TestcaseResult.output_correct==False)).count()
-        if count==0 and r.compilation_return_code==0:
-            return True
-        return False
-
     @classmethod
     def insert_run(cls, run):
         """
         Inserts a run into table "Run" if it does not already exist. Checks submission_id, command_line and careless_flag.
+        The run is only flushed, so it gets its ID, and is committed together with the results of its check.
+        Does not commit to database!
         Parameters:
             run (Run object)
         Returns:
@@ -93,27 +83,43 @@ class Run(Base):
             .filter(Run.submission_id==run.submission_id, Run.command_line==run.command_line, Run.careless_flag==run.careless_flag).first()
         if exists is None:
             dbm.session.add(run)
-            dbm.session.commit()
+            dbm.session.flush()
             return run
         return exists
 
     @classmethod
     def get_last_for_submission(cls, submission):
         """
-        Gets last run for a specific submission which passed. 
+        Gets last run for a specific submission which passed. The summary of the run is loaded with it.
         Parameters:
             submission (Submission object)
         Returns:
             run or None        
         """
-        run=dbm.session.query(Run)\
+        run=dbm.session.query(Run).options(joinedload(Run.summary))\
             .filter(Run.submission_id==submission.id, Run.passed==True)\
             .order_by(Run.execution_time.desc()).first()
         if run is None:
-            run=dbm.session.query(Run).filter(Run.submission_id==submission.id).order_by(
-                Run.execution_time.desc()).first()
+            run=dbm.session.query(Run).options(joinedload(Run.summary)).filter(Run.submission_id==submission.id)\
+                .order_by(Run.execution_time.desc()).first()
         return run
 
+    @staticmethod
+    def select_last(runs):
+        """
+        Selects the last run from already loaded runs of a submission, like get_last_for_submission() does.
+        Parameters:
+            runs (list of Run objects): runs of the same submission
+        Returns:
+            run or None
+        """
+        passed=[run for run in runs if run.passed]
+        candidates=passed if len(passed)>0 else runs
+        if len(candidates)==0:
+            return None
+        # runs without execution time are ordered last, as in the database
+        return max(candidates, key=lambda run: (run.execution_time is not None, run.execution_time or 0))
+
     @staticmethod
     def comperator_performance(run1, run2):
         """
@@ -7,11 +7,12 @@ Submissions are handed in via Moodle and need to be regularly retried from the M
 import logging
 from sqlalchemy import *
 from database.base import Base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, contains_eager
 from sqlalchemy.sql import expression, or_
 import database.database_manager as dbm
 from database.students import Student
 from database.runs import Run
+from database.run_summaries import RunSummary
 
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
@@ -32,6 +33,9 @@ class Submission(Base):
     # foreign key relationship with table "Run"
     runs=relationship("Run", backref="Submission.id")
 
+    # submissions of a student are selected by whether they were checked
+    __table_args__=(Index('ix_Submission_student_id_is_checked', student_id, is_checked),)
+
     def __init__(self, student_id, submission_path):
         self.student_id=student_id
         self.submission_path=submission_path
@@ -82,6 +86,20 @@ class Submission(Base):
             .filter(Submission.is_checked!=True).all()
         return submissions
 
+    @classmethod
+    def get_by_id(cls, submission_id):
+        """
+        Get a submission and the student who handed it in using the ID of the submission.
+        Parameters:
+            submission_id (int)
+        Returns:
+            Pair containing a Submission and a Student object or None
+        """
+        submission=dbm.session.query(Submission, Student)\
+            .join(Student)\
+            .filter(Submission.id==submission_id).first()
+        return submission
+
     @classmethod
     def get_not_checked_for_name(cls, student_name):
         """
@@ -110,6 +128,31 @@ class Submission(Base):
             .filter(Student.name==student_name).all()
         return submissions_student
 
+    @classmethod
+    def get_all_with_runs(cls, unpassed=False):
+        """
+        Get all submissions together with their students and runs using a single query.
+        The summaries of the runs are loaded with the runs, see RunSummary.
+        The rows are ordered by student and submission and are fetched in batches while iterating over them,
+        so they can be printed before the query is completed.
+        Parameters:
+            unpassed (Boolean): Only get the submissions of students without a passed run. Optional.
+        Returns:
+            Iterator over tuples each containing a Student, a Submission and a Run object.
+            The Run is None for submissions without runs, submissions with several runs have several rows.
+        """
+        query=dbm.session.query(Student, Submission, Run) \
+            .join(Submission, Submission.student_id==Student.id) \
+            .outerjoin(Run, Run.submission_id==Submission.id) \
+            .outerjoin(RunSummary, RunSummary.run_id==Run.id) \
+            .options(contains_eager(Run.summary))
+        if unpassed:
+            passed_run=dbm.session.query(Run.id) \
+                .join(Submission, Submission.id==Run.submission_id) \
+                .filter(Submission.student_id==Student.id, Run.passed==True)
+            query=query.filter(~passed_run.exists())
+        return query.order_by(Student.id, Submission.id).yield_per(500)
+
     @classmethod
     def get_last_for_name(cls, name):
         """
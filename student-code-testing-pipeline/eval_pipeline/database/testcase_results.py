@@ -8,7 +8,7 @@ For TestcaseResults where the Testcase requires an analysis with Valgrind, a cor
 import logging
 from sqlalchemy import *
 from database.base import Base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, joinedload
 from database.testcases import Testcase
 from database.valgrind_outputs import ValgrindOutput
 import database.database_manager as dbm
@@ -29,6 +29,7 @@ class TestcaseResult(Base):
     signal=Column(Integer)
     segfault=Column(Boolean)
     timeout=Column(Boolean)
+    output_overflow=Column(Boolean)  # output exceeded the limit and the submission was terminated
     cpu_time=Column(Float)
     tictoc=Column(Float)
     mrss=Column(Integer)
@@ -40,6 +41,8 @@ class TestcaseResult(Base):
     used_valgrind_stack=Column(Integer)
     used_valgrind_cpu=Column(Integer)
     num_executions=Column(Integer)
+    # identifies executable, testcase, limits and sandbox of the execution, see TestcaseExecutor.cache_key()
+    cache_key=Column(String, index=True)
 
     # only relevant for testcases that test if the submission fails successfully
     error_msg_quality=Column(Integer)
@@ -48,6 +51,9 @@ class TestcaseResult(Base):
     # foreign key relationship to table TestcaseResult
     valgrind_results=relationship("ValgrindOutput", uselist=False, backref="TestcaseResult.id")
 
+    # the results of a run are queried by run and testcase, the reports join them with their testcase
+    __table_args__=(Index('ix_TestcaseResult_run_id_testcase_id', run_id, testcase_id),)
+
     def __init__(self, run_id, testcase_id):
         self.run_id=run_id
         self.testcase_id=testcase_id
@@ -113,6 +119,75 @@ class TestcaseResult(Base):
             return new_testcase_result
         return testcase_result
 
+    def update_from(self, other):
+        """
+        Copies the outcome of an execution from another TestcaseResult object. Does not commit to database!
+        The IDs of this testcase result, its run and its testcase are kept.
+        Parameters:
+            other (TestcaseResult object): result to copy, e.g. one that was created in a worker process
+        Returns:
+            Nothing
+        """
+        for column in self.__table__.columns:
+            if column.name not in ("id", "run_id", "testcase_id"):
+                setattr(self, column.name, getattr(other, column.name))
+
+    @classmethod
+    def get_cached(cls, cache_key):
+        """
+        Returns the latest result of an execution with the given cache key and its ValgrindOutput.
+        Parameters:
+            cache_key (string): key as returned by TestcaseExecutor.cache_key()
+        Returns:
+            TestcaseResult object (None if there is none)
+            ValgrindOutput object (can be None)
+        """
+        cached=dbm.session.query(TestcaseResult, ValgrindOutput) \
+            .outerjoin(ValgrindOutput, ValgrindOutput.testcase_result_id==TestcaseResult.id) \
+            .filter(TestcaseResult.cache_key==cache_key) \
+            .order_by(TestcaseResult.id.desc()).first()
+        if cached is None:
+            return None, None
+        return cached[0], cached[1]
+
+    @classmethod
+    def store_detached(cls, r_id, results):
+        """
+        Adds TestcaseResults and their ValgrindOutputs which were created outside of the database session
+        (e.g. by a worker process) to the session. Existing entries for the same run and testcase are updated.
+        The existing entries are loaded with a single query and all new rows are inserted with the next commit,
+        so storing the results of a run takes one transaction. Does not commit to database!
+        Parameters:
+            r_id (int): ID of Run
+            results (list of pairs of TestcaseResult and ValgrindOutput objects): results which are not part of
+                the session, the ValgrindOutput objects can be None
+        Returns:
+            List of pairs of TestcaseResult and ValgrindOutput objects which are part of the session
+        """
+        existing={testcase_result.testcase_id: testcase_result for testcase_result in
+                  dbm.session.query(TestcaseResult).options(joinedload(TestcaseResult.valgrind_results))
+                  .filter(TestcaseResult.run_id==r_id).all()}
+        stored=[]
+        for detached_result, detached_valgrind in results:
+            testcase_result=existing.get(detached_result.testcase_id)
+            if testcase_result is None:
+                testcase_result=detached_result
+                testcase_result.run_id=r_id
+                dbm.session.add(testcase_result)
+            else:
+                testcase_result.update_from(detached_result)
+            valgrind_output=None
+            if detached_valgrind is not None:
+                valgrind_output=testcase_result.valgrind_results
+                if valgrind_output is None:
+                    valgrind_output=detached_valgrind
+                    # the ID of the result is only known once it was inserted, the relationship sets it
+                    testcase_result.valgrind_results=valgrind_output
+                else:
+                    valgrind_output.update_from(detached_valgrind)
+            stored.append((testcase_result, valgrind_output))
+        return stored
+
     @classmethod
     def get_testcase_result_by_run_and_testcase(cls, run_id, testcase_id=None, testcase_name=None):
         """
@@ -8,12 +8,14 @@ Testcases are used for evaluating a submissions and can be used to test differen
      UNSPECIFIED: If type of testcase could not be concerned when parsing the corresponding files.
 """
 
+import os
 import logging
 from sqlalchemy import *
 from database.base import Base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import expression
 import database.database_manager as dbm
+from util.fingerprint import hash_file, fingerprint_file
 
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
@@ -38,6 +40,17 @@ class Testcase(Base):
     type=Column(String,
                 nullable=False)  # Descibes what the expected outcome of the testcase is. Either GOOD, BAD or BAD_OR_OUTPUT
     rlimit=Column(Integer)
+    # hash of the input (.stdin), part of the key of cached results
+    input_hash=Column(String)
+    # information about the expected output (.stdout), so comparisons do not have to read it
+    expected_output_hash=Column(String)
+    expected_fingerprint=Column(String)
+    expected_size=Column(Integer)
+    expected_lines=Column(Integer)
+    # resource usage of the reference solution, used to derive the limits of the testcase
+    baseline_cpu_time=Column(Float)
+    baseline_tictoc=Column(Float)
+    baseline_mrss=Column(Integer)
     testcase_results=relationship("TestcaseResult")
 
     def __init__(self, path, short_id, description, hint, type, rlimit):
@@ -83,6 +96,20 @@ class Testcase(Base):
         self.type=type
         self.rlimit=rlimit
 
+    def update_baseline(self, cpu_time, tictoc, mrss):
+        """
+        Update the resource usage of the reference solution for this testcase. Does not commit to database!
+        Parameters:
+            cpu_time (float): CPU time in seconds
+            tictoc (float): wall clock time in seconds
+            mrss (int): maximum resident set size in bytes
+        Returns:
+            Nothing
+        """
+        self.baseline_cpu_time=cpu_time
+        self.baseline_tictoc=tictoc
+        self.baseline_mrss=mrss
+
     @classmethod
     def create_or_update(cls, path, short_id, description, hint, type, valgrind=True, rlimit=None):
         """
@@ -117,6 +144,43 @@ class Testcase(Base):
                 dbm.session.commit()
             logging.info("New testcase inserted or altered one updated.")
 
+    @classmethod
+    def update_expected_output(cls, short_id, path):
+        """
+        Stores the fingerprint, size and number of lines of the expected output of a testcase
+        as well as the hash of its input.
+        They are only recomputed if the content of the expected output changed.
+        Parameters:
+            short_id (string): short name of testcase
+            path (string): path to testcase
+        Returns:
+            Nothing
+        """
+        testcase=dbm.session.query(Testcase).filter(Testcase.short_id==short_id).first()
+        stdin=path+'.stdin'
+        input_hash=hash_file(stdin) if os.path.exists(stdin) else None
+        if input_hash!=testcase.input_hash:
+            testcase.input_hash=input_hash
+            dbm.session.commit()
+        expected=path+'.stdout'
+        if not os.path.exists(expected):
+            content_hash=None
+            fingerprint=None
+            size=None
+        else:
+            content_hash=hash_file(expected)
+            if content_hash==testcase.expected_output_hash:
+                return
+            fingerprint=fingerprint_file(expected)
+            size=os.path.getsize(expected)
+        if content_hash!=testcase.expected_output_hash:
+            testcase.expected_output_hash=content_hash
+            testcase.expected_fingerprint=fingerprint
+            testcase.expected_size=size
+            testcase.expected_lines=None if fingerprint is None else int(fingerprint.split(':')[0])
+            dbm.session.commit()
+            logging.info(f"Fingerprint of expected output of testcase {short_id} updated.")
+
     @classmethod
     def get_all(cls):
         """
@@ -13,14 +13,14 @@ class ValgrindOutput(Base):
     __tablename__='ValgrindOutput'
     # Columns for the table "ValgrindOutput"
     id=Column(Integer, primary_key=True)
-    testcase_result_id=Column(Integer, ForeignKey("TestcaseResult.id"), nullable=False)
+    testcase_result_id=Column(Integer, ForeignKey("TestcaseResult.id"), nullable=False, index=True)
     ok=Column(Boolean, default=False, server_default=expression.false())  #
     invalid_read_count=Column(Integer, default=0, server_default='0')  #
     invalid_write_count=Column(Integer, default=0, server_default='0')  #
 
     # in use at exit
     in_use_at_exit_bytes=Column(Integer)
-    # in_use_at_exit_blocks=Column(Integer)
+    in_use_at_exit_blocks=Column(Integer)
 
     # total heap usage
     total_heap_usage_allocs=Column(Integer)
@@ -29,25 +29,28 @@ class ValgrindOutput(Base):
 
     # leak summary
     definitely_lost_bytes=Column(Integer)
-    # definitely_lost_blocks=Column(Integer)
+    definitely_lost_blocks=Column(Integer)
     indirectly_lost_bytes=Column(Integer)
-    # indirectly_lost_blocks=Column(Integer)
+    indirectly_lost_blocks=Column(Integer)
     possibly_lost_bytes=Column(Integer)
-    # possibly_lost_blocks=Column(Integer)
+    possibly_lost_blocks=Column(Integer)
     still_reachable_bytes=Column(Integer)
-    # still_reachable_blocks=Column(Integer)
+    still_reachable_blocks=Column(Integer)
     suppressed_bytes=Column(Integer)
-    # suppressed_blocks=Column(Integer)
+    suppressed_blocks=Column(Integer)
 
     # error summary
     summary_errors=Column(Integer)
-    # summary_contexts=Column(Integer)
+    summary_contexts=Column(Integer)
     summary_suppressed_errors=Column(Integer)
-
-    # summary_suppressed_blocks=Column(Integer)
+    summary_suppressed_contexts=Column(Integer)
 
     def __init__(self, testcase_result_id):
         self.testcase_result_id=testcase_result_id
+        # column defaults are only applied on insert, but the parser relies on them
+        self.ok=False
+        self.invalid_read_count=0
+        self.invalid_write_count=0
 
     @classmethod
     def create_or_get(self, tcr_id):
@@ -65,3 +68,16 @@ class ValgrindOutput(Base):
             dbm.session.commit()
             return output
         return output
+
+    def update_from(self, other):
+        """
+        Copies the parsed valgrind information from another ValgrindOutput object. Does not commit to database!
+        The IDs of this output and its testcase result are kept.
+        Parameters:
+            other (ValgrindOutput object): output to copy, e.g. one that was created in a worker process
+        Returns:
+            Nothing
+        """
+        for column in self.__table__.columns:
+            if column.name not in ("id", "testcase_result_id"):
+                setattr(self, column.name, getattr(other, column.name))
@@ -0,0 +1,100 @@
+"""
+This module calibrates the limits of the testcases.
+The reference solution is compiled like a submission and executed several times for every testcase.
+The measured resource usage is stored as baseline of the testcase. If LIMIT_FACTOR is set in the config file,
+the executor derives the timeouts and CPU limits of a testcase from its baselines (see TestcaseExecutor.get_limits()),
+and the memory limit of the cgroup sandbox (see TestcaseExecutor.get_memory_limit()).
+"""
+
+import os
+import statistics
+import logging
+from util.absolute_path_resolver import resolve_absolute_path
+from util.config_reader import ConfigReader
+from util.fingerprint import compare_to_testcase
+from logic.executions import TestcaseExecutor
+from logic.load_tests import load_tests
+from logic.retrieve_and_compile import compile_source
+from database.testcases import Testcase
+import database.database_manager as dbm
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+
+class Calibration:
+
+    def __init__(self, args):
+        """
+        Initialises Calibration. Loads testcases if required.
+        Parameters:
+            args :  parsed commandline arguments
+        """
+        raw_config_path="/resources/config_testcase_executor.config"
+        config_path=resolve_absolute_path(raw_config_path)
+
+        configuration=ConfigReader().read_file(os.path.abspath(config_path))
+        self.configuration=configuration
+        self.args=args
+        self.executor=TestcaseExecutor(args)
+
+        if args.load_tests or Testcase.get_all()==[]:
+            load_tests(self.configuration)
+
+    def run(self):
+        """
+        Compiles the reference solution given by REFERENCE_SOLUTION and measures the baselines of all testcases.
+        Each testcase is executed CALIBRATION_RUNS times, one after another so the measurements do not influence
+        each other. The median of the CPU and wall clock times and the maximum of the resident set sizes are stored.
+        Testcases the reference solution fails are not calibrated.
+        Parameters: None
+        Returns: Nothing
+        """
+        path=resolve_absolute_path(self.configuration["REFERENCE_SOLUTION"])
+        if not os.path.exists(path):
+            logging.error(f"Reference solution {path} does not exist.")
+            return
+        runs=self.configuration.get("CALIBRATION_RUNS", 5)
+
+        with self.executor.create_workspace() as workspace:
+            _, _, return_code, gcc_stderr=compile_source(self.args, self.configuration, path, workspace)
+            if return_code!=0:
+                logging.error(f"Reference solution could not be compiled:\n{gcc_stderr}")
+                return
+
+            for testcase in Testcase.get_all():
+                results=[]
+                for _ in range(runs):
+                    with workspace.create() as execution:
+                        result=self.executor.execute_calibration(testcase, execution)
+                        if testcase.type in ["GOOD", "BAD_OR_OUTPUT"] and result.return_code==0:
+                            result.output_correct=compare_to_testcase(execution.stdout, testcase)
+                    results.append(result)
+                if not self.passed(testcase, results):
+                    logging.warning(f"Reference solution fails testcase {testcase.short_id}. "
+                                    f"The testcase is not calibrated.")
+                    continue
+                testcase.update_baseline(statistics.median([result.cpu_time for result in results]),
+                                         statistics.median([result.tictoc for result in results]),
+                                         max([result.mrss for result in results]))
+                logging.info(f"{testcase.short_id}: cpu time {testcase.baseline_cpu_time:.3f} s, "
+                             f"wall time {testcase.baseline_tictoc:.3f} s, mrss {testcase.baseline_mrss} B")
+            dbm.session.commit()
+
+    def passed(self, testcase, results):
+        """
+        Checks whether the reference solution behaved correctly in all executions of a testcase.
+        Parameters:
+            testcase (Testcase object)
+            results (list of TestcaseResult objects): results of the executions of the reference solution
+        Returns:
+            Boolean
+        """
+        for result in results:
+            if result.timeout or result.segfault or result.output_overflow:
+                return False
+            if not result.returncode_correct(testcase=testcase):
+                return False
+            if testcase.type=="GOOD" and not result.output_correct:
+                return False
+        return True
@@ -11,7 +11,7 @@ from database.runs import Run
 import database.database_manager as dbm
 from logic.result_generator import ResultGenerator
 from logic.testcase_executor import TestCaseExecutor
-from logic.testcase_executor import sort_first_arg_and_diff
+from util.fingerprint import compare_unordered
 from util.colored_massages import Warn, Passed, Failed
 from util.select_option import select_option_interactive
 from logic.retrieve_and_compile import compile_single_submission
@@ -62,9 +62,9 @@ def execute_single_testcase(args):
         if testcase.type=="BAD":
             result, valgrind=executor.check_for_error(submission, run, testcase)
         elif testcase.type=="BAD_OR_OUTPUT":
-            result, valgrind=executor.check_for_error_or_output(submission, run, testcase, sort_first_arg_and_diff)
+            result, valgrind=executor.check_for_error_or_output(submission, run, testcase, compare_unordered)
         else:
-            result, valgrind=executor.check_output(submission, run, testcase, sort_first_arg_and_diff)
+            result, valgrind=executor.check_output(submission, run, testcase, compare_unordered)
 
         ResultGenerator.print_stats_testcase_result(result, testcase, valgrind)
         # logging.debug(valgrind)
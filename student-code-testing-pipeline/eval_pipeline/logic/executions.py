@@ -1,10 +1,15 @@
 """
 Here the functionality for spawning child processes for executing testcases. 
 """
+import asyncio
+import functools
 import glob
+import hashlib
+import math
 import os
 import resource
 import shutil
+import signal
 import subprocess
 from subprocess import DEVNULL, PIPE
 import sys
@@ -24,10 +29,13 @@ from logic.retrieve_and_compile import compile_single_submission
 from util.colored_massages import Warn, Passed, Failed
 from util.select_option import select_option_interactive
 from util.result_parser import ResultParser
-from util.executor_utils import unlink_safe, unlink_as_cpr, getmtime, sort_first_arg_and_diff, sudokill
-from util.named_pipe_open import NamedPipeOpen
+from util.executor_utils import unlink_safe, unlink_as_cpr, getmtime, sudokill
+from util.input_pipe import InputPipe
+from util.runner import run_measured, runner_command, exit_code
+from util.cgroup import Cgroup, enable_controllers, delegated_root
 from util.absolute_path_resolver import resolve_absolute_path
 from util.config_reader import ConfigReader
+from util.workspace import Workspace
 
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
@@ -35,6 +43,14 @@ logging.basicConfig(format=FORMAT, level=logging.DEBUG)
 OWN_PW=getpwnam(os.environ['USER'])
 OWN_UID_GID=f'{OWN_PW.pw_uid:d}.{OWN_PW.pw_gid:d}'
 SUDO_DOCKER=['sudo', 'docker']
+ENV_PATH='/usr/bin/env'
+# Part of the keys of cached results. Increase it whenever a change of the execution changes the results,
+# so results of older versions are no longer used.
+SANDBOX_VERSION=1
+# exit code of valgrind in the fail-fast profile if it found an error, see valgrind_command()
+VALGRIND_ERROR_EXITCODE=99
+# Errors are recovered from and leaks are reported, see logic.retrieve_and_compile.compile_sanitizer()
+SANITIZER_ENV=['ASAN_OPTIONS=halt_on_error=0:detect_leaks=1', 'UBSAN_OPTIONS=halt_on_error=0:print_stacktrace=1']
 
 
 class TestcaseExecutor:
@@ -44,6 +60,11 @@ class TestcaseExecutor:
     sudo=[]
     unshare=[]
     limits=None
+    # cgroup the cgroups of the executions are created in, if the cgroup sandbox is used, and its enabled controllers
+    cgroup_root=None
+    cgroup_controllers=[]
+    # If set, results are created outside of the database session, e.g. when running in a worker process.
+    detached=False
 
     def __init__(self, args):
         """
@@ -61,12 +82,17 @@ class TestcaseExecutor:
         sudo_path=configuration["SUDO_PATH"]
         sudo_user=configuration["SUDO_USER"]
         self.sudo=[sudo_path, '-u', sudo_user]
+        # runners are started once as the sudo user and execute the submissions without starting sudo again
+        self.runner_command=runner_command(configuration.get("RUNNER_PYTHON", sys.executable), self.sudo)
 
         unshare_path=configuration["UNSHARE_PATH"]
         self.unshare=[unshare_path, '-r', '-n']
         self.docker_container=self.configuration["DOCKER_CONTAINER_GCC"]
         self.docker_image=self.configuration["DOCKER_IMAGE_GCC"]
         self.shared_dir=self.configuration["DOCKER_SHARED_DIRECTORY"]
+        if self.configuration.get("SANDBOX", "rlimit")=="cgroup":
+            self.cgroup_root=self.configuration.get("CGROUP_ROOT") or delegated_root()
+            self.cgroup_controllers=enable_controllers(self.cgroup_root)
         
         self.make_home_private()
 
@@ -98,15 +124,15 @@ class TestcaseExecutor:
 
 
 
-    def execute_testcase(self, testcase, submission, run):
+    def execute_testcase(self, testcase, submission, run, workspace):
         """
         Runs a submission with a testcase by creating subprocess.
         For the subprocess data, stack  and CPU limits are set.
-        The process is killed if it takes longer than 150 seconds for execution.
+        The process is killed if it takes longer than the time returned by get_timeout().
         Results are stored in a TestcaseResult object, but not committed to the database.
 
         If no timeout occurred and it is required, the submission is also checked with Valgrind.
-        Here the subprocess has a timeout of 300 seconds.
+        Here the subprocess has a timeout returned by get_valgrind_timeout().
         No limits are set for the subprocess which checks using Valgrind.
         Results are stored in a ValgrindOutput object, but not committed to the database.
 
@@ -114,80 +140,237 @@ class TestcaseExecutor:
             testcase (Testcase object): testcase to be checked
             submission (Submission object): Submission handed in by student
             run (Run object): Run corresponding to the submission.
+            workspace (Workspace object): Workspace private to this execution.
+                The output and the stdin pipe are placed here.
 
         Returns:
             TestcaseResult object
             ValgrindOutput object (can be None)
         """
 
-        parser=ResultParser()
-        result=TestcaseResult.create_or_get(run.id, testcase.id)
-        if self.args.verbose:
-            logging.info(f'--- executing '
-                         f'{"".join(submission.submission_path.split("/")[-2:])} '
-                         f'< {testcase.short_id} ---')
-        tic=time.time()
+        result=self.get_result(run, testcase)
+        self.log_execution('executing', submission, testcase)
+        c_args=['./loesung']
+        limits=self.get_limits(testcase)
+        self.limits=limits
+        status, rusage, duration=self.run_testcase(f"{testcase.path}.stdin", c_args, workspace, limits,
+                                                   self.get_timeout(testcase), self.get_output_limit(testcase),
+                                                   self.get_memory_limit(testcase, limits))
+        self.collect_result(result, status, rusage, duration, limits)
+
+        self.log_execution('finished', submission, testcase)
+        valgrind_output=None
+        if self.needs_valgrind(testcase, result):
+            valgrind_output=self.execute_valgrind(submission, testcase, result, c_args, workspace)
 
-        with NamedPipeOpen(f"{testcase.path}.stdin") as fin, \
-                open('test.stdout', 'bw') as fout, \
-                open('test.stderr', 'bw') as ferr:
-            out, err=fout, ferr
-            if self.args.output:
-                out=sys.stdout
-                err=sys.stderr
-                logging.info("\nExecutable output:\n")
-            c_args=['./loesung']
-            self.limits=self.get_limits(testcase)
+        return result, valgrind_output
+
+    async def execute_testcase_async(self, testcase, submission, run, workspace, valgrind=True):
+        """
+        Coroutine version of execute_testcase() used when several testcases of a submission are checked concurrently.
+        The blocking wait for the runner executing the submission is done in a thread of the event loop's
+        default executor, so many sandboxed executions can be in flight at the same time.
+        All files written during the execution are placed in workspace, which must not be shared with other executions.
+
+        Parameters:
+            testcase (Testcase object): testcase to be checked
+            submission (Submission object): Submission handed in by student
+            run (Run object): Run corresponding to the submission.
+            workspace (Workspace object): Workspace private to this execution.
+            valgrind (Boolean): If False, valgrind is not executed, so the caller can schedule it separately
+                using execute_valgrind_async(). Optional.
+
+        Returns:
+            TestcaseResult object
+            ValgrindOutput object (can be None)
+        """
+        result=self.get_result(run, testcase)
+        self.log_execution('executing', submission, testcase)
+        c_args=['./loesung']
+        limits=self.get_limits(testcase)
+        status, rusage, duration=await asyncio.get_running_loop().run_in_executor(
+            None, self.run_testcase, f"{testcase.path}.stdin", c_args, workspace, limits, self.get_timeout(testcase),
+            self.get_output_limit(testcase), self.get_memory_limit(testcase, limits))
+        self.collect_result(result, status, rusage, duration, limits)
+
+        self.log_execution('finished', submission, testcase)
+        valgrind_output=None
+        if valgrind and self.needs_valgrind(testcase, result):
+            valgrind_output=await self.execute_valgrind_async(submission, testcase, result, c_args, workspace)
+
+        return result, valgrind_output
+
+    def run_testcase(self, stdin_path, c_args, workspace, limits, timeout, output_limit, memory_limit=None):
+        """
+        Executes the executable of a workspace with the input of a testcase as the sudo user
+        and blocks until it terminated. The execution is started and killed on timeout by a runner
+        running as the sudo user (see util/runner.py).
+        Does not access database objects, so it can be called from other threads.
+        If SANDBOX is set to "cgroup", the execution is placed in its own cgroup (see util/cgroup.py).
+        Its memory and number of processes are limited, its resource usage includes all processes it forked,
+        and all of its processes are killed when it terminated or timed out.
+        Parameters:
+            stdin_path (string): file containing the input of the testcase
+            c_args: list of arguments used for calling the executable. Usually that's ["./loesung"]
+            workspace (Workspace object): Workspace private to this execution.
+            limits (list of ints): limits as returned by get_limits()
+            timeout (float): seconds after which the execution is killed
+            output_limit (int): maximum size of the output in bytes as returned by get_output_limit()
+            memory_limit (int): maximum memory usage in bytes if a cgroup is used, as returned by get_memory_limit().
+                Optional, defaults to the data limit.
+        Returns:
+            status (int): wait status of the execution
+            rusage (Rusage object): resource usage of the execution
+            duration (float): wall clock time of the execution in seconds
+        """
+        tic=time.time()
+        with InputPipe(stdin_path) as fin, \
+                open(workspace.stdout, 'bw') as fout, \
+                open(workspace.stderr, 'bw') as ferr:
+            out, err=self.output_streams(fout, ferr)
 
             # equivalent to:
-            # cd /tmp && cat ~/eval_pipeline/resources/testcases/good/example_sheet.stdin  |  sudo unshare -r -n /usr/bin/htime  -f  %S %U %M %x %e -o /tmp/test-time.out ./loesung 2> test.stderr 1> test.stdout
-            command=self.sudo\
-                +[self.configuration["TIME_PATH"],\
-                "-f", '%S %U %M %x %e', '-o',\
-                self.configuration["TIME_OUT_PATH"]]\
-                +c_args
-            p=subprocess.Popen(
-                command,
-                stdin=fin,
-                stdout=out,
-                stderr=err,
-                preexec_fn=self.set_limits,
-                cwd='/tmp')
-            try:
-                p.wait(150)
-            except subprocess.TimeoutExpired:
-                sudokill(p)
-            duration=time.time()-tic
-            result.return_code=p.returncode
-            if p.returncode in (-9, -15, None):
+            # cd $WORKSPACE && cat ~/eval_pipeline/resources/testcases/good/example_sheet.stdin  |  sudo -u cpr ./loesung 2> test.stderr 1> test.stdout
+            if memory_limit is None:
+                memory_limit=limits[0]
+            # output files on a tmpfs are charged to the cgroup as well
+            status, rusage=self.run_sandboxed(c_args, fin, out, err, limits+[output_limit], workspace.executable_dir,
+                                              timeout, memory_limit+2*output_limit)
+        return status, rusage, time.time()-tic
+
+    def run_sandboxed(self, command, stdin, stdout, stderr, limits, cwd, timeout, memory_limit):
+        """
+        Executes a command as the sudo user using a runner and blocks until it terminated.
+        If SANDBOX is set to "cgroup", the command is placed in its own cgroup, which limits the memory and the number
+        of processes of the command and all processes it forked and kills them once the command terminated.
+        Parameters:
+            command (list of strings): command to execute
+            stdin, stdout, stderr (file objects): streams of the command
+            limits (list of ints): resource limits set by the runner, see util.runner.Runner.run()
+            cwd (string): working directory of the command
+            timeout (float): seconds after which the command is killed
+            memory_limit (int): maximum memory usage of the cgroup in bytes
+        Returns:
+            status (int): wait status of the command
+            rusage (Rusage object): resource usage of the command, of all processes in the cgroup if one is used
+        """
+        if self.cgroup_root is None:
+            return run_measured(self.runner_command, command, stdin, stdout, stderr, limits, cwd, timeout)
+        with Cgroup(self.cgroup_root, self.cgroup_controllers, memory_limit,
+                    self.configuration.get("CGROUP_PIDS_MAX", 64), self.sudo) as cgroup:
+            status, rusage=run_measured(self.runner_command, command, stdin, stdout, stderr, limits, cwd, timeout,
+                                        cgroup.procs)
+            return status, cgroup.rusage(rusage)
+
+    def execute_calibration(self, testcase, workspace):
+        """
+        Executes the executable of a workspace, usually the reference solution, with a testcase
+        to measure the baselines used for calibrating the limits of the testcase.
+        The configured limits are used, regardless of an existing calibration.
+        Parameters:
+            testcase (Testcase object): testcase to be executed
+            workspace (Workspace object): Workspace private to this execution.
+        Returns:
+            TestcaseResult object, which is not part of the database session
+        """
+        result=TestcaseResult(None, testcase.id)
+        limits=self.get_limits(testcase, calibrated=False)
+        status, rusage, duration=self.run_testcase(f"{testcase.path}.stdin", ['./loesung'], workspace, limits, 150,
+                                                   self.get_output_limit(testcase))
+        self.collect_result(result, status, rusage, duration, limits)
+        return result
+
+    def get_result(self, run, testcase):
+        """
+        Returns the TestcaseResult object the outcome of executing testcase for run is stored in.
+        In detached mode the object is not added to the database session.
+        """
+        if self.detached:
+            return TestcaseResult(run.id, testcase.id)
+        return TestcaseResult.create_or_get(run.id, testcase.id)
+
+    def get_valgrind_output(self, result):
+        """
+        Returns the ValgrindOutput object the valgrind information for result is stored in.
+        In detached mode the object is not added to the database session.
+        """
+        if self.detached:
+            return ValgrindOutput(result.id)
+        return ValgrindOutput.create_or_get(result.id)
+
+    def collect_result(self, result, status, rusage, duration, limits):
+        """
+        Stores the outcome of an execution in a TestcaseResult object. Does not commit to the database.
+        A process killed by SIGKILL or SIGTERM (e.g. by its runner on timeout) or by exceeding its CPU limit counts as timeout,
+        unless it was killed because its cgroup exceeded its memory limit.
+        A process killed because its output exceeded the limit returned by get_output_limit() counts as output overflow.
+        A process terminated by any other signal counts as segfault.
+        Parameters:
+            result (TestcaseResult object): result to update
+            status (int): Wait status of the subprocess as returned by os.wait4()
+            rusage (Rusage object): Resource usage of the subprocess, measured by the kernel.
+            duration (float): Wall clock time of the execution in seconds.
+            limits (list of ints): limits used for the execution as returned by get_limits()
+        Returns:
+            Nothing
+        """
+        timeout=False
+        if os.WIFSIGNALED(status):
+            result.signal=os.WTERMSIG(status)
+            result.return_code=-result.signal
+            timeout=result.signal in (signal.SIGKILL, signal.SIGTERM, signal.SIGXCPU) and not rusage.oom_kill
+            if timeout:
                 result.timeout=True
-                if result.return_code is None:
-                    result.return_code=-15
-                duration=-1
+            elif result.signal==signal.SIGXFSZ:
+                result.output_overflow=True
             else:
-                # sets timeout, segfault, signal,mrss in Bytes, cpu_time in seconds
-                with open(self.configuration["TIME_OUT_PATH"]) as file:
-                    parser.parse_time_file(result, file)
-            if self.args.verbose and result.timeout:
-                logging.info('-> TIMEOUT')
-            result.tictoc=duration
-            result.rlimit_data=self.limits[0]
-            result.rlimit_stack=self.limits[1]
-            result.rlimit_cpu=self.limits[2]
-            result.num_executions=1
-            fin.close()
+                result.segfault=True
+        else:
+            result.return_code=os.WEXITSTATUS(status)
+        if timeout:
+            duration=-1
+        else:
+            # mrss in Bytes, cpu_time in seconds
+            result.cpu_time=rusage.ru_utime+rusage.ru_stime
+            result.mrss=1024*rusage.ru_maxrss
+        if self.args.verbose and timeout:
+            logging.info('-> TIMEOUT')
+        if self.args.verbose and result.output_overflow:
+            logging.info('-> OUTPUT OVERFLOW')
+        result.tictoc=duration
+        result.rlimit_data=limits[0]
+        result.rlimit_stack=limits[1]
+        result.rlimit_cpu=limits[2]
+        result.num_executions=1
+
+    def output_streams(self, fout, ferr):
+        """
+        Selects where the output of the executed submission is written to.
+        If the output flag is set, the output is shown on the console instead.
+        """
+        if self.args.output:
+            logging.info("\nExecutable output:\n")
+            return sys.stdout, sys.stderr
+        return fout, ferr
 
-            if self.args.verbose:
-                logging.info(f'--- finished '
-                             f'{"".join(submission.submission_path.split("/")[-2:])} '
-                             f'< {testcase.short_id} ---')
+    def log_execution(self, state, submission, testcase, tool=''):
+        """
+        Logs the start or the end of an execution if the verbose flag is set.
+        """
+        if self.args.verbose:
+            logging.info(f'--- {state} {tool}'
+                         f'{"".join(submission.submission_path.split("/")[-2:])} '
+                         f'< {testcase.short_id} ---')
 
-        valgrind_output=None
-        if testcase.valgrind_needed and (not result.timeout) and (not result.segfault):
-            valgrind_output=self.execute_valgrind(submission, testcase, result, c_args)
+    def create_workspace(self):
+        """
+        Creates a workspace below the configured WORKSPACE_ROOT, e.g. for compiling a submission.
+        Workspaces for single executions are created inside of it using Workspace.create().
+        Returns:
+            Workspace object
+        """
+        return Workspace(self.configuration.get("WORKSPACE_ROOT"), self.sudo)
 
-        return result, valgrind_output
-    
     def execute_testcase_docker(self, testcase, submission, run):
         """
         #TODO : THIS FUNCTION IS UNFINISHED. DO NOT USE
@@ -270,7 +453,7 @@ class TestcaseExecutor:
             gcc_returncode=int(next(f))
         os.unlink(os.path.join(self.shared_dir, 'gcc.return'))
 
-        with NamedPipeOpen(f"{testcase.path}.stdin") as fin, \
+        with InputPipe(f"{testcase.path}.stdin") as fin, \
                 open('test.stdout', 'bw') as fout, \
                 open('test.stderr', 'bw') as ferr:
             out, err=fout, ferr
@@ -325,7 +508,7 @@ class TestcaseExecutor:
                              f'< {testcase.short_id} ---')
 
         valgrind_output=None
-        if testcase.valgrind_needed and (not result.timeout) and (not result.segfault):
+        if testcase.valgrind_needed and (not result.timeout) and (not result.segfault) and (not result.output_overflow):
             valgrind_output=self.execute_valgrind(submission, testcase, result, c_args)
 
         return result, valgrind_output
@@ -362,7 +545,7 @@ class TestcaseExecutor:
                          f'< {testcase.short_id} ---')
         tic=time.time()
 
-        with NamedPipeOpen(f"{testcase.path}.stdin") as fin, \
+        with InputPipe(f"{testcase.path}.stdin") as fin, \
                 open('test.stdout', 'bw') as fout, \
                 open('test.stderr', 'bw') as ferr:
             out, err=fout, ferr
@@ -417,16 +600,18 @@ class TestcaseExecutor:
                              f'< {testcase.short_id} ---')
 
         valgrind_output=None
-        if testcase.valgrind_needed and (not result.timeout) and (not result.segfault):
+        if testcase.valgrind_needed and (not result.timeout) and (not result.segfault) and (not result.output_overflow):
             valgrind_output=self.execute_valgrind(submission, testcase, result, c_args)
 
         return result, valgrind_output
 
-    def execute_valgrind(self, submission, testcase, result, c_args):
+    def execute_valgrind(self, submission, testcase, result, c_args, workspace):
         """
 
         This function checks with valgrind if a submission is sound.
-        Here subprocess has a timeout of 300 seconds.
+        If MEMCHECK is set to "sanitizer", the executable compiled with sanitizers is executed first
+        and valgrind is only used if its result is inconclusive, see run_memcheck().
+        Here subprocess has a timeout returned by get_valgrind_timeout().
         No limits are set for the subprocess which checks using Valgrind.
         Results are stored in a ValgrindOutput object, but not committed to the database.
 
@@ -435,51 +620,256 @@ class TestcaseExecutor:
             submission (Submission object): Submission handed in by student
             result (TestcaseResult object): The results from the corresponding "normal" testcase execution.
             c_args: list of arguments used for calling the executable. Usually that's ["./loesung"]
+            workspace (Workspace object): Workspace private to this execution.
 
         Returns:
             ValgrindOutput object (can be None)
         """
+        self.log_execution('executing', submission, testcase, 'valgrind ')
+        returncode, sanitizer_output=self.run_memcheck(f"{testcase.path}.stdin", c_args, workspace,
+                                                      self.get_valgrind_timeout(testcase))
+        valgrind_output=self.collect_memcheck(result, returncode, sanitizer_output, workspace)
+        self.log_execution('finished', submission, testcase, 'valgrind ')
+        return valgrind_output
 
-        parser=ResultParser()
-        out, err=subprocess.DEVNULL, subprocess.DEVNULL
-        if self.args.verbose:
-            logging.info(f'--- executing valgrind '
-                         f'{"".join(submission.submission_path.split("/")[-2:])} '
-                         f'< {testcase.short_id} ---')
-        
-        out=subprocess.DEVNULL
-        err=subprocess.DEVNULL
-        
+    async def execute_valgrind_async(self, submission, testcase, result, c_args, workspace):
+        """
+        Coroutine version of execute_valgrind() used when several testcases of a submission are checked concurrently.
+
+        Parameters:
+            testcase (Testcase object): testcase to be checked
+            submission (Submission object): Submission handed in by student
+            result (TestcaseResult object): The results from the corresponding "normal" testcase execution.
+            c_args: list of arguments used for calling the executable. Usually that's ["./loesung"]
+            workspace (Workspace object): Workspace private to this execution.
+
+        Returns:
+            ValgrindOutput object (can be None)
+        """
+        self.log_execution('executing', submission, testcase, 'valgrind ')
+        returncode, sanitizer_output=await asyncio.get_running_loop().run_in_executor(
+            None, self.run_memcheck, f"{testcase.path}.stdin", c_args, workspace, self.get_valgrind_timeout(testcase))
+        valgrind_output=self.collect_memcheck(result, returncode, sanitizer_output, workspace)
+        self.log_execution('finished', submission, testcase, 'valgrind ')
+        return valgrind_output
+
+    def needs_valgrind(self, testcase, result):
+        """
+        Decides whether a submission is checked with valgrind for a testcase after its normal execution.
+        Executions which timed out, crashed or wrote too much output are not checked.
+        Parameters:
+            testcase (Testcase object): the executed testcase
+            result (TestcaseResult object): The results from the corresponding "normal" testcase execution.
+        Returns:
+            Boolean
+        """
+        return bool(testcase.valgrind_needed) and (not result.timeout) and (not result.segfault) \
+            and (not result.output_overflow)
+
+    def valgrind_slots(self):
+        """
+        Returns how many valgrind executions may run at the same time.
+        Each one is expected to need VALGRIND_DATA bytes of memory. Together they must not exceed
+        VALGRIND_MEMORY_BUDGET, which defaults to half of the physical memory.
+        Parameters: None
+        Returns:
+            Integer, at least 1
+        """
+        budget=self.configuration.get("VALGRIND_MEMORY_BUDGET")
+        if budget is None:
+            budget=os.sysconf('SC_PHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')//2
+        return max(1, budget//self.configuration["VALGRIND_DATA"])
+
+    def run_memcheck(self, stdin_path, c_args, workspace, timeout):
+        """
+        Checks the executable of a workspace for memory errors and blocks until the check finished.
+        If the workspace contains an executable compiled with sanitizers, it is executed first.
+        Valgrind is only executed if the sanitizers did not produce a conclusive result,
+        i.e. if they failed or the execution was killed.
+        Valgrind uses the fail-fast profile if valgrind_fail_fast() allows it. If it stopped at an error,
+        it is executed again with the full profile, which decides the verdict.
+        Leaks of memory which is still reachable at exit are only detected by valgrind.
+        Does not access database objects, so it can be called from other threads.
+        Parameters:
+            stdin_path (string): file containing the input of the testcase
+            c_args: list of arguments used for calling the executable. Usually that's ["./loesung"]
+            workspace (Workspace object): Workspace private to this execution.
+            timeout (float): seconds after which the check is killed, see get_valgrind_timeout()
+        Returns:
+            returncode (int): Return code of the last execution, negative if it was terminated by a signal.
+            sanitizer_output (ValgrindOutput object): the sanitizer findings which are not part of the
+                database session, None if valgrind was used
+        """
+        if os.path.exists(workspace.sanitizer_executable):
+            returncode=self.run_sanitizer(stdin_path, workspace, timeout)
+            if returncode not in (-9, -15, 127):
+                with open(workspace.sanitizer_out, 'br') as f:
+                    sanitizer_output=ResultParser.parse_sanitizer_file(ValgrindOutput(None), f)
+                if sanitizer_output.ok is not None:
+                    return returncode, sanitizer_output
+            logging.info("Sanitizer result is inconclusive, using valgrind.")
+        fail_fast=self.valgrind_fail_fast()
+        returncode=self.run_valgrind(stdin_path, c_args, workspace, timeout, fail_fast)
+        if fail_fast and returncode==VALGRIND_ERROR_EXITCODE:
+            # the log of the fail-fast profile ends at the first error and lacks the heap summary
+            returncode=self.run_valgrind(stdin_path, c_args, workspace, timeout)
+        return returncode, None
+
+    def run_sanitizer(self, stdin_path, workspace, timeout):
+        """
+        Executes the executable of a workspace compiled with sanitizers with the input of a testcase as the sudo user
+        and blocks until it terminated. Like run_valgrind(), a runner is used and no resource limits are set,
+        in a cgroup the memory is limited to VALGRIND_DATA.
+        The sanitizer reports are written to stderr, which is stored in the workspace.
+        Parameters:
+            stdin_path (string): file containing the input of the testcase
+            workspace (Workspace object): Workspace private to this execution.
+            timeout (float): seconds after which the execution is killed
+        Returns:
+            returncode (int): Return code of the execution, negative if it was terminated by a signal.
+        """
+        with InputPipe(stdin_path) as fin, open(workspace.sanitizer_out, 'bw') as ferr, \
+                open(os.devnull, 'wb') as devnull:
+            out, _=self.valgrind_streams(devnull)
+            # corresponds to:
+            # cd $WORKSPACE && sudo -u cpr env ASAN_OPTIONS=... UBSAN_OPTIONS=... ./loesung_sanitizer 2> test.sanitizer
+            status, _=self.run_sandboxed([ENV_PATH]+SANITIZER_ENV+['./'+os.path.basename(workspace.sanitizer_executable)],
+                                         fin, out, ferr, [resource.RLIM_INFINITY]*4, workspace.executable_dir, timeout,
+                                         self.configuration["VALGRIND_DATA"])
+        return exit_code(status)
+
+    def collect_memcheck(self, result, returncode, sanitizer_output, workspace):
+        """
+        Stores the result of run_memcheck() in a ValgrindOutput object. Does not commit to the database.
+        Parameters:
+            result (TestcaseResult object): The results from the corresponding "normal" testcase execution.
+            returncode (int): Return code of the last execution
+            sanitizer_output (ValgrindOutput object): the sanitizer findings, None if valgrind was used
+            workspace (Workspace object): Workspace of the execution
+        Returns:
+            ValgrindOutput object (can be None)
+        """
+        if sanitizer_output is None:
+            return self.collect_valgrind(result, returncode, workspace.valgrind_out,
+                                         workspace.valgrind_xml if self.valgrind_xml() else None)
+        valgrind_output=self.get_valgrind_output(result)
+        valgrind_output.update_from(sanitizer_output)
         if self.args.valgrind:
-            out=sys.stdout
-            err=sys.stderr
-            
-        with NamedPipeOpen(f"{testcase.path}.stdin") as fin:
+            with open(workspace.sanitizer_out, 'br') as f:
+                logging.info("\nSanitizer output:\n")
+                for line in f.readlines():
+                    logging.info(line)
+        return valgrind_output
+
+    def valgrind_xml(self):
+        """
+        Decides whether valgrind writes XML output, which is parsed instead of its log.
+        Set VALGRIND_XML in the config file to use it.
+        Parameters: None
+        Returns:
+            Boolean
+        """
+        return bool(self.configuration.get("VALGRIND_XML", False))
+
+    def valgrind_fail_fast(self):
+        """
+        Decides whether valgrind uses the fail-fast profile, which stops at the first error.
+        Set VALGRIND_FAIL_FAST in the config file to use it. The final evaluation (flag -F) always uses the full profile.
+        Clean runs are not affected, as valgrind still writes the complete leak summary when the submission exits.
+        Runs which stopped at an error are executed again with the full profile (see run_memcheck()),
+        so the results do not depend on the profile.
+        Parameters: None
+        Returns:
+            Boolean
+        """
+        return bool(self.configuration.get("VALGRIND_FAIL_FAST", False)) and not self.args.final
+
+    def run_valgrind(self, stdin_path, c_args, workspace, timeout, fail_fast=False):
+        """
+        Executes the executable of a workspace with valgrind and the input of a testcase as the sudo user
+        and blocks until it terminated. Like run_testcase(), a runner is used, but no resource limits are set.
+        In a cgroup, the memory of valgrind is limited to VALGRIND_DATA.
+        Does not access database objects, so it can be called from other threads.
+        Parameters:
+            stdin_path (string): file containing the input of the testcase
+            c_args: list of arguments used for calling the executable. Usually that's ["./loesung"]
+            workspace (Workspace object): Workspace private to this execution.
+            timeout (float): seconds after which valgrind is killed, see get_valgrind_timeout()
+            fail_fast (Boolean): If True, valgrind stops at the first error. Optional.
+        Returns:
+            returncode (int): Return code of valgrind, negative if it was terminated by a signal.
+                VALGRIND_ERROR_EXITCODE if valgrind stopped at an error.
+        """
+        with InputPipe(stdin_path) as fin, open(os.devnull, 'wb') as devnull:
+            out, err=self.valgrind_streams(devnull)
             # corresponds to:
-            # sudo -u cpr /usr/bin/valgrind --log-file=/tmp/test.valgrind.out ./loesung
-            command=self.sudo\
-                +[self.configuration["VALGRIND_PATH"]]\
-                +[f'--log-file={self.configuration["VALGRIND_OUT_PATH"]}']\
-                +c_args
-                               
-            p=subprocess.Popen(command,
-                               stdin=fin,
-                               stdout=out,
-                               stderr=err,
-                               # preexec_fn=self.set_limits,
-                               cwd='/tmp')
-            try:
-                p.wait(300)
-            except subprocess.TimeoutExpired:
-                sudokill(p)
+            # cd $WORKSPACE && sudo -u cpr /usr/bin/valgrind --log-file=$WORKSPACE/test.valgrind.out ./loesung
+            status, _=self.run_sandboxed(self.valgrind_command(c_args, workspace.valgrind_out, fail_fast,
+                                                               workspace.valgrind_xml if self.valgrind_xml() else None),
+                                         fin, out, err, [resource.RLIM_INFINITY]*4,
+                                         workspace.executable_dir, timeout, self.configuration["VALGRIND_DATA"])
+        return exit_code(status)
+
+    def valgrind_command(self, c_args, valgrind_out_path, fail_fast=False, xml_path=None):
+        """
+        Builds the command line used for checking a submission with valgrind.
+        It is executed by a runner, which already runs as the sudo user.
+        Parameters:
+            c_args: list of arguments used for calling the executable. Usually that's ["./loesung"]
+            valgrind_out_path (string): File the valgrind log is written to.
+            fail_fast (Boolean): If True, valgrind exits with VALGRIND_ERROR_EXITCODE at the first error. Optional.
+            xml_path (string): If given, valgrind writes its XML output including all leaks to this file. Optional.
+        Returns:
+            List of strings
+        """
+        profile=[]
+        if fail_fast:
+            profile=[f'--error-exitcode={VALGRIND_ERROR_EXITCODE}', '--exit-on-first-error=yes']
+        if xml_path is not None:
+            profile+=['--xml=yes', f'--xml-file={xml_path}', '--leak-check=full', '--show-leak-kinds=all']
+        return [self.configuration["VALGRIND_PATH"]] \
+            +[f'--log-file={valgrind_out_path}'] \
+            +profile \
+            +c_args
+
+    def valgrind_streams(self, devnull):
+        """
+        Selects where the output of the submission executed with valgrind is written to.
+        It is only shown if the valgrind flag is set.
+        Parameters:
+            devnull (file object): opened os.devnull, used if the output is not shown
+        """
+        if self.args.valgrind:
+            return sys.stdout, sys.stderr
+        return devnull, devnull
+
+    def collect_valgrind(self, result, returncode, valgrind_out_path, xml_path=None):
+        """
+        Parses the valgrind log of an execution into a ValgrindOutput object.
+        If valgrind wrote XML output, it is parsed instead of the log.
+        The log is removed together with the workspace of the execution.
+        Does not commit to the database.
+        Parameters:
+            result (TestcaseResult object): The results from the corresponding "normal" testcase execution.
+            returncode (int): Return code of the valgrind subprocess.
+            valgrind_out_path (string): File the valgrind log was written to.
+            xml_path (string): File the XML output was written to. Optional.
+        Returns:
+            ValgrindOutput object (can be None)
+        """
         valgrind_output=None
-        if p.returncode not in (-9, -15, None):
+        if returncode not in (-9, -15, None):
             try:
-                with open(self.configuration["VALGRIND_OUT_PATH"], 'br') as f:
-                    valgrind_output=ValgrindOutput.create_or_get(result.id)
-                    valgrind_output=parser.parse_valgrind_file(valgrind_output, f)
+                if xml_path is not None:
+                    with open(xml_path, 'br') as f:
+                        valgrind_output=self.get_valgrind_output(result)
+                        valgrind_output=ResultParser.parse_valgrind_xml(valgrind_output, f)
+                else:
+                    with open(valgrind_out_path, 'br') as f:
+                        valgrind_output=self.get_valgrind_output(result)
+                        valgrind_output=ResultParser.parse_valgrind_file(valgrind_output, f)
                 if self.args.valgrind:
-                    with open(self.configuration["VALGRIND_OUT_PATH"], 'br') as f:
+                    with open(valgrind_out_path, 'br') as f:
                         logging.info("\nValgrind output:\n")
                         for line in f.readlines():
                             logging.info(line)
@@ -487,13 +877,8 @@ class TestcaseExecutor:
             except FileNotFoundError:
                 logging.error("Valgrind output file was not found.")
                 pass
-        if self.args.verbose:
-            logging.info(f'--- finished valgrind '
-                         f'{"".join(submission.submission_path.split("/")[-2:])} < '
-                         f'{testcase.short_id} ---')
-        unlink_as_cpr(self.configuration["VALGRIND_OUT_PATH"], self.sudo)
         return valgrind_output
-    
+
     def execute_valgrind_unshare(self, submission, testcase, result, c_args):
         """
         This function checks with valgrind if a submission is sound.
@@ -520,7 +905,7 @@ class TestcaseExecutor:
             logging.info(f'--- executing valgrind '
                          f'{"".join(submission.submission_path.split("/")[-2:])} '
                          f'< {testcase.short_id} ---')
-        with NamedPipeOpen(f"{testcase.path}.stdin") as fin:
+        with InputPipe(f"{testcase.path}.stdin") as fin:
             p=subprocess.Popen(self.sudo
                                +self.unshare
                                +[self.configuration["VALGRIND_PATH"]
@@ -558,44 +943,147 @@ class TestcaseExecutor:
         return valgrind_output
 
 
-    def get_limits(self, testcase):
+    def cache_key(self, testcase, executable_hash):
+        """
+        Builds the key of the cached result of executing an executable with a testcase.
+        Results with the same key are identical apart from the measured times, so the execution can be skipped.
+        The key consists of the hash of the executable, the hashes of the input and the expected output,
+        the type of the testcase, the limits, the sandbox and the configuration of the memory check.
+        Parameters:
+            testcase (Testcase object): the testcase
+            executable_hash (string): SHA-256 hash of the executable
+        Returns:
+            key (string), None if the hash of the input of the testcase is unknown
+        """
+        if testcase.input_hash is None:
+            return None
+        parts=[executable_hash, testcase.input_hash, testcase.expected_output_hash, testcase.type,
+               testcase.valgrind_needed, self.get_limits(testcase), self.get_memory_limit(testcase),
+               self.get_timeout(testcase),
+               self.get_output_limit(testcase), self.configuration.get("SANDBOX", "rlimit"), SANDBOX_VERSION,
+               self.configuration.get("MEMCHECK", "valgrind"), self.valgrind_xml(), self.args.final]
+        return hashlib.sha256('\0'.join(str(part) for part in parts).encode()).hexdigest()
+
+    def get_limits(self, testcase, calibrated=True):
         """
         Returns resource limits based on command line flags and the testcase.
         Testcases can have their individual resource limits which can be set in the .json file
         which corresponds to the testcase.
-
-
+        If the testcase was calibrated with the reference solution (see logic/calibration.py), the CPU limit
+        is LIMIT_FACTOR times its baseline instead, but never exceeds RLIMIT_CPU.
+        The data limit limits the virtual memory, so it is not derived from the resident set size of the reference
+        solution. A calibrated memory limit is only applied to the resident memory in a cgroup, see get_memory_limit().
 
         Parameters:
             testcase (Testcase object): Testcase for which the
+            calibrated (bool): Whether the calibration of the testcase is used. Optional.
 
         Returns:
             List of Integers, representing limits for the data segment of the process, the stack size
             and the available CPU resources
 
         """
-        if not self.args.final and testcase.rlimit is None:
-            return [self.configuration["RLIMIT_DATA"], self.configuration["RLIMIT_STACK"],
-                    self.configuration["RLIMIT_CPU"]]
-        elif not self.args.final:
-            data_limit=max(testcase.rlimit, 10000000)
-            return [data_limit, self.configuration["RLIMIT_STACK"], self.configuration["RLIMIT_CPU"]]
+        if not self.args.final:
+            data_limit=self.configuration["RLIMIT_DATA"] if testcase.rlimit is None else max(testcase.rlimit, 10000000)
+            cpu_limit=self.configuration["RLIMIT_CPU"]
+            if calibrated and self.is_calibrated(testcase):
+                factor=self.configuration["LIMIT_FACTOR"]
+                cpu_limit=min(max(math.ceil(testcase.baseline_cpu_time*factor),
+                                  self.configuration.get("LIMIT_MIN_CPU", 1)), cpu_limit)
+            return [data_limit, self.configuration["RLIMIT_STACK"], cpu_limit]
         else:
             data_limit=max(testcase.rlimit, 10000000)
             return [data_limit*self.configuration["RLIMIT_DATA_CARELESS_FACTOR"],
                     self.configuration["RLIMIT_STACK_CARELESS"], self.configuration["RLIMIT_CPU_CARELESS"]]
 
-    def set_limits(self):
+    def get_memory_limit(self, testcase, limits=None):
+        """
+        Returns the maximum memory usage of an execution in a cgroup (memory.max), which limits the resident memory.
+        For calibrated testcases this is LIMIT_FACTOR times the maximum resident set size of the reference solution,
+        but at least 10 MB. The data limit, e.g. the one set in the .json file of the testcase, is an upper bound.
+        Parameters:
+            testcase (Testcase object)
+            limits (list of ints): limits as returned by get_limits(). Optional.
+        Returns:
+            Integer
+        """
+        if limits is None:
+            limits=self.get_limits(testcase)
+        if self.args.final or not self.is_calibrated(testcase) or testcase.baseline_mrss is None:
+            return limits[0]
+        return min(max(int(testcase.baseline_mrss*self.configuration["LIMIT_FACTOR"]), 10000000), limits[0])
+
+    def is_calibrated(self, testcase):
+        """
+        Returns whether baselines were measured for a testcase and limits derived from them should be used.
+        Parameters:
+            testcase (Testcase object)
+        Returns:
+            Boolean
+        """
+        return self.configuration.get("LIMIT_FACTOR") is not None and testcase.baseline_tictoc is not None
+
+    def get_timeout(self, testcase):
+        """
+        Returns the number of seconds after which the execution of a testcase is killed.
+        For calibrated testcases this is LIMIT_FACTOR times the wall clock time the reference solution needed,
+        but at least LIMIT_MIN_TIMEOUT seconds. Otherwise it is 150 seconds.
+        Parameters:
+            testcase (Testcase object)
+        Returns:
+            Float
+        """
+        if self.args.final or not self.is_calibrated(testcase):
+            return 150
+        return min(max(testcase.baseline_tictoc*self.configuration["LIMIT_FACTOR"],
+                       self.configuration.get("LIMIT_MIN_TIMEOUT", 5)), 150)
+
+    def get_valgrind_timeout(self, testcase):
+        """
+        Returns the number of seconds after which the execution of a testcase with valgrind is killed.
+        For calibrated testcases this is the timeout of a normal execution multiplied by VALGRIND_SLOWDOWN.
+        Otherwise it is 300 seconds.
+        Parameters:
+            testcase (Testcase object)
+        Returns:
+            Float
+        """
+        if self.args.final or not self.is_calibrated(testcase):
+            return 300
+        return min(self.get_timeout(testcase)*self.configuration.get("VALGRIND_SLOWDOWN", 20), 300)
+
+    def get_output_limit(self, testcase):
+        """
+        Returns the maximum number of bytes an execution of a testcase may write to its stdout and stderr files.
+        The kernel terminates the submission with SIGXFSZ once it exceeds this limit, so submissions stuck
+        in a loop printing output do not run until the timeout.
+        The limit is a multiple of the size of the expected output, but at least OUTPUT_LIMIT_MIN.
+
+        Parameters:
+            testcase (Testcase object): Testcase which is executed
+
+        Returns:
+            Integer
+        """
+        minimum=self.configuration.get("OUTPUT_LIMIT_MIN", 1048576)
+        if testcase.expected_size is None:
+            return minimum
+        return max(minimum, testcase.expected_size*self.configuration.get("OUTPUT_LIMIT_FACTOR", 4))
+
+    def set_limits(self, limits=None):
         """
         Sets runtime resources for a process using the class variable limits.
         Run for the subprocess before a testcase is executed for a submission.
-        Parameters: None
+        Parameters:
+            limits (list of ints): limits as returned by get_limits(). Optional, defaults to the class variable limits.
+            Needs to be passed when several executions are started concurrently.
         Returns: Nothing
         """
-        # global limits
-        resource.setrlimit(resource.RLIMIT_DATA, 2*(self.limits[0],))
-        resource.setrlimit(resource.RLIMIT_STACK, 2*(self.limits[1],))
-        resource.setrlimit(resource.RLIMIT_CPU, 2*(self.limits[2],))
+        if limits is None:
+            limits=self.limits
+        resource.setrlimit(resource.RLIMIT_DATA, 2*(limits[0],))
+        resource.setrlimit(resource.RLIMIT_STACK, 2*(limits[1],))
+        resource.setrlimit(resource.RLIMIT_CPU, 2*(limits[2],))
 
 
 class DockerError(RuntimeError):
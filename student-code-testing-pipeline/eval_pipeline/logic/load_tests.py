@@ -17,6 +17,7 @@ def load_tests(configuration):
     Loads the in the config file specified testcases for good, bad and extra.
     Testcases can be given the type UNSPECIFIED here if the type could not be derived from the folder structure
     or no corresponding ".json" file containing a description of the testcase was found.
+    For every testcase the fingerprint of the expected output is stored, which is used to compare the outputs of submissions.
 
     Parameters:
         configuration (dict): configuration '/resources/config_testcase_executor.config' as dict
@@ -67,6 +68,7 @@ def load_tests(configuration):
                                 rlimit=1000000
                             Testcase.create_or_update(path, short_id, description, hint, type, valgrind=valgrind,
                                                       rlimit=rlimit)
+                            Testcase.update_expected_output(short_id, path)
                     else:
                         description=short_id
                         hint=f"bei {short_id}"
@@ -82,3 +84,4 @@ def load_tests(configuration):
                                 f" or create an .json file that specifies the type.")
                         else:
                             Testcase.create_or_update(path, short_id, description, hint, testcase_type)
+                            Testcase.update_expected_output(short_id, path)
@@ -31,19 +31,25 @@ class PerformanceEvaluator:
 
     def evaluate_performance(self, submission, run):
         """
-        Checks whether a submission is performant based on a single run.
+        Checks whether a submission is performant based on a single run. Does not commit to database!
         Parameters:
             submission (Submission object): the respective submission
 
         Returns; Nothing
         """
-        performant=True
-        metric=TestcaseResult.get_avg_runtime(run)
-        if metric>float(self.configuration["THRESHOLD"]):
-            performant=False
+        performant=self.is_performant(TestcaseResult.get_avg_runtime(run))
         if submission.is_fast is False or submission.is_fast is None:
             submission.is_fast=performant
-            dbm.session.commit()
+
+    def is_performant(self, metric):
+        """
+        Checks whether an average runtime is below the threshold for fast submissions.
+        Parameters:
+            metric (float): average runtime of the testcases with type "GOOD"
+        Returns:
+            Boolean
+        """
+        return metric<=float(self.configuration["THRESHOLD"])
 
     def evaluate(self):
         """
@@ -5,12 +5,13 @@
 import csv
 import datetime
 import sys
+from itertools import groupby
 import logging
 from database.students import Student
 from database.submissions import Submission
 from database.runs import Run
+from database.run_summaries import RunSummary
 from database.testcase_results import TestcaseResult
-from database.testcases import Testcase
 from util.colored_massages import red, yellow, green
 from util.htable import table_format
 from util.select_option import select_option_interactive
@@ -68,24 +69,21 @@ class ResultGenerator:
     def print_summary_stats_small(args):
         """
         Prints summarized stats for all students that have at least  one submission which has been checked.
+        The submissions, their runs and the summaries of the runs are loaded with a single query
+        and printed while they are fetched, see Submission.get_all_with_runs().
         Parameters:
             args (ArgumentParser object): contains the commandline arguments
         Returns: Nothing
         """
-        if args.unpassed:
-            students=Student.get_students_not_passed()
-            # logging.debug(students)
-        else:
-            students=Student.get_students_all()
-        for student in students:
-            sub_stud=Submission.get_all_for_name(student.name)
-            if len(sub_stud)>0:
-                print(f"Stats for {student.name}")
-            for submission, _ in sub_stud:
+        rows=Submission.get_all_with_runs(unpassed=args.unpassed)
+        for student, student_rows in groupby(rows, key=lambda row: row[0]):
+            print(f"Stats for {student.name}")
+            for submission, submission_rows in groupby(student_rows, key=lambda row: row[1]):
                 if submission.is_checked:
                     print(f"Submission from the {submission.submission_time}")
-                    run=Run.get_last_for_submission(submission)
-                    ResultGenerator.print_small_stats(run, sys.stdout)
+                    run=Run.select_last([run for _, _, run in submission_rows if run is not None])
+                    if run is not None:
+                        ResultGenerator.print_small_stats(run, sys.stdout)
 
     def add_line(self, student):
         """
@@ -162,6 +160,7 @@ class ResultGenerator:
     def print_small_stats(cls, run, f):
         """
         Print for a run the rough information about the number of failed and passed testcases.
+        The numbers are read from the summary of the run, see RunSummary.
         If  f=sys.stdout is used, then the lines are printed to the console.
         Parameters:
             run (Run object): Contains information about the execution of a submission
@@ -176,22 +175,22 @@ class ResultGenerator:
 
         output=output+(green('Compilation successful. '))
 
-        failed_bad=len(TestcaseResult.get_failed_bad(run))
-        failed_good=len(TestcaseResult.get_failed_good(run))
+        summary=RunSummary.get_for_run(run)
+        failed_bad=summary.bad_failed
+        failed_good=summary.good_failed
 
         if run.passed and run.manual_overwrite_passed:
             failed_bad=0
             failed_good=0
             print(f'This run was manually marked as passed (run.id={run.id})')
 
-        failed_bad=len(TestcaseResult.get_failed_bad(run))
-        all=len(Testcase.get_all_bad())
+        all=summary.bad_count
         if failed_bad>0:
             output=output+(red(f'{failed_bad} / {all} bad tests failed. '))
         else:
             output=output+(green(f'0 / {all} bad tests failed. '))
 
-        all=len(Testcase.get_all_good())
+        all=summary.good_count
         if failed_good>0:
             output=output+(red(f'{failed_good} / {all} good tests failed. '))
         else:
@@ -203,8 +202,10 @@ class ResultGenerator:
     def print_stats(cls, run, f):
         """
         Print for a run the exact information regarding failed and passed testcases.
-        Shows valgrind infos, segfaults, timeouts, return codes, whether the output was as expected
+        Shows valgrind infos, segfaults, timeouts, output overflows, return codes, whether the output was as expected
         and if applicable the description of the error.
+        The numbers of testcases are read from the summary of the run, see RunSummary.
+        The results of the failed testcases are only queried if there are any.
         If  f=sys.stdout is used, then the lines are printed to the console.
         Parameters:
             run (Run object): Contains information about the execution of a submission
@@ -226,8 +227,9 @@ class ResultGenerator:
             print(run.compiler_output, file=f)
             print(hline, file=f)
 
-        failed_bad=TestcaseResult.get_failed_bad(run)
-        failed_good=TestcaseResult.get_failed_good(run)
+        summary=RunSummary.get_for_run(run)
+        failed_bad=TestcaseResult.get_failed_bad(run) if summary.bad_failed>0 else []
+        failed_good=TestcaseResult.get_failed_good(run) if summary.good_failed>0 else []
 
         if run.passed and run.manual_overwrite_passed:
             failed_bad=[]
@@ -237,13 +239,13 @@ class ResultGenerator:
         if len(failed_bad)==0 and run.compilation_return_code==0:
             print(green('All tests concerning malicious input passed.'), file=f)
         else:
-            all=len(Testcase.get_all_bad())
+            all=summary.bad_count
             print(red(f'{len(failed_bad)} / {all} tests concerning malicious input failed.')
                   , file=f)
             print(file=f)
             failed_bad.sort(key=lambda x: x[1].short_id)
             print(table_format(
-                '{id} | {valgrind} | {valgrind_rw} | {segfault} | {timeout} | {return} | {output} | {error_description}',
+                '{id} | {valgrind} | {valgrind_rw} | {segfault} | {timeout} | {overflow} | {return} | {output} | {error_description}',
                 cls.create_stats(failed_bad),
                 titles='auto'), file=f)
             print(file=f)
@@ -251,13 +253,13 @@ class ResultGenerator:
         if len(failed_good)==0 and run.compilation_return_code==0:
             print(green('All tests concerning good input passed.'), file=f)
         else:
-            all=len(Testcase.get_all_good())
+            all=summary.good_count
             print(red(f'{len(failed_good)} / {all} tests concerning good input failed.')
                   , file=f)
             print(file=f)
             failed_good.sort(key=lambda x: x[1].short_id)
             print(table_format(
-                '{id} | {valgrind} | {valgrind_rw} | {segfault} | {timeout} | {return} | {output} | {error_description}',
+                '{id} | {valgrind} | {valgrind_rw} | {segfault} | {timeout} | {overflow} | {return} | {output} | {error_description}',
                 cls.create_stats(failed_good),
                 titles='auto'), file=f)
             print(file=f)
@@ -272,7 +274,7 @@ class ResultGenerator:
     def print_stats_testcase_result(cls, tc_result, tc, valgrind):
         """
         Prints exact information about the execution of a specific testcase for a specific run to the console.
-        Shows valgrind infos, segfaults, timeouts, return codes, whether the output was as expected
+        Shows valgrind infos, segfaults, timeouts, output overflows, return codes, whether the output was as expected
         and if applicable the description of the error.
 
         Parameters:
@@ -284,7 +286,7 @@ class ResultGenerator:
         """
         failed=[[tc_result, tc, valgrind]]
         print(table_format(
-            '{id} | {valgrind} | {valgrind_rw} | {segfault} | {timeout} | {return} | {output} | {error_description}',
+            '{id} | {valgrind} | {valgrind_rw} | {segfault} | {timeout} | {overflow} | {return} | {output} | {error_description}',
             cls.create_stats(failed),
             titles='auto'), file=sys.stdout)
         print(file=sys.stdout)
@@ -306,6 +308,7 @@ class ResultGenerator:
             line['valgrind_rw']=str(valgrind.invalid_read_count+valgrind.invalid_write_count) if valgrind is not None else ""
             line['segfault']=str(result.segfault)
             line['timeout']=str(result.timeout)
+            line['overflow']=str(result.output_overflow)
             line['return']=str(result.return_code)
             line['output']=str(result.output_correct)
             line['error_description']=str(result.error_msg_quality)
@@ -1,9 +1,13 @@
 """
 This module manages finding submissions to be checked and compiling submissions
 """
+import os
+import shutil
 import logging
 from util.select_option import select_option_interactive
-from util.gcc import hybrid_gcc, native_gcc
+from util.gcc import hybrid_gcc, native_gcc, speculative_gcc
+from util.compile_cache import CompileCache, crlf_normalised_hash, image_digest, compiler_version
+from util.absolute_path_resolver import resolve_absolute_path
 from database.submissions import Submission
 from database.runs import Run
 from database.students import Student
@@ -11,6 +15,9 @@ from database.students import Student
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
 
+# default for SANITIZER_FLAGS. Errors are recovered from, so all of them are reported like valgrind does.
+SANITIZER_FLAGS=['-O1', '-g', '-fno-omit-frame-pointer', '-fsanitize=address,undefined', '-fsanitize-recover=address']
+
 
 def retrieve_pending_submissions(args):
     """
@@ -53,19 +60,173 @@ def retrieve_pending_submissions(args):
     return submissions
 
 
-def compile_single_submission(args, configuration, submission, strict=True):
+def compile_single_submission(args, configuration, submission, workspace, strict=True, stats=None):
     """
-    Tries to compile a c file with a given configuration
+    Tries to compile a c file with a given configuration.
+    If MEMCHECK is set to "sanitizer", an additional executable compiled with sanitizers is created.
+    Compilations are taken from the compile cache if the same source was compiled with the same flags
+    and docker image before (see compile_cache()).
 
     Parameters:
         args (ArgumentParser object): Commandline arguments
         configuration (dict): Describes the configuration of the configuration c file
+        workspace (Workspace object): Workspace the executable "loesung" is placed in.
+            Its name is also used for the subdirectory of DOCKER_SHARED_DIRECTORY which is used for the compilation
+            in docker, so several submissions can be compiled at the same time.
         strict (boolean): Describes whether '-Werror' should be used as gcc flag
+        stats (CacheStats object): counts the lookups of the compile cache. Optional.
+
+    Returns:
+         Run object
+    """
+    return compile_submission(args, configuration, submission.id, submission.submission_path, workspace,
+                              strict, stats)
+
+
+def compile_submission(args, configuration, submission_id, path, workspace, strict=True, stats=None):
+    """
+    Compiles a submission given by its ID and path, see compile_single_submission().
+    Does not access the database, so it can be called from other threads.
+
+    Parameters:
+        submission_id (int): ID of the submission
+        path (string): path to the c file of the submission
+        other parameters: see compile_single_submission()
 
     Returns:
          Run object
     """
-    path=submission.submission_path
+    key, run=lookup_compilation(args, configuration, submission_id, path, workspace, strict, stats)
+    if run is not None:
+        return run
+    commandline, careless_flag, return_code, gcc_stderr=compile_source(args, configuration, path, workspace, strict)
+    if return_code==0:
+        compile_sanitizer(args, configuration, path, workspace)
+    store_compilation(args, configuration, key, workspace, commandline, return_code, gcc_stderr)
+    return Run(submission_id, commandline, careless_flag, return_code, gcc_stderr)
+
+
+def compile_submission_speculative(args, configuration, submission_id, path, workspace, strict=True, stats=None):
+    """
+    Compiles a submission like compile_submission(), but starts the compilation in docker and the native one
+    at the same time (see util.gcc.speculative_gcc()). Returns as soon as the native executable is available,
+    so testcases can be executed before the reference system decided whether the submission compiles.
+    Does not access the database, so it can be called from other threads.
+
+    Parameters:
+        see compile_submission()
+
+    Returns:
+        native_ok (boolean): Whether the native executable (and the one compiled with sanitizers) is available
+        finish (function): waits for the compilation in docker and returns the Run object, which is the same as
+            the one returned by compile_submission(). If its return code is not 0, the native executable is removed.
+    """
+    key, run=lookup_compilation(args, configuration, submission_id, path, workspace, strict, stats)
+    if run is not None:
+        return run.compilation_return_code==0, lambda: run
+    gcc_args, careless_flag=gcc_arguments(args, configuration, strict)
+    native_returncode, reference=speculative_gcc(
+        gcc_args,
+        path,
+        workspace.executable,
+        configuration['DOCKER_IMAGE_GCC'],
+        configuration['DOCKER_CONTAINER_GCC'],
+        configuration['DOCKER_SHARED_DIRECTORY'],
+        workspace.name,
+        configuration.get('COMPILE_SERVER', True))
+    if native_returncode==0:
+        compile_sanitizer(args, configuration, path, workspace)
+
+    def finish():
+        commandline, return_code, gcc_stderr=reference.result()
+        shutil.rmtree(os.path.join(configuration['DOCKER_SHARED_DIRECTORY'], workspace.name), ignore_errors=True)
+        if return_code!=0 and os.path.exists(workspace.sanitizer_executable):
+            os.remove(workspace.sanitizer_executable)
+        elif return_code==0 and native_returncode!=0:
+            # the executable compiled in docker is used, see util.gcc.speculative_gcc()
+            compile_sanitizer(args, configuration, path, workspace)
+        store_compilation(args, configuration, key, workspace, commandline, return_code, gcc_stderr)
+        return Run(submission_id, commandline, careless_flag, return_code, gcc_stderr)
+
+    return native_returncode==0, finish
+
+
+def lookup_compilation(args, configuration, submission_id, path, workspace, strict=True, stats=None):
+    """
+    Looks up a compilation in the compile cache and copies the cached executables into the workspace.
+
+    Parameters:
+        see compile_submission()
+
+    Returns:
+        key (string): key of the compilation in the cache, None if the cache is not used
+        run (Run object): cached run, None if the compilation is not cached
+    """
+    cache=compile_cache(args, configuration)
+    if cache is None:
+        return None, None
+    digest=image_digest(configuration['DOCKER_IMAGE_GCC'])
+    gcc_version=compiler_version(configuration['GCC_PATH'])
+    if digest is None or gcc_version is None:
+        return None, None
+    gcc_args, careless_flag=gcc_arguments(args, configuration, strict)
+    key=cache.key(crlf_normalised_hash(path), gcc_args, digest, gcc_version, sanitizer_arguments(args, configuration))
+    cached=cache.lookup(key, workspace)
+    if cached is None:
+        if stats is not None:
+            stats.miss()
+        return key, None
+    if stats is not None:
+        stats.hit()
+    logging.debug(f"Compilation of {path} cached")
+    return key, Run(submission_id, cached['commandline'], careless_flag, cached['return_code'], cached['gcc_stderr'])
+
+
+def store_compilation(args, configuration, key, workspace, commandline, return_code, gcc_stderr):
+    """
+    Stores a compilation in the compile cache.
+
+    Parameters:
+        key (string): key returned by lookup_compilation(), nothing is stored if it is None
+        other parameters: see CompileCache.store()
+
+    Returns: Nothing
+    """
+    if key is not None:
+        compile_cache(args, configuration).store(key, workspace, commandline, return_code, gcc_stderr)
+
+
+def compile_cache(args, configuration):
+    """
+    Returns the compile cache in COMPILE_CACHE_DIR.
+    Parameters:
+        args (ArgumentParser object): Commandline arguments
+        configuration (dict): Describes the configuration of the configuration c file
+    Returns:
+        CompileCache object, None if COMPILE_CACHE_DIR is not set or the cache is bypassed (flag --no-cache)
+    """
+    directory=configuration.get("COMPILE_CACHE_DIR")
+    if directory is None or args.no_cache:
+        return None
+    if not os.path.isabs(directory):
+        directory=resolve_absolute_path(directory)
+    return CompileCache(directory)
+
+
+def gcc_arguments(args, configuration, strict=True):
+    """
+    Returns the gcc arguments used for compiling a submission in docker.
+    The native compilation uses the same arguments without '-Werror'.
+
+    Parameters:
+        args (ArgumentParser object): Commandline arguments
+        configuration (dict): Describes the configuration of the configuration c file
+        strict (boolean): Describes whether '-Werror' should be used as gcc flag
+
+    Returns:
+        gcc_args (list of strings): gcc and its arguments up to the c file
+        careless_flag (boolean): Whether the flags for the final evaluation are used
+    """
     careless_flag=False
     gcc_args=[configuration["GCC_PATH"]]+ \
              configuration["CFLAGS"]
@@ -77,12 +238,83 @@ def compile_single_submission(args, configuration, submission, strict=True):
 
     if not strict:
         gcc_args.remove('-Werror')
-    submission_executable_path='/tmp/loesung'
+    return gcc_args, careless_flag
+
+
+def compile_source(args, configuration, path, workspace, strict=True):
+    """
+    Compiles a c file into the executable of a workspace, first in the docker container of the reference system
+    and then with the native gcc. Unless COMPILE_SERVER is false, the compilation in docker is done by a compile server
+    which is kept running in the container (see util.gcc).
+
+    Parameters:
+        args (ArgumentParser object): Commandline arguments
+        configuration (dict): Describes the configuration of the configuration c file
+        path (string): path to the c file
+        workspace (Workspace object): Workspace the executable "loesung" is placed in.
+        strict (boolean): Describes whether '-Werror' should be used as gcc flag
+
+    Returns:
+        commandline (string): Command that was used
+        careless_flag (boolean): Whether the flags for the final evaluation were used
+        return_code (int): Return code of gcc
+        gcc_stderr (string): Error output of gcc
+    """
+    gcc_args, careless_flag=gcc_arguments(args, configuration, strict)
     commandline, return_code, gcc_stderr=hybrid_gcc(
         gcc_args,
         path,
-        submission_executable_path,
+        workspace.executable,
         configuration['DOCKER_IMAGE_GCC'],
         configuration['DOCKER_CONTAINER_GCC'],
-        configuration['DOCKER_SHARED_DIRECTORY'])
-    return Run(submission.id, commandline, careless_flag, return_code, gcc_stderr)
+        configuration['DOCKER_SHARED_DIRECTORY'],
+        workspace.name,
+        configuration.get('COMPILE_SERVER', True))
+    shutil.rmtree(os.path.join(configuration['DOCKER_SHARED_DIRECTORY'], workspace.name), ignore_errors=True)
+    return commandline, careless_flag, return_code, gcc_stderr
+
+
+def compile_sanitizer(args, configuration, path, workspace):
+    """
+    Compiles a c file with AddressSanitizer and UndefinedBehaviorSanitizer using the native gcc,
+    if MEMCHECK is set to "sanitizer". Testcases requiring valgrind are checked with this executable first,
+    see TestcaseExecutor.run_memcheck(). The executable is not created for the final evaluation (flag -F),
+    which always uses valgrind.
+    The flags are CFLAGS without -Werror followed by SANITIZER_FLAGS.
+
+    Parameters:
+        args (ArgumentParser object): Commandline arguments
+        configuration (dict): Describes the configuration of the configuration c file
+        path (string): path to the c file
+        workspace (Workspace object): Workspace the executable "loesung_sanitizer" is placed in.
+
+    Returns:
+        Boolean: Whether the executable was created
+    """
+    gcc_args=sanitizer_arguments(args, configuration)
+    if gcc_args is None:
+        return False
+    commandline, return_code, gcc_stderr=native_gcc(gcc_args, path, workspace.sanitizer_executable)
+    if return_code!=0:
+        logging.warning(f"Compiling with sanitizers failed, valgrind is used instead:\n{commandline}\n{gcc_stderr}")
+        return False
+    return True
+
+
+def sanitizer_arguments(args, configuration):
+    """
+    Returns the gcc arguments used by compile_sanitizer().
+
+    Parameters:
+        args (ArgumentParser object): Commandline arguments
+        configuration (dict): Describes the configuration of the configuration c file
+
+    Returns:
+        gcc_args (list of strings): gcc and its arguments up to the c file,
+            None if no executable is compiled with sanitizers
+    """
+    if configuration.get("MEMCHECK", "valgrind")!="sanitizer" or args.final:
+        return None
+    return [configuration["GCC_PATH"]]+ \
+           [flag for flag in configuration["CFLAGS"] if flag!='-Werror']+ \
+           configuration.get("SANITIZER_FLAGS", SANITIZER_FLAGS)
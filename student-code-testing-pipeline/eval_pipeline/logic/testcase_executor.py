@@ -11,9 +11,10 @@ import logging
 from util.absolute_path_resolver import resolve_absolute_path
 from util.colored_massages import Warn, Passed, Failed
 from util.config_reader import ConfigReader
-from util.named_pipe_open import NamedPipeOpen
+from util.input_pipe import InputPipe
 from util.result_parser import ResultParser
-from util.executor_utils import unlink_safe, unlink_as_cpr, getmtime, sort_first_arg_and_diff, sudokill
+from util.executor_utils import unlink_safe, unlink_as_cpr, getmtime, sudokill
+from util.fingerprint import compare_unordered
 from logic.performance_evaluator import PerformanceEvaluator
 from logic.result_generator import ResultGenerator
 from logic.load_tests import load_tests
@@ -21,6 +22,7 @@ from logic.retrieve_and_compile import retrieve_pending_submissions, compile_sin
 from database.testcases import Testcase
 from database.submissions import Submission
 from database.runs import Run
+from database.run_summaries import RunSummary
 from database.testcase_results import TestcaseResult
 import database.database_manager as dbm
 # from database.students import Student
@@ -136,7 +138,7 @@ class TestCaseExecutor:
 
         for test in Testcase.get_all_good():
             logging.debug("Testcase GOOD "+str(test.short_id))
-            testcase_result, valgrind_output=self.check_output(submission, run, test, sort_first_arg_and_diff)
+            testcase_result, valgrind_output=self.check_output(submission, run, test, compare_unordered)
             dbm.session.add(testcase_result)
             if valgrind_output is not None: dbm.session.add(valgrind_output)
 
@@ -144,7 +146,7 @@ class TestCaseExecutor:
         # but if they don't they have to return the correct value
         for test in Testcase.get_all_bad_or_output():
             logging.debug("Testcase BAD or OUTPUT "+str(test.short_id))
-            testcase_result, valgrind_output=self.check_for_error_or_output(submission, run, test, sort_first_arg_and_diff)
+            testcase_result, valgrind_output=self.check_for_error_or_output(submission, run, test, compare_unordered)
             dbm.session.add(testcase_result)
             if valgrind_output is not None: dbm.session.add(valgrind_output)
 
@@ -152,7 +154,7 @@ class TestCaseExecutor:
         dbm.session.commit()
         submission.timestamp=datetime.datetime.now()
 
-        passed=Run.is_passed(run)
+        passed=RunSummary.update_for_run(run).passed
         if passed:
             run.passed=True
             if student.grade!=2:
@@ -160,6 +162,7 @@ class TestCaseExecutor:
             dbm.session.commit()
             performance_evaluator=PerformanceEvaluator()
             performance_evaluator.evaluate_performance(submission, run)
+            dbm.session.commit()
         else:
             run.passed=False
             dbm.session.commit()
@@ -167,9 +170,10 @@ class TestCaseExecutor:
             # if passed and  force_performance:
             logging.info('fast submission; running performance tests')
             for test in Testcase.get_all_performance():
-                testcase_result, valgrind_output=self.check_output(submission, run, test, sort_first_arg_and_diff)
+                testcase_result, valgrind_output=self.check_output(submission, run, test, compare_unordered)
                 dbm.session.add(testcase_result)
                 if valgrind_output is not None: dbm.session.add(valgrind_output)
+            RunSummary.update_for_run(run)
 
         if passed:
             Passed()
@@ -289,7 +293,7 @@ class TestCaseExecutor:
                          f'< {testcase.short_id} ---')
         tic=time.time()
 
-        with NamedPipeOpen(f"{testcase.path}.stdin") as fin, \
+        with InputPipe(f"{testcase.path}.stdin") as fin, \
                 open('test.stdout', 'bw') as fout, \
                 open('test.stderr', 'bw') as ferr:
             out, err=fout, ferr
@@ -348,7 +352,7 @@ class TestCaseExecutor:
                 logging.info(f'--- executing valgrind '
                              f'{"".join(submission.submission_path.split("/")[-2:])} '
                              f'< {testcase.short_id} ---')
-            with NamedPipeOpen(f"{testcase.path}.stdin") as fin:
+            with InputPipe(f"{testcase.path}.stdin") as fin:
                 p=subprocess.Popen(self.sudo
                                    +self.unshare
                                    +[self.configuration["VALGRIND_PATH"],
@@ -1,23 +1,32 @@
 """
 This module manages the checking of submissions.
 """
+import asyncio
 import datetime
+import multiprocessing
 import os
 import sys
+import queue
+import threading
 import logging
 from util.absolute_path_resolver import resolve_absolute_path
 from util.colored_massages import Warn, Passed, Failed
 from util.config_reader import ConfigReader
 from util.result_parser import ResultParser
-from util.executor_utils import unlink_safe, sort_first_arg_and_diff
+from util.fingerprint import compare_to_testcase, hash_file
+from util.cache_stats import CacheStats
+from util.progress import StageProgress
 from logic.executions import TestcaseExecutor
 from logic.performance_evaluator import PerformanceEvaluator
 from logic.result_generator import ResultGenerator
 from logic.load_tests import load_tests
-from logic.retrieve_and_compile import retrieve_pending_submissions, compile_single_submission
+from logic.retrieve_and_compile import retrieve_pending_submissions, compile_single_submission, compile_submission, \
+    compile_submission_speculative, compile_cache
 from database.testcases import Testcase
 from database.submissions import Submission
 from database.runs import Run
+from database.run_summaries import RunSummary
+from database.testcase_results import TestcaseResult
 import database.database_manager as dbm
 from database.students import Student
 from util.select_option import select_option_interactive
@@ -27,6 +36,76 @@ from util.select_option import select_option_interactive
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.DEBUG)
 
+# TestcasePipeline used by a worker process when submissions are checked in parallel (flag -j)
+worker_pipeline=None
+
+
+def init_worker(pipeline):
+    """
+    Initialises a worker process of the process pool used for checking submissions in parallel.
+    Each worker opens its own connection to the database which is only used for reading.
+    Parameters:
+        pipeline (TestcasePipeline object): pipeline inherited from the parent process
+    Returns: Nothing
+    """
+    global worker_pipeline
+    dbm.DatabaseManager()
+    worker_pipeline=pipeline
+
+
+def check_in_worker(submission_id):
+    """
+    Compiles and checks a single submission in a worker process.
+    Parameters:
+        submission_id (int): ID of the submission
+    Returns:
+        CheckedSubmission object
+    """
+    return worker_pipeline.check_detached(submission_id)
+
+
+def check_compiled_in_worker(compiled):
+    """
+    Checks a submission compiled by the compile stage in a worker process, see TestcasePipeline.run_staged().
+    Parameters:
+        compiled (CompiledSubmission object)
+    Returns:
+        CheckedSubmission object
+    """
+    return worker_pipeline.check_compiled_detached(compiled.submission_id, compiled.run, compiled.workspace)
+
+
+class CompiledSubmission:
+    """
+    A submission compiled by the compile stage of TestcasePipeline.run_staged(), waiting to be checked.
+    Its executable is placed in its workspace, which is removed once the submission was checked.
+    """
+
+    def __init__(self, submission_id, run, workspace, compile_cache_stats, error=None):
+        self.submission_id=submission_id
+        self.run=run
+        self.workspace=workspace
+        self.compile_cache_stats=compile_cache_stats
+        # exception raised while compiling, e.g. a DockerError, which is raised again by the checking stage
+        self.error=error
+
+
+class CheckedSubmission:
+    """
+    Outcome of checking a submission in a worker process. Contains no objects attached to a database session,
+    so it can be sent back to the parent process which stores it in the database.
+    """
+
+    def __init__(self, submission_id, run):
+        self.submission_id=submission_id
+        self.run=run
+        # pairs of TestcaseResult and ValgrindOutput objects, None if no testcases were executed
+        self.results=None
+        self.performance_results=None
+        # lookups of the compile and result caches while checking this submission
+        self.compile_cache_stats=CacheStats('compile')
+        self.result_cache_stats=CacheStats('result')
+
 
 class TestcasePipeline:
     """
@@ -53,6 +132,17 @@ class TestcasePipeline:
         self.configuration=configuration
         self.args=args
         self.executor=TestcaseExecutor(args)
+        # results are collected in memory and stored by finish_check() in a single transaction
+        self.executor.detached=True
+        self.workers=args.workers if args.workers is not None else configuration.get("TESTCASE_WORKERS", 1)
+        self.jobs=args.jobs
+        self.compile_workers=args.compile_workers if args.compile_workers is not None \
+            else configuration.get("COMPILE_WORKERS", 0)
+        self.speculative=configuration.get("SPECULATIVE_COMPILE", False)
+        self.compile_cache_stats=CacheStats('compile')
+        self.result_cache_stats=CacheStats('result')
+        # refuses an unsafe compile cache before any submission is checked
+        compile_cache(args, configuration)
 
         # Loads testcases if required by commandline or if no testcases exist in database
         if args.load_tests or Testcase.get_all()==[]:
@@ -72,26 +162,341 @@ class TestcasePipeline:
         if pending_submissions in [None, [], [[]]]:
             logging.info("No new submissions to check")
             return
-        for submission, student in pending_submissions:
-            logging.info(f'Checking Submission of {student.name} from the {submission.submission_time}')
-            does_compile=compile_single_submission(self.args, self.configuration, submission)
+        if self.compile_workers>0 and len(pending_submissions)>1:
+            self.run_staged(pending_submissions)
+        elif self.jobs>1:
+            self.run_parallel(pending_submissions)
+        else:
+            for submission, student in pending_submissions:
+                logging.info(f'Checking Submission of {student.name} from the {submission.submission_time}')
+                with self.executor.create_workspace() as workspace:
+                    self.check_submission(student, submission, workspace)
+        self.compile_cache_stats.log()
+        self.result_cache_stats.log()
+
+    def check_submission(self, student, submission, workspace):
+        """
+        Compiles a submission and checks it if the compilation was successful.
+        Parameters:
+            student (Student object):  the student which is the author of this submission.
+            submission (Submission object): the submission to test
+            workspace (Workspace object): Workspace the submission is compiled in
+        Returns: Nothing
+        """
+        if self.speculative:
+            # check_speculative() counts the lookups of the result cache for this submission only
+            result_cache_stats=self.result_cache_stats
+            try:
+                checked=self.check_speculative(submission, workspace)
+            finally:
+                self.result_cache_stats=result_cache_stats
+            self.store_checked_submission(checked)
+            return
+        does_compile=compile_single_submission(self.args, self.configuration, submission, workspace,
+                                               stats=self.compile_cache_stats)
+        self.check_compiled(student, submission, does_compile, workspace)
 
-            run=Run.insert_run(does_compile)
+    def check_compiled(self, student, submission, does_compile, workspace):
+        """
+        Stores the run of a compiled submission and checks the submission if the compilation was successful.
+        The run and the results of the check are committed to the database in one transaction.
+        Parameters:
+            student (Student object):  the student which is the author of this submission.
+            submission (Submission object): the submission to test
+            does_compile (Run object): run returned by compile_single_submission(), not yet stored in the database
+            workspace (Workspace object): Workspace containing the executable of the submission
+        Returns: Nothing
+        """
+        run=Run.insert_run(does_compile)
+
+        if not self.args.compile:
+            if run.compilation_return_code==0:
+                self.check(student, submission, run, workspace)
+                logging.info(f'Submission of '
+                                f'{student.name} submitted at '
+                                f'{submission.submission_time} did compile.')
+            else:
+                logging.warning(f'Submission of '
+                                f'{student.name} submitted at '
+                                f'{submission.submission_time} did not compile.')
+                submission.is_checked=True
+        else:
+            logging.debug(f"Just compiled, no testcases executed")
+        dbm.session.commit()
 
-            if not self.args.compile:
-                if run.compilation_return_code==0:
-                    self.check(student, submission, run)
-                    logging.info(f'Submission of '
-                                    f'{student.name} submitted at '
-                                    f'{submission.submission_time} did compile.')
-                else:
-                    logging.warning(f'Submission of '
-                                    f'{student.name} submitted at '
-                                    f'{submission.submission_time} did not compile.')
-                    submission.is_checked=True
-                    dbm.session.commit()
+    def run_parallel(self, pending_submissions):
+        """
+        Compiles and checks the pending submissions using a pool of self.jobs worker processes.
+        Every worker compiles and executes a submission in its own directory and sends the results back.
+        All results are written to the database by this process, so the workers never write to the database.
+        Parameters:
+            pending_submissions (list of pairs of Submission and Student objects)
+        Returns: Nothing
+        """
+        submission_ids=[submission.id for submission, student in pending_submissions]
+        # workers are forked, so no transaction may be open while they are created
+        dbm.session.commit()
+        context=multiprocessing.get_context('fork')
+        with context.Pool(self.jobs, initializer=init_worker, initargs=(self,)) as pool:
+            for checked in pool.imap_unordered(check_in_worker, submission_ids):
+                self.store_checked_submission(checked)
+
+    def run_staged(self, pending_submissions):
+        """
+        Compiles and checks the pending submissions in two stages, so compilations and executions overlap.
+        self.compile_workers threads compile the submissions into their own workspaces, while the submissions
+        compiled already are checked, by this process or by a pool of self.jobs worker processes (flag -j).
+        Compiled submissions wait in a queue with room for self.jobs submissions. Once it is full, the compile
+        threads wait until a submission was taken out, so they do not run arbitrarily far ahead of the checks.
+        All results are written to the database by this process.
+        Parameters:
+            pending_submissions (list of pairs of Submission and Student objects)
+        Returns: Nothing
+        """
+        # the compile threads must not access the database, so they only get the IDs and paths
+        pending=iter([(submission.id, submission.submission_path) for submission, student in pending_submissions])
+        pending_lock=threading.Lock()
+        compiled=queue.Queue(self.jobs)
+        progress=StageProgress(len(pending_submissions), ['compiled', 'checked'])
+
+        def compile_stage():
+            while True:
+                with pending_lock:
+                    submission_id, path=next(pending, (None, None))
+                if submission_id is None:
+                    return
+                workspace=self.executor.create_workspace()
+                stats=CacheStats('compile')
+                try:
+                    run=compile_submission(self.args, self.configuration, submission_id, path, workspace, stats=stats)
+                    compiled.put(CompiledSubmission(submission_id, run, workspace, stats))
+                except Exception as error:
+                    compiled.put(CompiledSubmission(submission_id, None, workspace, stats, error))
+                progress.advance('compiled')
+
+        pool=None
+        if self.jobs>1:
+            # workers are forked, so no transaction may be open and no compile thread may run while they are created
+            dbm.session.commit()
+            pool=multiprocessing.get_context('fork').Pool(self.jobs, initializer=init_worker, initargs=(self,))
+        threads=[threading.Thread(target=compile_stage, daemon=True) for _ in range(self.compile_workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            if pool is None:
+                self.check_stage(compiled, progress)
             else:
-                logging.debug(f"Just compiled, no testcases executed")
+                self.check_stage_parallel(compiled, progress, pool)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            # after an error, the compile threads stop once their current compilation is finished
+            with pending_lock:
+                for _ in pending:
+                    pass
+            # the queue is drained, so compile threads waiting for room can finish
+            while any(thread.is_alive() for thread in threads) or not compiled.empty():
+                try:
+                    compiled.get(timeout=0.1).workspace.close()
+                except queue.Empty:
+                    pass
+
+    def take_compiled(self, compiled):
+        """
+        Takes the next compiled submission out of the queue of run_staged().
+        Parameters:
+            compiled (Queue object): queue of CompiledSubmission objects
+        Returns:
+            CompiledSubmission object
+        """
+        item=compiled.get()
+        self.compile_cache_stats.add(item.compile_cache_stats)
+        if item.error is not None:
+            item.workspace.close()
+            raise item.error
+        return item
+
+    def check_stage(self, compiled, progress):
+        """
+        Checks the submissions compiled by the compile stage of run_staged() one after another in this process.
+        Parameters:
+            compiled (Queue object): queue of CompiledSubmission objects
+            progress (StageProgress object): progress of the stages
+        Returns: Nothing
+        """
+        for _ in range(progress.total):
+            item=self.take_compiled(compiled)
+            submission, student=Submission.get_by_id(item.submission_id)
+            logging.info(f'Checking Submission of {student.name} from the {submission.submission_time}')
+            with item.workspace as workspace:
+                self.check_compiled(student, submission, item.run, workspace)
+            progress.advance('checked')
+            progress.log(compiled.qsize())
+
+    def check_stage_parallel(self, compiled, progress, pool):
+        """
+        Checks the submissions compiled by the compile stage of run_staged() using a pool of worker processes.
+        At most one submission per worker is handed to the pool at a time.
+        Parameters:
+            compiled (Queue object): queue of CompiledSubmission objects
+            progress (StageProgress object): progress of the stages
+            pool (Pool object): worker processes initialised with init_worker()
+        Returns: Nothing
+        """
+        checked_submissions=queue.Queue()
+        workspaces={}
+        submitted=0
+        while progress.completed['checked']<progress.total:
+            if submitted<progress.total and len(workspaces)<self.jobs:
+                item=self.take_compiled(compiled)
+                workspaces[item.submission_id]=item.workspace
+                pool.apply_async(check_compiled_in_worker, (item,),
+                                 callback=checked_submissions.put, error_callback=checked_submissions.put)
+                submitted+=1
+                continue
+            checked=checked_submissions.get()
+            if isinstance(checked, BaseException):
+                raise checked
+            workspaces.pop(checked.submission_id).close()
+            self.store_checked_submission(checked)
+            progress.advance('checked')
+            progress.log(compiled.qsize())
+
+    def check_detached(self, submission_id):
+        """
+        Compiles and checks a submission without writing to the database. Used by the worker processes.
+        The executable and all files created during the executions are placed in a workspace
+        which is removed afterwards.
+        Parameters:
+            submission_id (int): ID of the submission
+        Returns:
+            CheckedSubmission object
+        """
+        submission, student=Submission.get_by_id(submission_id)
+        logging.info(f'Checking Submission of {student.name} from the {submission.submission_time}')
+        with self.executor.create_workspace() as workspace:
+            if self.speculative:
+                return self.check_speculative(submission, workspace)
+            # only the lookups for this submission are sent back
+            compile_cache_stats=CacheStats('compile')
+            run=compile_single_submission(self.args, self.configuration, submission, workspace,
+                                          stats=compile_cache_stats)
+            checked=self.check_compiled_detached(submission_id, run, workspace)
+            checked.compile_cache_stats=compile_cache_stats
+            return checked
+
+    def check_speculative(self, submission, workspace):
+        """
+        Compiles a submission speculatively (SPECULATIVE_COMPILE in the config file) and checks it without
+        writing to the database. The testcases are executed with the native executable while the submission
+        is still compiled in docker. If the reference system rejects the submission, their results are discarded,
+        so the outcome is the same as the one of check_detached().
+        Parameters:
+            submission (Submission object): the submission to test
+            workspace (Workspace object): Workspace the submission is compiled in
+        Returns:
+            CheckedSubmission object
+        """
+        compile_cache_stats=CacheStats('compile')
+        native_ok, finish=compile_submission_speculative(self.args, self.configuration, submission.id,
+                                                         submission.submission_path, workspace,
+                                                         stats=compile_cache_stats)
+        if native_ok:
+            # the performance testcases are executed after the compilation in docker finished,
+            # so it does not influence their timings
+            checked=self.check_compiled_detached(submission.id, Run(submission.id, None, False, 0, None), workspace,
+                                                 performance=False)
+            checked.run=finish()
+            if checked.run.compilation_return_code!=0:
+                checked.results=None
+            elif checked.results is not None:
+                checked.performance_results=self.check_performance_detached(submission, checked.run, checked.results,
+                                                                            workspace)
+        else:
+            # if only the native gcc failed, the executable compiled in docker is checked like in hybrid_gcc()
+            checked=self.check_compiled_detached(submission.id, finish(), workspace)
+        checked.compile_cache_stats=compile_cache_stats
+        return checked
+
+    def check_compiled_detached(self, submission_id, run, workspace, performance=True):
+        """
+        Checks a compiled submission without writing to the database, see check_detached().
+        Parameters:
+            submission_id (int): ID of the submission
+            run (Run object): run returned by compile_single_submission(), not stored in the database
+            workspace (Workspace object): Workspace containing the executable of the submission
+            performance (Boolean): If False, the performance testcases are not executed. Optional.
+        Returns:
+            CheckedSubmission object
+        """
+        submission, student=Submission.get_by_id(submission_id)
+        checked=CheckedSubmission(submission_id, run)
+        # only the lookups for this submission are sent back
+        self.result_cache_stats=checked.result_cache_stats
+        if self.args.compile or run.compilation_return_code!=0 or not self.needs_check(student, submission):
+            return checked
+        logging.info(f'running tests for '
+                     f'{student.name} submitted at '
+                     f'{submission.submission_time}')
+        testcases=Testcase.get_all_bad()+Testcase.get_all_good()+Testcase.get_all_bad_or_output()
+        checked.results=self.check_testcases(submission, run, testcases, workspace)
+        if performance:
+            checked.performance_results=self.check_performance_detached(submission, run, checked.results, workspace)
+        return checked
+
+    def check_performance_detached(self, submission, run, results, workspace):
+        """
+        Executes the performance testcases of a submission checked without writing to the database,
+        if finish_check() will store them. It makes the same decision as finish_check(): the submission has to pass
+        and be fast, either already or judging by the average runtime of its testcases with type "GOOD".
+        Parameters:
+            submission (Submission object): the submission to test
+            run (Run object): run of the submission, not stored in the database
+            results (list of pairs of TestcaseResult and ValgrindOutput objects): results of the executed testcases
+            workspace (Workspace object): Workspace containing the executable of the submission
+        Returns:
+            List of pairs of TestcaseResult and ValgrindOutput objects, None if they are not needed
+        """
+        passed=all(testcase_result.output_correct is not False
+                   and (valgrind_output is None or valgrind_output.ok is not False)
+                   for testcase_result, valgrind_output in results)
+        if not passed:
+            return None
+        if not submission.is_fast:
+            good={testcase.id for testcase in Testcase.get_all_good()}
+            runtimes=[testcase_result.tictoc for testcase_result, _ in results
+                      if testcase_result.testcase_id in good and testcase_result.tictoc is not None]
+            if len(runtimes)==0 or not PerformanceEvaluator().is_performant(sum(runtimes)/len(runtimes)):
+                return None
+        return self.check_testcases(submission, run, Testcase.get_all_performance(), workspace, concurrent=False)
+
+    def store_checked_submission(self, checked):
+        """
+        Stores a submission which was checked in a worker process in the database.
+        The parent process is the only one writing to the database. It receives the checked submissions from the
+        workers through the result queue of the pool and commits each of them in one transaction.
+        Parameters:
+            checked (CheckedSubmission object)
+        Returns: Nothing
+        """
+        submission, student=Submission.get_by_id(checked.submission_id)
+        run=Run.insert_run(checked.run)
+        self.compile_cache_stats.add(checked.compile_cache_stats)
+        self.result_cache_stats.add(checked.result_cache_stats)
+        if self.args.compile:
+            logging.debug(f"Just compiled, no testcases executed")
+        elif run.compilation_return_code!=0:
+            logging.warning(f'Submission of '
+                            f'{student.name} submitted at '
+                            f'{submission.submission_time} did not compile.')
+            submission.is_checked=True
+        elif checked.results is not None:
+            self.finish_check(student, submission, run, checked.results, checked.performance_results)
+            logging.info(f'Submission of '
+                         f'{student.name} submitted at '
+                         f'{submission.submission_time} did compile.')
+        dbm.session.commit()
 
     def check_single_testcase(self):
         """
@@ -123,28 +528,15 @@ class TestcasePipeline:
             testcase=select_option_interactive(testcases)
             print(f"\nTestcase {testcase.short_id} selected")
 
-            result, valgrind=None, None
-            run=compile_single_submission(self.args, self.configuration, submission)
-            dbm.session.add(run)
-            dbm.session.commit()
-
-            if testcase.type=="BAD":
-                result, valgrind=self.check_for_error(submission, run, testcase)
-            elif testcase.type=="BAD_OR_OUTPUT":
-                result, valgrind=self.check_for_error_or_output(submission, run, testcase, sort_first_arg_and_diff)
-            else:
-                result, valgrind=self.check_output(submission, run, testcase, sort_first_arg_and_diff)
+            with self.executor.create_workspace() as workspace:
+                # neither the run nor the result are added to the database session
+                run=compile_single_submission(self.args, self.configuration, submission, workspace,
+                                              stats=self.compile_cache_stats)
+                result, valgrind=self.check_testcases(submission, run, [testcase], workspace)[0]
 
             ResultGenerator.print_stats_testcase_result(result, testcase, valgrind)
-            if valgrind is not None:
-                dbm.session.delete(valgrind)
-                dbm.session.commit()
-            dbm.session.delete(result)
-            dbm.session.commit()
-            dbm.session.delete(run)
-            dbm.session.commit()
 
-    def check(self, student, submission, run, force_performance=False):
+    def check(self, student, submission, run, workspace, force_performance=False):
         """
         This functions initiates the checking of the submission of this student  for all testcases
         with type "GOOD", "BAD" and "BAD_OR_OUTPUT".
@@ -152,11 +544,35 @@ class TestcasePipeline:
         Parameters:
             student (Student object):  the student which is the author of this submission.
             submission (Submission object): the submission to test
+            run (Run object): Corresponding run
+            workspace (Workspace object): Workspace containing the executable of the submission
             force_performance (Boolean): tests testcases for performance too
         Returns
              True if a check was conducted, else False
         """
 
+        if not self.needs_check(student, submission):
+            return
+
+        logging.info(f'running tests for '
+                     f'{student.name} submitted at '
+                     f'{submission.submission_time}')
+        sys.stdout.flush()
+
+        testcases=Testcase.get_all_bad()+Testcase.get_all_good()+Testcase.get_all_bad_or_output()
+        results=self.check_testcases(submission, run, testcases, workspace)
+        self.finish_check(student, submission, run, results, workspace=workspace, force_performance=force_performance)
+
+    def needs_check(self, student, submission):
+        """
+        Decides whether the testcases have to be executed for a submission.
+        Submissions which have been checked already are only checked again if the rerun flag is set.
+        Parameters:
+            student (Student object):  the student which is the author of this submission.
+            submission (Submission object): the submission to test
+        Returns:
+            Boolean
+        """
         if submission.is_checked:
             if self.args.rerun:
                 Warn(f'You forced to re-run tests on submission by '
@@ -168,56 +584,58 @@ class TestcasePipeline:
                 logging.info(
                     f"Not running any testcases for {student.name} because the submission from the"
                     f" {submission.submission_time} has been checked already. Use -r to rerun the submission.")
-                return
+                return False
+        return True
 
-        logging.info(f'running tests for '
-                     f'{student.name} submitted at '
-                     f'{submission.submission_time}')
-        sys.stdout.flush()
-
-        for test in Testcase.get_all_bad():
-            logging.debug("Testcase BAD "+str(test.short_id))
-            testcase_result, valgrind_output=self.check_for_error(submission, run, test)
-            dbm.session.add(testcase_result)
-            if valgrind_output is not None: dbm.session.add(valgrind_output)
-
-        for test in Testcase.get_all_good():
-            logging.debug("Testcase GOOD "+str(test.short_id))
-            testcase_result, valgrind_output=self.check_output(submission, run, test, sort_first_arg_and_diff)
-            dbm.session.add(testcase_result)
-            if valgrind_output is not None: dbm.session.add(valgrind_output)
-
-        # This deals with testcases that are allowed to fail gracefully,
-        # but if they don't they have to return the correct value
-        for test in Testcase.get_all_bad_or_output():
-            logging.debug("Testcase BAD or OUTPUT "+str(test.short_id))
-            testcase_result, valgrind_output=self.check_for_error_or_output(submission, run, test,
-                                                                            sort_first_arg_and_diff)
-            dbm.session.add(testcase_result)
-            if valgrind_output is not None: dbm.session.add(valgrind_output)
+    def finish_check(self, student, submission, run, results, performance_results=None, workspace=None,
+                     force_performance=False):
+        """
+        Stores the results of checking a submission and its summary and decides whether the run is passed.
+        If the run passed and the submission is fast, the performance testcases are executed
+        unless their results are passed already.
+        Everything is committed in one transaction. If the performance testcases still have to be executed,
+        the other results are committed first, so no transaction is kept open while executing them.
+        Parameters:
+            student (Student object):  the student which is the author of this submission.
+            submission (Submission object): the submission to test
+            run (Run object): Corresponding run
+            results (list of pairs of TestcaseResult and ValgrindOutput objects): results of the executed testcases
+            performance_results (list of pairs of TestcaseResult and ValgrindOutput objects):
+                results of the performance testcases. Optional.
+            workspace (Workspace object): Workspace containing the executable of the submission.
+                Required if the performance testcases still have to be executed, otherwise they are skipped. Optional.
+            force_performance (Boolean): tests testcases for performance too
+        Returns: Nothing
+        """
+        self.store_results(run, results)
 
         submission.is_checked=True
-        dbm.session.commit()
         submission.timestamp=datetime.datetime.now()
 
-        passed=Run.is_passed(run)
+        passed=RunSummary.update_for_run(run).passed
         if passed:
             run.passed=True
             if student.grade!=2:
                 student.grade=1
-            dbm.session.commit()
             performance_evaluator=PerformanceEvaluator()
             performance_evaluator.evaluate_performance(submission, run)
         else:
             run.passed=False
-            dbm.session.commit()
         if passed and (submission.is_fast or force_performance):
             # if passed and  force_performance:
             logging.info('fast submission; running performance tests')
-            for test in Testcase.get_all_performance():
-                testcase_result, valgrind_output=self.check_output(submission, run, test, sort_first_arg_and_diff)
-                dbm.session.add(testcase_result)
-                if valgrind_output is not None: dbm.session.add(valgrind_output)
+            if performance_results is None and workspace is not None:
+                dbm.session.commit()
+                performance_results=self.check_testcases(submission, run, Testcase.get_all_performance(),
+                                                         workspace, concurrent=False)
+            if performance_results is not None:
+                self.store_results(run, performance_results)
+                # the summary covers all results of the run, like the one of a run that is checked again
+                RunSummary.update_for_run(run)
+            else:
+                logging.warning(f'Performance testcases of {student.name} were not executed, '
+                                f'the executable is no longer available. Use -r to rerun the submission.')
+        dbm.session.commit()
 
         if passed:
             Passed()
@@ -226,7 +644,186 @@ class TestcasePipeline:
             if self.args.verbose:
                 ResultGenerator.print_stats(run, sys.stdout)
 
-    def check_for_error(self, submission, run, test):
+    def store_results(self, run, results):
+        """
+        Adds the results of executed testcases to the database session. Does not commit to database!
+        Results are created outside of the session, in this process or in a worker process,
+        see TestcaseResult.store_detached().
+        Parameters:
+            run (Run object): Corresponding run
+            results (list of pairs of TestcaseResult and ValgrindOutput objects)
+        Returns: Nothing
+        """
+        TestcaseResult.store_detached(run.id, results)
+
+    def check_testcases(self, submission, run, testcases, workspace, concurrent=True):
+        """
+        Executes and evaluates a list of testcases for a submission.
+        Testcases which were executed with an identical executable before are not executed again,
+        their results are copied instead (see cached_results()).
+        Every execution uses its own workspace inside of workspace.
+        If more than one worker is configured (flag -w or TESTCASE_WORKERS in the config file),
+        the testcases are executed concurrently. The valgrind checks are always overlapped with the executions
+        of the following testcases, see check_testcases_concurrent().
+        No data is committed to the database here.
+        Parameters:
+            submission (Submission object): the submission to test
+            run (Run object): Corresponding run
+            testcases (list of Testcase objects): testcases to execute
+            workspace (Workspace object): Workspace containing the executable of the submission
+            concurrent (Boolean): If False, the testcases are executed one after another. Optional.
+                Performance testcases are always executed one after another to keep their timings comparable.
+        Returns:
+            List of pairs each containing a TestcaseResult object and a ValgrindResult object (can be None),
+            in the same order as testcases
+        """
+        keys=self.cache_keys(testcases, workspace)
+        results=self.cached_results(run, testcases, keys)
+        pending=[index for index, result in enumerate(results) if result is None]
+        executed=self.execute_testcases(submission, run, [testcases[index] for index in pending], workspace, concurrent)
+        for index, (testcase_result, valgrind_output) in zip(pending, executed):
+            # timeouts depend on the load of the machine, so they are executed again next time
+            if not testcase_result.timeout:
+                testcase_result.cache_key=keys[index]
+            results[index]=(testcase_result, valgrind_output)
+        return results
+
+    def cache_keys(self, testcases, workspace):
+        """
+        Builds the keys of the cached results for the executable of a workspace, see TestcaseExecutor.cache_key().
+        No keys are built if the cache is bypassed (flag --no-cache) or the output of the executions is shown
+        (flags -O and -V). Performance testcases are not cached, as their timings are measured again.
+        Parameters:
+            testcases (list of Testcase objects): testcases to execute
+            workspace (Workspace object): Workspace containing the executable of the submission
+        Returns:
+            List of keys in the same order as testcases, None for testcases which are not cached
+        """
+        if self.args.no_cache or self.args.output or self.args.valgrind or not os.path.exists(workspace.executable):
+            return [None]*len(testcases)
+        executable_hash=hash_file(workspace.executable)
+        return [None if test.type=="PERFORMANCE" else self.executor.cache_key(test, executable_hash)
+                for test in testcases]
+
+    def cached_results(self, run, testcases, keys):
+        """
+        Copies the cached results of the testcases to new TestcaseResult and ValgrindOutput objects for run.
+        No data is committed to the database here.
+        Parameters:
+            run (Run object): Corresponding run
+            testcases (list of Testcase objects): testcases to execute
+            keys (list of strings): keys as returned by cache_keys()
+        Returns:
+            List of pairs each containing a TestcaseResult object and a ValgrindResult object (can be None),
+            in the same order as testcases. None for testcases without cached result.
+        """
+        results=[]
+        for test, key in zip(testcases, keys):
+            cached_result, cached_valgrind=(None, None) if key is None else TestcaseResult.get_cached(key)
+            if cached_result is None:
+                if key is not None:
+                    self.result_cache_stats.miss()
+                results.append(None)
+                continue
+            self.result_cache_stats.hit()
+            logging.debug(f"Testcase {test.type} {test.short_id} cached")
+            testcase_result=self.executor.get_result(run, test)
+            testcase_result.update_from(cached_result)
+            valgrind_output=None
+            if cached_valgrind is not None:
+                valgrind_output=self.executor.get_valgrind_output(testcase_result)
+                valgrind_output.update_from(cached_valgrind)
+            results.append((testcase_result, valgrind_output))
+        return results
+
+    def execute_testcases(self, submission, run, testcases, workspace, concurrent=True):
+        """
+        Executes and evaluates a list of testcases for a submission, see check_testcases().
+        No data is committed to the database here.
+        Parameters:
+            submission (Submission object): the submission to test
+            run (Run object): Corresponding run
+            testcases (list of Testcase objects): testcases to execute
+            workspace (Workspace object): Workspace containing the executable of the submission
+            concurrent (Boolean): If False, the testcases are executed one after another. Optional.
+        Returns:
+            List of pairs each containing a TestcaseResult object and a ValgrindResult object (can be None),
+            in the same order as testcases
+        """
+        overlap_valgrind=any(test.valgrind_needed for test in testcases)
+        if concurrent and (self.workers>1 or overlap_valgrind) and len(testcases)>1:
+            return asyncio.run(self.check_testcases_concurrent(submission, run, testcases, workspace))
+        results=[]
+        for test in testcases:
+            logging.debug(f"Testcase {test.type} {test.short_id}")
+            with workspace.create() as execution:
+                if test.type=="BAD":
+                    results.append(self.check_for_error(submission, run, test, execution))
+                elif test.type=="BAD_OR_OUTPUT":
+                    results.append(self.check_for_error_or_output(submission, run, test, compare_to_testcase,
+                                                                  execution))
+                else:
+                    results.append(self.check_output(submission, run, test, compare_to_testcase, execution))
+        return results
+
+    async def check_testcases_concurrent(self, submission, run, testcases, workspace):
+        """
+        Executes and evaluates a list of testcases for a submission while at most self.workers executions run
+        at the same time. Each execution uses its own workspace, so they can not interfere with one another.
+        The valgrind check of a testcase is a separate job which does not occupy a worker, so the executions of the
+        following testcases do not wait for it. The number of valgrind checks running at the same time is limited
+        by the memory budget (see TestcaseExecutor.valgrind_slots()).
+        The ValgrindOutput of a testcase is attached to its result once the check finished.
+        No data is committed to the database here.
+        Parameters:
+            submission (Submission object): the submission to test
+            run (Run object): Corresponding run
+            testcases (list of Testcase objects): testcases to execute
+            workspace (Workspace object): Workspace containing the executable of the submission
+        Returns:
+            List of pairs each containing a TestcaseResult object and a ValgrindResult object (can be None),
+            in the same order as testcases
+        """
+        semaphore=asyncio.Semaphore(self.workers)
+        valgrind_semaphore=asyncio.Semaphore(self.executor.valgrind_slots())
+
+        async def check_one(test):
+            # the workspace is kept until valgrind finished, as valgrind writes its log to it
+            with workspace.create() as execution:
+                async with semaphore:
+                    logging.debug(f"Testcase {test.type} {test.short_id}")
+                    testcase_result, _=await self.executor.execute_testcase_async(test, submission, run, execution,
+                                                                                  valgrind=False)
+                    self.evaluate(test, testcase_result, compare_to_testcase, execution)
+                valgrind_output=None
+                if self.executor.needs_valgrind(test, testcase_result):
+                    async with valgrind_semaphore:
+                        valgrind_output=await self.executor.execute_valgrind_async(submission, test, testcase_result,
+                                                                                   ['./loesung'], execution)
+            return testcase_result, valgrind_output
+
+        return await asyncio.gather(*[check_one(test) for test in testcases])
+
+    def evaluate(self, test, testcase_result, comparator, workspace):
+        """
+        Evaluates the output of an executed testcase depending on the type of the testcase.
+        Parameters:
+            test (Testcase object): the executed testcase
+            testcase_result (TestcaseResult object): result of the execution
+            comparator (Function pointer): A function that should be used to determine if the output is correct.
+                Called with the path of the output and the testcase.
+            workspace (Workspace object): Workspace of the execution
+        Returns:
+            Nothing. Sets output_correct, error_msg_quality and error_line in testcase_result.
+        """
+        if test.type=="BAD":
+            self.evaluate_error(testcase_result, workspace)
+        elif test.type=="BAD_OR_OUTPUT":
+            self.evaluate_error_or_output(test, testcase_result, comparator, workspace)
+        else:
+            self.evaluate_output(test, testcase_result, comparator, workspace)
+
+    def check_for_error(self, submission, run, test, workspace):
         """
         Checks a submission for a "BAD" testcase.
         Here it is checked whether the submission produced the correct output for this testcase.
@@ -235,29 +832,16 @@ class TestcasePipeline:
             submission (Submission object): the submission to test
             run (Run object): Corresponding run
             test (Testcase object): testcase to execute
+            workspace (Workspace object): Workspace private to this execution
         Returns:
             a TestcaseResult object
             a ValgrindResult object (can be None)
         """
-        testcase_result, valgrind_output=self.executor.execute_testcase(test, submission, run)
-        testcase_result.error_line=''
-        testcase_result.output_correct=True
-        parser=ResultParser()
-        parser.parse_error_file(testcase_result)
-        if int(testcase_result.return_code)>0 and \
-                testcase_result.error_msg_quality is not None:
-            testcase_result.output_correct=True
-        else:
-            testcase_result.output_correct=False
-        logging.debug(
-            f"FAIL  Testcase, check for error: output correct {testcase_result.output_correct}, "
-            f"return_code {testcase_result.return_code} {(int(testcase_result.return_code))},"
-            f" error_msg_quality {testcase_result.error_msg_quality}")
-        unlink_safe("test.stderr")
-        unlink_safe("test.stdout")
+        testcase_result, valgrind_output=self.executor.execute_testcase(test, submission, run, workspace)
+        self.evaluate_error(testcase_result, workspace)
         return testcase_result, valgrind_output
 
-    def check_output(self, submission, run, test, comparator):
+    def check_output(self, submission, run, test, comparator, workspace):
         """
         Checks a submission for a "GOOD" testcase.
         Here it is checked whether the submission produced the correct output for this testcase.
@@ -267,17 +851,17 @@ class TestcasePipeline:
             run (Run object): Corresponding run
             test (Testcase object): testcase to execute
             comparator (Function pointer): A function that should be used to determine if the output is correct.
+                Called with the path of the output and the testcase.
+            workspace (Workspace object): Workspace private to this execution
         Returns:
             a TestcaseResult object
             a ValgrindResult object (can be None)
         """
-        testcase_result, valgrind_output=self.executor.execute_testcase(test, submission, run)
-        testcase_result.output_correct=comparator('test.stdout', os.path.join(test.path+'.stdout'))
-        unlink_safe("test.stderr")
-        unlink_safe("test.stdout")
+        testcase_result, valgrind_output=self.executor.execute_testcase(test, submission, run, workspace)
+        self.evaluate_output(test, testcase_result, comparator, workspace)
         return testcase_result, valgrind_output
 
-    def check_for_error_or_output(self, submission, run, test, comparator):
+    def check_for_error_or_output(self, submission, run, test, comparator, workspace):
         """
         Checks a submission for a "BAD_OR_OUTPUT" testcase.
         Here it is checked whether the submission produced the correct output for this testcase.
@@ -287,22 +871,74 @@ class TestcasePipeline:
             run (Run object): Corresponding run
             test (Testcase object): testcase to execute
             comparator (Function pointer): A function that should be used to determine if the output is correct.
+                Called with the path of the output and the testcase.
+            workspace (Workspace object): Workspace private to this execution
         Returns:
             a TestcaseResult object
             a ValgrindResult object (can be None)
         """
-        testcase_result, valgrind_output=self.executor.execute_testcase(test, submission, run)
-        testcase_result.output_correct=comparator('test.stdout', os.path.join(test.path+'.stdout'))
+        testcase_result, valgrind_output=self.executor.execute_testcase(test, submission, run, workspace)
+        self.evaluate_error_or_output(test, testcase_result, comparator, workspace)
+        return testcase_result, valgrind_output
+
+    def evaluate_error(self, testcase_result, workspace):
+        """
+        Evaluates the output of a "BAD" testcase. The submission has to fail with an error code and an error message.
+        Parameters:
+            testcase_result (TestcaseResult object): result of the execution
+            workspace (Workspace object): Workspace of the execution
+        Returns:
+            Nothing
+        """
+        testcase_result.error_line=''
+        testcase_result.output_correct=True
+        parser=ResultParser()
+        parser.parse_error_file(testcase_result, workspace)
+        if int(testcase_result.return_code)>0 and \
+                testcase_result.error_msg_quality is not None:
+            testcase_result.output_correct=True
+        else:
+            testcase_result.output_correct=False
+        logging.debug(
+            f"FAIL  Testcase, check for error: output correct {testcase_result.output_correct}, "
+            f"return_code {testcase_result.return_code} {(int(testcase_result.return_code))},"
+            f" error_msg_quality {testcase_result.error_msg_quality}")
+
+    def evaluate_output(self, test, testcase_result, comparator, workspace):
+        """
+        Evaluates the output of a "GOOD" testcase by comparing it to the expected output.
+        Parameters:
+            test (Testcase object): the executed testcase
+            testcase_result (TestcaseResult object): result of the execution
+            comparator (Function pointer): A function that should be used to determine if the output is correct.
+                Called with the path of the output and the testcase.
+            workspace (Workspace object): Workspace of the execution
+        Returns:
+            Nothing
+        """
+        testcase_result.output_correct=comparator(workspace.stdout, test)
+
+    def evaluate_error_or_output(self, test, testcase_result, comparator, workspace):
+        """
+        Evaluates the output of a "BAD_OR_OUTPUT" testcase.
+        The submission either has to produce the expected output or fail with an error code and an error message.
+        Parameters:
+            test (Testcase object): the executed testcase
+            testcase_result (TestcaseResult object): result of the execution
+            comparator (Function pointer): A function that should be used to determine if the output is correct.
+                Called with the path of the output and the testcase.
+            workspace (Workspace object): Workspace of the execution
+        Returns:
+            Nothing
+        """
+        self.evaluate_output(test, testcase_result, comparator, workspace)
         if testcase_result.output_correct is False:
             testcase_result.error_line=''
             testcase_result.output_correct=True
             parser=ResultParser()
-            parser.parse_error_file(testcase_result)
+            parser.parse_error_file(testcase_result, workspace)
             if testcase_result.return_code>0 and \
                     testcase_result.error_msg_quality>0:
                 testcase_result.output_correct=True
             else:
                 testcase_result.output_correct=False
-        unlink_safe("test.stderr")
-        unlink_safe("test.stdout")
-        return testcase_result, valgrind_output
@@ -16,6 +16,7 @@ from moodle.moodle_session import MoodleSession
 from database.submissions import Submission
 from database.students import Student
 from database.runs import Run
+from database.run_summaries import RunSummary
 from database.testcase_results import TestcaseResult
 import database.database_manager as dbm
 
@@ -222,6 +223,7 @@ class MoodleReporter:
     def generate_mail_content(self, student, submission, run):
         """
         Generates a notification mail for a given student and submission.
+        The results of failed testcases are only queried if the summary of the run contains any, see RunSummary.
         Parameters:
             student: the respective student
             submission: the respective submission
@@ -250,18 +252,20 @@ class MoodleReporter:
                 bad_failed_desc={}
                 good_failed_desc={}
                 bad_or_out_failed_desc={}
+                summary=RunSummary.get_for_run(run)
 
-                failed_bad=TestcaseResult.get_failed_bad(run)
+                failed_bad=TestcaseResult.get_failed_bad(run) if summary.bad_failed>0 else []
                 failed_bad.sort(key=lambda x: x[1].short_id)
                 for result, testcase, valgrind in failed_bad:
                     bad_failed_desc=self.get_failed_description(result, testcase, valgrind, bad_failed_desc)
 
-                failed_good=TestcaseResult.get_failed_good(run)
+                failed_good=TestcaseResult.get_failed_good(run) if summary.good_failed>0 else []
                 failed_good.sort(key=lambda x: x[1].short_id)
                 for result, testcase, valgrind in failed_good:
                     good_failed_desc=self.get_failed_description(result, testcase, valgrind, good_failed_desc)
 
-                failed_bad_or_out=TestcaseResult.get_failed_output_bad_or_output(run)
+                failed_bad_or_out=TestcaseResult.get_failed_output_bad_or_output(run) \
+                    if summary.bad_or_output_failed>0 else []
                 failed_bad_or_out.sort(key=lambda x: x[1].short_id)
                 for result, testcase in failed_bad_or_out:
                     bad_or_out_failed_desc=self.get_failed_description(result, testcase, valgrind,
@@ -355,8 +359,8 @@ class MoodleReporter:
         a dict.
         This dict contains for different error types a list of testcases for which the corresponding submission failed,
         which produced this error.
-        Error types are  timeout, segfault, wrong return code, valgrind leak, valgrind write error, valgrind read
-        error, wrong output and no error message.
+        Error types are  timeout, segfault, output overflow, wrong return code, valgrind leak, valgrind write error,
+        valgrind read error, wrong output and no error message.
 
         Parameters:
             result (TestcaseResult object): the results from running the testcase for a solution
@@ -375,6 +379,9 @@ class MoodleReporter:
         if result.timeout and result.segfault:
             self.append_self(testcase, description, "segfault")
 
+        if result.output_overflow:
+            self.append_self(testcase, description, "output_overflow")
+
         if not result.returncode_correct(testcase=testcase):
             self.append_self(testcase, description, "return_code")
 
@@ -400,7 +407,7 @@ class MoodleReporter:
             if result.error_msg_quality<1:
                 self.append_self(testcase, description, "error_massage")
         else:
-            if not result.output_correct and not result.timeout:
+            if not result.output_correct and not result.timeout and not result.output_overflow:
                 self.append_self(testcase, description, "output")
         return description
 
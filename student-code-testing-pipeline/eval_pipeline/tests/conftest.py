@@ -0,0 +1,9 @@
+"""
+The modules of the eval pipeline import each other relative to the directory eval_pipeline,
+just like when check.py is executed.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
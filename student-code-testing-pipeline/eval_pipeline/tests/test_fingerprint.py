@@ -0,0 +1,77 @@
+"""
+Tests of the order-insensitive comparison of outputs in util/fingerprint.py.
+"""
+
+import pytest
+from types import SimpleNamespace
+import util.fingerprint as fingerprint
+from util.fingerprint import fingerprint_file, compare_unordered, compare_to_testcase
+
+
+@pytest.fixture
+def write(tmp_path):
+    count=[0]
+
+    def write_file(content):
+        count[0]+=1
+        path=tmp_path/f"file{count[0]}"
+        path.write_bytes(content)
+        return str(path)
+    return write_file
+
+
+def test_reordered_lines_are_equal(write):
+    assert compare_unordered(write(b"c\na\nb\n"), write(b"a\nb\nc\n"))
+
+
+def test_different_lines_are_not_equal(write):
+    assert not compare_unordered(write(b"a\nb\nd\n"), write(b"a\nb\nc\n"))
+
+
+def test_duplicate_lines_are_counted(write):
+    assert not compare_unordered(write(b"a\na\nb\n"), write(b"a\nb\nb\n"))
+    assert not compare_unordered(write(b"a\nb\n"), write(b"a\na\nb\n"))
+    assert compare_unordered(write(b"b\na\na\n"), write(b"a\nb\na\n"))
+
+
+def test_empty_lines_are_counted(write):
+    assert not compare_unordered(write(b"a\n\nb\n"), write(b"a\nb\n"))
+
+
+def test_missing_final_newline_is_ignored(write):
+    assert compare_unordered(write(b"b\na"), write(b"a\nb\n"))
+    assert compare_unordered(write(b"b\na\n"), write(b"a\nb"))
+    assert fingerprint_file(write(b"a\nb"))==fingerprint_file(write(b"a\nb\n"))
+
+
+def test_empty_files(write):
+    assert compare_unordered(write(b""), write(b""))
+    assert not compare_unordered(write(b"\n"), write(b""))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7])
+def test_lines_spanning_chunks(write, monkeypatch, chunk_size):
+    content=b"abcdefgh\nxy\n\nlonger line\nz"
+    expected=fingerprint_file(write(content))
+    monkeypatch.setattr(fingerprint, "CHUNK_SIZE", chunk_size)
+    assert fingerprint_file(write(content))==expected
+    assert fingerprint_file(write(b"z\nlonger line\n\nxy\nabcdefgh\n"))==expected
+
+
+def test_max_size(write):
+    path=write(b"a\nb\nc\n")
+    assert fingerprint_file(path, max_size=6) is not None
+    assert fingerprint_file(path, max_size=5) is None
+
+
+def test_output_larger_than_expected_is_not_equal(write):
+    assert not compare_unordered(write(b"a\nb\n"*1000), write(b"a\nb\n"))
+    # the output may only have an additional newline at its end
+    assert compare_unordered(write(b"b\na\n"), write(b"a\nb"))
+
+
+def test_missing_expected_output_is_not_equal(write, tmp_path):
+    missing=str(tmp_path/"missing")
+    assert not compare_unordered(write(b"a\n"), missing)
+    testcase=SimpleNamespace(path=missing, expected_fingerprint=None, expected_size=None)
+    assert not compare_to_testcase(write(b"a\n"), testcase)
@@ -0,0 +1,115 @@
+"""
+Tests that the queries of the reports and of storing runs use the indexes declared on the models,
+by asking SQLite for the plans of the statements they execute (EXPLAIN QUERY PLAN) on an in-memory database.
+The database is empty, but has the statistics ANALYZE collects for a course, see add_missing_columns().
+"""
+
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+# the database modules have to be imported in the order check.py imports them
+import database.submissions
+import database.database_manager as dbm
+from database.base import Base
+from database.runs import Run
+from database.submissions import Submission
+# imported as module, pytest would collect TestcaseResult as a test class otherwise
+import database.testcase_results as testcase_results
+from database.run_summaries import RunSummary
+
+# rows of the tables and of the indexes per value of the first, second, ... column, as stored by ANALYZE
+STATISTICS=[
+    ("Student", None, "500"),
+    ("Submission", "ix_Submission_student_id_is_checked", "5000 10 5"),
+    ("Run", "ix_Run_submission_id_command_line_careless_flag", "10000 2 1 1"),
+    ("TestcaseResult", "ix_TestcaseResult_run_id_testcase_id", "500000 50 1"),
+    ("ValgrindOutput", "ix_ValgrindOutput_testcase_result_id", "100000 1"),
+]
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    """
+    Returns a function which executes a query function on an in-memory database and returns the plans
+    of all statements it executed, one line per step.
+    """
+    engine=create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    engine.execute("ANALYZE")
+    for statistics in STATISTICS:
+        engine.execute("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)", statistics)
+    # reloads the statistics
+    engine.execute("ANALYZE sqlite_master")
+    monkeypatch.setattr(dbm, "session", sessionmaker(bind=engine)())
+    statements=[]
+    event.listen(engine, "before_cursor_execute",
+                 lambda connection, cursor, statement, parameters, context, executemany:
+                 statements.append((statement, parameters)))
+
+    def explain(function, *arguments):
+        statements.clear()
+        function(*arguments)
+        queries=[(statement, parameters) for statement, parameters in statements
+                 if statement.lstrip().upper().startswith("SELECT")]
+        assert queries
+        connection=engine.raw_connection()
+        try:
+            return [row[-1] for statement, parameters in queries
+                    for row in connection.execute("EXPLAIN QUERY PLAN "+statement, parameters)]
+        finally:
+            connection.close()
+    return explain
+
+
+def uses(plan, index):
+    return any(f"USING INDEX {index} " in step or f"USING COVERING INDEX {index} " in step for step in plan)
+
+
+run=SimpleNamespace(id=1)
+submission=SimpleNamespace(id=1)
+
+
+@pytest.mark.parametrize("query", ["get_failed_good", "get_failed_bad"])
+def test_failed_results_use_indexes(plans, query):
+    plan=plans(getattr(testcase_results.TestcaseResult, query), run)
+    assert uses(plan, "ix_TestcaseResult_run_id_testcase_id")
+    assert uses(plan, "ix_ValgrindOutput_testcase_result_id")
+
+
+def test_failed_outputs_use_run_index(plans):
+    plan=plans(testcase_results.TestcaseResult.get_failed_output_bad_or_output, run)
+    assert uses(plan, "ix_TestcaseResult_run_id_testcase_id")
+
+
+def test_result_lookup_uses_run_index(plans):
+    plan=plans(testcase_results.TestcaseResult.create_or_get, 1, 2)
+    assert uses(plan, "ix_TestcaseResult_run_id_testcase_id")
+
+
+def test_summary_uses_run_index(plans):
+    plan=plans(RunSummary(1).count, SimpleNamespace(id=1, compilation_return_code=0))
+    assert uses(plan, "ix_TestcaseResult_run_id_testcase_id")
+    assert uses(plan, "ix_ValgrindOutput_testcase_result_id")
+
+
+def test_insert_run_uses_run_index(plans):
+    plan=plans(Run.insert_run, Run(1, "gcc -o loesung loesung.c", False, 0, ""))
+    assert uses(plan, "ix_Run_submission_id_command_line_careless_flag")
+
+
+def test_last_run_uses_run_index(plans):
+    plan=plans(Run.get_last_for_submission, submission)
+    assert uses(plan, "ix_Run_submission_id_command_line_careless_flag")
+
+
+@pytest.mark.parametrize("unpassed", [False, True])
+def test_stats_report_uses_indexes(plans, unpassed):
+    plan=plans(lambda: list(Submission.get_all_with_runs(unpassed)))
+    assert uses(plan, "ix_Submission_student_id_is_checked")
+    assert uses(plan, "ix_Run_submission_id_command_line_careless_flag")
+
+
+def test_not_checked_for_name_uses_submission_index(plans):
+    plan=plans(Submission.get_not_checked_for_name, "student")
+    assert uses(plan, "ix_Submission_student_id_is_checked")
@@ -0,0 +1,122 @@
+"""
+Tests that the valgrind log and the XML output of the same execution are parsed to the same result
+by util/result_parser.py, and that the sanitizer reports are judged by the same rule: a check passes if all heap blocks
+were freed, invalid reads and writes are only reported.
+"""
+
+import io
+import pytest
+# the database modules have to be imported in the order check.py imports them
+import database.submissions
+from database.valgrind_outputs import ValgrindOutput
+from util.result_parser import ResultParser
+
+
+def valgrind_log(reads, writes, definitely_lost, still_reachable):
+    """
+    Builds the valgrind log (--leak-check=summary) of an execution with the given number of invalid reads and writes
+    and the given number of bytes lost in one block each.
+    """
+    lines=[b"Memcheck, a memory error detector", b"Command: ./loesung", b""]
+    for _ in range(reads):
+        lines+=[b"Invalid read of size 4", b"   at 0x109156: main (loesung.c:5)", b""]
+    for _ in range(writes):
+        lines+=[b"Invalid write of size 4", b"   at 0x10916B: main (loesung.c:6)", b""]
+    blocks=(definitely_lost>0)+(still_reachable>0)
+    in_use=definitely_lost+still_reachable
+    lines+=[b"HEAP SUMMARY:",
+            b"    in use at exit: %d bytes in %d blocks" % (in_use, blocks),
+            b"  total heap usage: 3 allocs, %d frees, 1,040 bytes allocated" % (3-blocks),
+            b""]
+    if blocks==0:
+        lines+=[b"All heap blocks were freed -- no leaks are possible"]
+    else:
+        lines+=[b"LEAK SUMMARY:",
+                b"   definitely lost: %d bytes in %d blocks" % (definitely_lost, definitely_lost>0),
+                b"   indirectly lost: 0 bytes in 0 blocks",
+                b"     possibly lost: 0 bytes in 0 blocks",
+                b"   still reachable: %d bytes in %d blocks" % (still_reachable, still_reachable>0),
+                b"        suppressed: 0 bytes in 0 blocks"]
+    errors=reads+writes
+    lines+=[b"", b"ERROR SUMMARY: %d errors from %d contexts (suppressed: 0 from 0)" % (errors, errors)]
+    return [b"==4242== "+line+b"\n" for line in lines]
+
+
+def valgrind_xml(reads, writes, definitely_lost, still_reachable):
+    """
+    Builds the XML output (--xml=yes --leak-check=full --show-leak-kinds=all) of the same execution as valgrind_log().
+    """
+    errors=[("InvalidRead", None)]*reads+[("InvalidWrite", None)]*writes
+    if definitely_lost>0:
+        errors.append(("Leak_DefinitelyLost", definitely_lost))
+    if still_reachable>0:
+        errors.append(("Leak_StillReachable", still_reachable))
+    xml=['<?xml version="1.0"?>', '<valgrindoutput>', '<protocolversion>4</protocolversion>',
+         '<protocoltool>memcheck</protocoltool>', '<pid>4242</pid>']
+    for unique, (kind, leaked) in enumerate(errors):
+        if unique==reads+writes:
+            xml.append('<status><state>FINISHED</state></status>')
+        xml.append(f'<error><unique>0x{unique:x}</unique><tid>1</tid><kind>{kind}</kind>')
+        if leaked is None:
+            xml.append('<what>Invalid access of size 4</what>')
+        else:
+            xml.append(f'<xwhat><text>{leaked} bytes in 1 blocks are lost</text>'
+                       f'<leakedbytes>{leaked}</leakedbytes><leakedblocks>1</leakedblocks></xwhat>')
+        xml.append('</error>')
+    if len(errors)==reads+writes:
+        xml.append('<status><state>FINISHED</state></status>')
+    xml.append('<errorcounts>')
+    for unique in range(reads+writes):
+        xml.append(f'<pair><count>1</count><unique>0x{unique:x}</unique></pair>')
+    xml+=['</errorcounts>', '<suppcounts></suppcounts>', '</valgrindoutput>']
+    return io.BytesIO("\n".join(xml).encode())
+
+
+@pytest.mark.parametrize("reads, writes, definitely_lost, still_reachable", [
+    (0, 0, 0, 0),
+    (1, 0, 0, 0),
+    (0, 2, 0, 0),
+    (0, 0, 0, 7),
+    (0, 0, 5, 0),
+    (2, 1, 5, 7),
+])
+def test_log_and_xml_agree(reads, writes, definitely_lost, still_reachable):
+    execution=(reads, writes, definitely_lost, still_reachable)
+    log=ResultParser.parse_valgrind_file(ValgrindOutput(None), valgrind_log(*execution))
+    xml=ResultParser.parse_valgrind_xml(ValgrindOutput(None), valgrind_xml(*execution))
+    assert log.ok==xml.ok==(definitely_lost==0 and still_reachable==0)
+    for field in ("invalid_read_count", "invalid_write_count", "in_use_at_exit_bytes", "in_use_at_exit_blocks",
+                  "definitely_lost_bytes", "still_reachable_bytes"):
+        # the log contains no leak summary if all heap blocks were freed
+        assert (getattr(log, field) or 0)==getattr(xml, field), field
+
+
+def test_stopped_at_first_error_fails_in_both():
+    # valgrind --exit-on-first-error=yes writes neither a heap summary nor the end of the XML output,
+    # such runs are executed again with the full profile, see TestcaseExecutor.run_memcheck()
+    log=[b"==4242== Memcheck, a memory error detector\n",
+         b"==4242== Invalid read of size 4\n",
+         b"==4242==    at 0x109156: main (loesung.c:5)\n",
+         b"==4242== \n",
+         b"==4242== Exit program on first error (--exit-on-first-error=yes)\n"]
+    xml=valgrind_xml(1, 0, 0, 0).getvalue()
+    xml=io.BytesIO(xml[:xml.index(b"<status>")])
+    log=ResultParser.parse_valgrind_file(ValgrindOutput(None), log)
+    xml=ResultParser.parse_valgrind_xml(ValgrindOutput(None), xml)
+    assert log.ok is False and xml.ok is False
+    assert log.invalid_read_count==xml.invalid_read_count==1
+
+
+@pytest.mark.parametrize("report, ok", [
+    ([], True),
+    ([b"==4242==ERROR: AddressSanitizer: heap-buffer-overflow on address 0x602000000014\n",
+      b"READ of size 4 at 0x602000000014 thread T0\n"], True),
+    ([b"==4242==ERROR: LeakSanitizer: detected memory leaks\n",
+      b"Direct leak of 5 byte(s) in 1 object(s) allocated from:\n"], False),
+    ([b"==4242==ERROR: AddressSanitizer: SEGV on unknown address 0x000000000000\n",
+      b"==4242==The signal is caused by a READ memory access.\n",
+      b"==4242==ABORTING\n"], None),
+])
+def test_sanitizer_verdict(report, ok):
+    res=ResultParser.parse_sanitizer_file(ValgrindOutput(None), report)
+    assert res.ok is ok
@@ -239,6 +239,52 @@ class ArgumentExtractor:
                           help='marks a students submission manually as passed '
                                'if corrected manually. Usage: check -D "Firstname Lastname"')
 
+        self \
+            .parser \
+            .add_argument('-w', '--workers',
+                          dest="workers",
+                          type=int,
+                          default=None,
+                          help='Number of testcases of a submission which are executed concurrently. '
+                               'Defaults to TESTCASE_WORKERS in config_testcase_executor.config. Usage: check -a -w 8')
+
+        self \
+            .parser \
+            .add_argument('-j', '--jobs',
+                          dest="jobs",
+                          type=int,
+                          default=1,
+                          help='Number of submissions which are compiled and checked in parallel worker processes.'
+                               ' Usage: check -fa -j 4')
+
+        self \
+            .parser \
+            .add_argument('--compile-workers',
+                          dest="compile_workers",
+                          type=int,
+                          default=None,
+                          help='Number of threads compiling submissions while the submissions compiled already are '
+                               'checked. 0 compiles every submission right before checking it. '
+                               'Defaults to COMPILE_WORKERS in config_testcase_executor.config. '
+                               'Usage: check -fa -j 4 --compile-workers 2')
+
+        self \
+            .parser \
+            .add_argument('--calibrate',
+                          dest="calibrate",
+                          action='store_true',
+                          help='Runs the reference solution on all testcases and stores its resource usage, '
+                               'from which the limits of the testcases are derived. Usage: check --calibrate')
+
+        self \
+            .parser \
+            .add_argument('--no-cache',
+                          dest="no_cache",
+                          action='store_true',
+                          help='Compiles all submissions and executes all testcases, even if the compilation or '
+                               'results for an identical executable are stored already.'
+                               ' Usage: check -ar --no-cache')
+
         self \
             .parser \
             .add_argument('-u', '--unpassed-students',
@@ -0,0 +1,64 @@
+"""
+Hit and miss counters of the caches used while checking submissions.
+"""
+
+import logging
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+
+class CacheStats:
+    """
+    Counts the lookups of a cache which were answered from the cache (hits) and those which were not (misses).
+    """
+
+    def __init__(self, name):
+        """
+        Parameters:
+            name (string): name of the cache used when logging the statistics
+        """
+        self.name=name
+        self.hits=0
+        self.misses=0
+
+    def __repr__(self):
+        return f"(CacheStats: {self.name}, {self.hits} hits, {self.misses} misses)"
+
+    def hit(self):
+        self.hits+=1
+
+    def miss(self):
+        self.misses+=1
+
+    def add(self, other):
+        """
+        Adds the counters of another CacheStats object, e.g. one sent back by a worker process.
+        Parameters:
+            other (CacheStats object)
+        Returns: Nothing
+        """
+        self.hits+=other.hits
+        self.misses+=other.misses
+
+    @property
+    def lookups(self):
+        return self.hits+self.misses
+
+    @property
+    def hit_rate(self):
+        """
+        Share of the lookups which were hits, 0 if there were no lookups.
+        """
+        if self.lookups==0:
+            return 0.0
+        return self.hits/self.lookups
+
+    def log(self):
+        """
+        Logs the statistics if the cache was used.
+        Parameters: None
+        Returns: Nothing
+        """
+        if self.lookups>0:
+            logging.info(f"{self.name} cache: {self.hits} hits, {self.misses} misses, hit rate {self.hit_rate:.1%}")
@@ -0,0 +1,206 @@
+"""
+Transient cgroup v2 groups for single executions.
+Every execution is placed in its own cgroup below CGROUP_ROOT. All processes it forks stay in this cgroup,
+so memory and pids limits also apply to them, their resource usage is accounted together
+and all of them can be killed at once using cgroup.kill (Linux 5.14 and newer) or by killing every process listed
+in cgroup.procs.
+
+The kernel only allows moving the executions into their cgroups if the pipeline user can write to the cgroup.procs
+file of the common ancestor of the pipeline's cgroup and the execution cgroups. Usually the pipeline is therefore
+started in a cgroup delegated to its user, e.g. by `systemd-run --user --scope -p Delegate=yes`,
+and CGROUP_ROOT is not set, so this delegated cgroup is used (see delegated_root()).
+"""
+
+import os
+import time
+import signal
+import subprocess
+import tempfile
+import logging
+from util.runner import Rusage
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+CONTROLLERS=['memory', 'pids']
+CGROUP_MOUNT='/sys/fs/cgroup'
+
+
+def delegated_root():
+    """
+    Prepares the cgroup the pipeline runs in for creating the execution cgroups in it.
+    Processes are only allowed in the leaves of the cgroup tree if controllers are enabled,
+    so the pipeline moves itself into the child cgroup "pipeline" first.
+    Parameters: None
+    Returns:
+        path (string): path of the cgroup of the pipeline
+    """
+    with open('/proc/self/cgroup') as f:
+        relative=[line[3:].strip() for line in f if line.startswith('0::')][0]
+    root=CGROUP_MOUNT+relative
+    if os.path.basename(root)=='pipeline':
+        # already prepared, e.g. by the parent of a worker process
+        return os.path.dirname(root)
+    os.makedirs(os.path.join(root, 'pipeline'), exist_ok=True)
+    with open(os.path.join(root, 'pipeline', 'cgroup.procs'), 'w') as f:
+        f.write(str(os.getpid()))
+    return root
+
+
+def enable_controllers(root):
+    """
+    Enables the memory and pids controllers for the cgroups created below root.
+    Parameters:
+        root (string): path of the cgroup the execution cgroups are created in
+    Returns:
+        List of strings: controllers which are available for the execution cgroups
+    """
+    with open(os.path.join(root, 'cgroup.controllers')) as f:
+        available=f.read().split()
+    enabled=[]
+    for controller in CONTROLLERS:
+        if controller not in available:
+            logging.warning(f"cgroup controller {controller} is not available in {root}. Its limits are not applied.")
+            continue
+        try:
+            with open(os.path.join(root, 'cgroup.subtree_control'), 'w') as f:
+                f.write(f'+{controller}')
+            enabled.append(controller)
+        except OSError as error:
+            logging.warning(f"Unable to enable cgroup controller {controller} in {root}: {error}")
+    return enabled
+
+
+class Cgroup:
+    """
+    A cgroup for a single execution. Can be used as a context manager, which kills all processes left
+    in the cgroup and removes it when leaving the context.
+    """
+
+    def __init__(self, root, controllers, memory_max=None, pids_max=None, sudo=None):
+        """
+        Creates a new cgroup below root.
+        Parameters:
+            root (string): path of the parent cgroup
+            controllers (list of strings): controllers enabled for the cgroups below root, see enable_controllers()
+            memory_max (int): Maximum memory usage of all processes in bytes. Optional.
+            pids_max (int): Maximum number of processes. Optional.
+            sudo (list of strings): sudo command for the user executing the processes. Used to kill them
+                if cgroup.kill is not available. Optional.
+        """
+        self.sudo=sudo
+        self.path=tempfile.mkdtemp(prefix='exec_', dir=root)
+        if 'memory' in controllers and memory_max is not None:
+            self.write('memory.max', memory_max)
+            if os.path.exists(os.path.join(self.path, 'memory.swap.max')):
+                self.write('memory.swap.max', 0)
+        if 'pids' in controllers and pids_max is not None:
+            self.write('pids.max', pids_max)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "(Cgroup: "+self.path+")"
+
+    @property
+    def procs(self):
+        """
+        Path of the file a pid is written to for moving the process into this cgroup.
+        """
+        return os.path.join(self.path, 'cgroup.procs')
+
+    def write(self, name, value):
+        """
+        Writes a value to an interface file of this cgroup.
+        Parameters:
+            name (string): name of the interface file
+            value: value to write
+        Returns: Nothing
+        """
+        with open(os.path.join(self.path, name), 'w') as f:
+            f.write(str(value))
+
+    def read_keyed(self, name):
+        """
+        Reads an interface file of this cgroup consisting of lines with a key and a value, e.g. cpu.stat.
+        Parameters:
+            name (string): name of the interface file
+        Returns:
+            dict mapping the keys to integer values, empty if the file does not exist
+        """
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return {key: int(value) for key, value in (line.split() for line in f)}
+        except FileNotFoundError:
+            return {}
+
+    def kill(self, pid=None):
+        """
+        Kills all processes in this cgroup. Kernels older than 5.14 have no cgroup.kill, on them every process
+        listed in cgroup.procs is killed, as the sudo user if the pipeline is not allowed to.
+        Parameters:
+            pid (int): ignored, all processes are killed. Optional.
+        Returns: Nothing
+        """
+        if os.path.exists(os.path.join(self.path, 'cgroup.kill')):
+            self.write('cgroup.kill', 1)
+            return
+        # a process can fork while the others are killed, so the list is read until it is empty
+        for _ in range(100):
+            with open(self.procs) as f:
+                pids=[int(line) for line in f if line.strip()]
+            if len(pids)==0:
+                return
+            try:
+                for pid in pids:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            except PermissionError:
+                if self.sudo is None:
+                    raise
+                subprocess.call(self.sudo+['kill', '-KILL']+[str(pid) for pid in pids], stderr=subprocess.DEVNULL)
+            time.sleep(0.001)
+
+    def rusage(self, rusage):
+        """
+        Returns the resource usage of all processes which were executed in this cgroup.
+        Uses cpu.stat and memory.peak. If the memory controller is not enabled, the maximum resident set size is
+        taken from the resource usage measured with wait4 instead.
+        Parameters:
+            rusage (Rusage object): resource usage of the executed command, measured by a runner
+        Returns:
+            Rusage object
+        """
+        cpu=self.read_keyed('cpu.stat')
+        maxrss=rusage.ru_maxrss
+        try:
+            with open(os.path.join(self.path, 'memory.peak')) as f:
+                maxrss=int(f.read())//1024
+        except FileNotFoundError:
+            pass
+        oom_kill=self.read_keyed('memory.events').get('oom_kill', 0)>0
+        return Rusage(cpu.get('user_usec', 0)/1000000, cpu.get('system_usec', 0)/1000000, maxrss, oom_kill)
+
+    def close(self):
+        """
+        Kills all processes left in this cgroup, e.g. children the submission left behind, and removes the cgroup.
+        Parameters: None
+        Returns: Nothing
+        """
+        self.kill()
+        for _ in range(100):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                # the killed processes have not terminated yet
+                time.sleep(0.01)
+        logging.warning(f"Unable to remove cgroup {self.path}")
@@ -0,0 +1,182 @@
+"""
+Cache of compilations. Resubmissions of unchanged code, reruns (flags -r, -u) and single testcases (flag -t)
+compile the same source with the same flags again, which costs a compilation in docker and a native one.
+The cache stores the return code and the error output of gcc together with the executables it produced.
+
+Entries are keyed by the hash of the source, the gcc arguments, the digest of the docker image
+of the reference system and the version of the native gcc, so changing the flags or updating either compiler
+does not reuse old results.
+Every entry is a directory below COMPILE_CACHE_DIR named after its key. Entries are written to a temporary
+directory first and then renamed, so several worker processes can use the cache at the same time.
+The executables in the cache are executed for every student submitting the same code, so the directory must only be
+writable by the pipeline user. Especially the user executing the submissions must not be able to replace them.
+"""
+
+import os
+import stat
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+import logging
+from subprocess import DEVNULL, PIPE
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+RESULT_NAME='result.json'
+CACHE_VERSION=2
+
+# digests of docker images and versions of native compilers, only inspected once per process
+image_digests={}
+compiler_versions={}
+
+
+def crlf_normalised_hash(path):
+    """
+    Computes the SHA-256 hash of a c file. Windows line endings (CRLF) are replaced by unix line endings first,
+    so a file saved with windows line endings has the same hash as the same file with unix line endings.
+    Nothing else is normalised, e.g. a changed comment or trailing whitespace changes the hash.
+    Parameters:
+        path (string): path to the c file
+    Returns:
+        hash (string)
+    """
+    with open(path, 'br') as f:
+        source=f.read()
+    return hashlib.sha256(source.replace(b'\r\n', b'\n')).hexdigest()
+
+
+def image_digest(docker_image):
+    """
+    Returns the ID of a docker image, which changes whenever the image is rebuilt.
+    Parameters:
+        docker_image (string): name of the image
+    Returns:
+        digest (string), None if the image can not be inspected
+    """
+    if docker_image not in image_digests:
+        cp=subprocess.run(['sudo', 'docker', 'image', 'inspect', '--format', '{{.Id}}', docker_image],
+                          stdout=PIPE, stderr=DEVNULL, universal_newlines=True, check=False)
+        digest=cp.stdout.strip() if cp.returncode==0 else None
+        if digest is None:
+            logging.warning(f"Unable to inspect docker image {docker_image}. Compilations are not cached.")
+        image_digests[docker_image]=digest
+    return image_digests[docker_image]
+
+
+def compiler_version(gcc_path):
+    """
+    Returns the version of the native gcc, which compiles the executables the testcases are executed with.
+    Parameters:
+        gcc_path (string): path to gcc, GCC_PATH in the config file
+    Returns:
+        version (string): output of gcc --version, None if gcc can not be executed
+    """
+    if gcc_path not in compiler_versions:
+        try:
+            cp=subprocess.run([gcc_path, '--version'], stdout=PIPE, stderr=DEVNULL, universal_newlines=True,
+                              check=False)
+            version=cp.stdout.strip() if cp.returncode==0 else None
+        except OSError:
+            version=None
+        if version is None:
+            logging.warning(f"Unable to determine the version of {gcc_path}. Compilations are not cached.")
+        compiler_versions[gcc_path]=version
+    return compiler_versions[gcc_path]
+
+
+class CompileCache:
+    """
+    A directory containing cached compilations.
+    """
+
+    def __init__(self, directory):
+        """
+        Parameters:
+            directory (string): directory of the cache, created if it does not exist
+        Raises:
+            PermissionError if the directory is not owned by the pipeline user or can be written by other users
+        """
+        self.directory=str(directory)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        # an existing directory may have been created by anyone, e.g. below /tmp
+        status=os.lstat(self.directory)
+        if not stat.S_ISDIR(status.st_mode) or status.st_uid!=os.getuid() or status.st_mode&0o022:
+            raise PermissionError(f"Compile cache {self.directory} must be a directory owned by the pipeline user "
+                                  f"and must not be writable by other users.")
+
+    def __repr__(self):
+        return "(CompileCache: "+self.directory+")"
+
+    @staticmethod
+    def key(source_hash, gcc_args, docker_image_digest, gcc_version, sanitizer_args=None):
+        """
+        Builds the key of a compilation.
+        Parameters:
+            source_hash (string): hash returned by crlf_normalised_hash()
+            gcc_args (list of strings): gcc arguments used in docker, see logic.retrieve_and_compile.gcc_arguments()
+            docker_image_digest (string): digest returned by image_digest()
+            gcc_version (string): version of the native gcc returned by compiler_version()
+            sanitizer_args (list of strings): gcc arguments of the executable compiled with sanitizers,
+                None if it is not created. Optional.
+        Returns:
+            key (string)
+        """
+        parts=[CACHE_VERSION, source_hash, gcc_args, docker_image_digest, gcc_version, sanitizer_args]
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key, workspace):
+        """
+        Copies the executables of a cached compilation into a workspace.
+        Parameters:
+            key (string): key returned by key()
+            workspace (Workspace object): workspace the executables are placed in
+        Returns:
+            dict containing commandline, return_code and gcc_stderr, None if the compilation is not cached
+        """
+        entry=self.path(key)
+        try:
+            with open(os.path.join(entry, RESULT_NAME)) as f:
+                result=json.load(f)
+            for name in result['artifacts']:
+                shutil.copy2(os.path.join(entry, name), os.path.join(workspace.executable_dir, name))
+        except (OSError, ValueError, KeyError) as error:
+            if not isinstance(error, FileNotFoundError):
+                logging.warning(f"Ignoring broken entry {entry} of the compile cache: {error}")
+            return None
+        return result
+
+    def store(self, key, workspace, commandline, return_code, gcc_stderr):
+        """
+        Stores a compilation and the executables it placed in a workspace.
+        Parameters:
+            key (string): key returned by key()
+            workspace (Workspace object): workspace containing the executables
+            commandline (string): Command that was used
+            return_code (int): Return code of gcc
+            gcc_stderr (string): Error output of gcc
+        Returns: Nothing
+        """
+        artifacts=[name for name in (os.path.basename(workspace.executable),
+                                     os.path.basename(workspace.sanitizer_executable))
+                   if os.path.exists(os.path.join(workspace.executable_dir, name))]
+        entry=tempfile.mkdtemp(prefix='.tmp_', dir=self.directory)
+        try:
+            for name in artifacts:
+                shutil.copy2(os.path.join(workspace.executable_dir, name), os.path.join(entry, name))
+            with open(os.path.join(entry, RESULT_NAME), 'w') as f:
+                json.dump({'commandline': commandline, 'return_code': return_code, 'gcc_stderr': gcc_stderr,
+                           'artifacts': artifacts}, f)
+            # mkdtemp creates the directory for the owner only
+            os.chmod(entry, 0o755)
+            os.rename(entry, self.path(key))
+        except OSError as error:
+            # another process stored the same compilation in the meantime
+            if not os.path.isdir(self.path(key)):
+                logging.warning(f"Unable to store compilation in {self.directory}: {error}")
+            shutil.rmtree(entry, ignore_errors=True)
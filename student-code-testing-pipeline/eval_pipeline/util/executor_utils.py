@@ -2,7 +2,6 @@
 This module contains utility functions  relevant for testcase execution and evaluation
 """
 import os
-import tempfile
 import logging
 import subprocess
 
@@ -48,32 +47,20 @@ def getmtime(path):
     return int(os.path.getmtime(path))
 
 
-def sort_first_arg_and_diff(f1, f2):
+def sudokill(process):
     """
-    Sorts and compares two files.
-    Paremetes:
-        f1 (string): path to file 1
-        f2 (string): path to file 2
-    Returns:
-        res (bool): Contains whether the contents are equal or not.
+    Calls kill on a process as sudo
+    Parametes: 
+        process (subprocess.Popen object):the process to kill
     """
-    f1_sorted = tempfile.mktemp()
-    f2_sorted = tempfile.mktemp()
-    subprocess.run(['sort', f1, '-o', f1_sorted])
-    subprocess.run(['sort', f2, '-o', f2_sorted])
-    res = (subprocess.run(['diff', '-q', f1_sorted, f2_sorted],
-                          stdout=subprocess.DEVNULL,
-                          stderr=subprocess.DEVNULL).returncode == 0)
-    unlink_safe(f1_sorted)
-    unlink_safe(f2_sorted)
-    return res
+    sudokill_pid(process.pid)
 
 
-def sudokill(process):
+def sudokill_pid(pid):
     """
     Calls kill on a process as sudo
-    Parametes: 
-        process (subprocess.Popen object):the process to kill
+    Parametes:
+        pid (int): PID of the process to kill
     """
-    subprocess.call(['sudo', 'kill', str(process.pid)],
+    subprocess.call(['sudo', 'kill', str(pid)],
                     stderr=subprocess.DEVNULL)
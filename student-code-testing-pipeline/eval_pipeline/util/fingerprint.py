@@ -0,0 +1,132 @@
+"""
+Order-insensitive comparison of outputs using multiset fingerprints.
+The fingerprint of a file consists of its number of lines and the sum of the hashes of all lines.
+Two files have the same fingerprint if they contain the same lines regardless of their order,
+which is what sorting both files and comparing them with diff used to check.
+Files are read in chunks, so the memory used does not depend on the size of the output.
+"""
+
+import os
+import hashlib
+import threading
+import logging
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+CHUNK_SIZE=1<<20
+HASH_SIZE=16
+MODULUS=1<<(8*HASH_SIZE)
+
+
+def fingerprint_file(path, max_size=None):
+    """
+    Computes the multiset fingerprint of a file.
+    A missing newline at the end of the file is ignored, just like sort does.
+    Parameters:
+        path (string): path to the file
+        max_size (int): Stop reading and return None if the file is larger than this. Optional.
+    Returns:
+        fingerprint (string) or None
+    """
+    lines=0
+    total=0
+    line_hash=hashlib.blake2b(digest_size=HASH_SIZE)
+    open_line=False
+    size=0
+    with open(path, 'br') as f:
+        while True:
+            chunk=f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size+=len(chunk)
+            if max_size is not None and size>max_size:
+                return None
+            parts=chunk.split(b'\n')
+            for part in parts[:-1]:
+                line_hash.update(part)
+                total+=int.from_bytes(line_hash.digest(), 'little')
+                lines+=1
+                line_hash=hashlib.blake2b(digest_size=HASH_SIZE)
+            line_hash.update(parts[-1])
+            open_line=bool(parts[-1]) or (open_line and len(parts)==1)
+    if open_line:
+        total+=int.from_bytes(line_hash.digest(), 'little')
+        lines+=1
+    return f"{lines}:{total%MODULUS:0{2*HASH_SIZE}x}"
+
+
+# fingerprints of expected outputs, stored with the modification time and size of the file they were computed from
+expected_fingerprints={}
+expected_fingerprints_lock=threading.Lock()
+
+
+def expected_fingerprint(path):
+    """
+    Returns the fingerprint and the size of an expected output. Fingerprints are only computed once per file
+    and recomputed if the file changed.
+    Parameters:
+        path (string): path to the expected output
+    Returns:
+        fingerprint (string)
+        size (int)
+    """
+    stat=os.stat(path)
+    key=(stat.st_mtime_ns, stat.st_size)
+    with expected_fingerprints_lock:
+        cached=expected_fingerprints.get(path)
+    if cached is not None and cached[0]==key:
+        return cached[1], stat.st_size
+    fingerprint=fingerprint_file(path)
+    with expected_fingerprints_lock:
+        expected_fingerprints[path]=(key, fingerprint)
+    return fingerprint, stat.st_size
+
+
+def hash_file(path):
+    """
+    Computes the SHA-256 hash of the content of a file.
+    Parameters:
+        path (string): path to the file
+    Returns:
+        hash (string)
+    """
+    content_hash=hashlib.sha256()
+    with open(path, 'br') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def compare_unordered(output, expected):
+    """
+    Compares two files while ignoring the order of their lines.
+    Returns early without reading the whole output if it is larger than the expected output.
+    Parameters:
+        output (string): path to the output of the submission
+        expected (string): path to the expected output
+    Returns:
+        res (bool): Contains whether the files contain the same lines. False if the expected output is missing.
+    """
+    try:
+        expected_print, expected_size=expected_fingerprint(expected)
+    except FileNotFoundError:
+        logging.warning(f"Expected output {expected} does not exist")
+        return False
+    # one additional byte for a newline at the end of the output which the expected output does not have
+    return fingerprint_file(output, expected_size+1)==expected_print
+
+
+def compare_to_testcase(output, testcase):
+    """
+    Compares the output of a submission to the expected output of a testcase while ignoring the order of the lines.
+    Uses the fingerprint stored for the testcase, so the expected output is not read.
+    Parameters:
+        output (string): path to the output of the submission
+        testcase (Testcase object)
+    Returns:
+        res (bool): Contains whether the output contains the same lines as the expected output.
+    """
+    if testcase.expected_fingerprint is None:
+        return compare_unordered(output, testcase.path+'.stdout')
+    return fingerprint_file(output, testcase.expected_size+1)==testcase.expected_fingerprint
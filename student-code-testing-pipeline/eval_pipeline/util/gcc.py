@@ -2,12 +2,21 @@
 This module provides functions to compile a single c file using gcc.
 
 The host's native gcc can be used as less as a gcc inside a docker container.
+
+Compilations in docker are executed by compile servers: bash processes started once with `docker exec`
+inside the container, which read one compile job per line and answer with the return code of gcc.
+Submissions therefore do not pay for starting the docker CLI on every compilation. Like the runners
+in util.runner, a server compiles one submission at a time, so one server is started for every concurrent compilation.
+A server which does not answer within COMPILE_TIMEOUT seconds is killed and replaced by a new one.
 """
 import glob
 import os
 import shutil
 import logging
+import select
+import threading
 import subprocess
+from concurrent.futures import Future
 from pwd import getpwnam
 from subprocess import DEVNULL, PIPE
 import sys
@@ -17,6 +26,10 @@ OWN_PW = getpwnam(os.environ['USER'])
 OWN_UID_GID = f'{OWN_PW.pw_uid:d}.{OWN_PW.pw_gid:d}'
 SUDO_DOCKER = ['sudo', 'docker']
 
+# seconds a compile server may take to compile a submission, and the return code reported if it did not finish in time
+COMPILE_TIMEOUT = 120
+COMPILE_TIMEOUT_RETURN_CODE = 124
+
 
 FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
 logging.basicConfig(format=FORMAT,level=logging.warning)
@@ -25,6 +38,27 @@ class DockerError(RuntimeError):
     pass
 
 
+# Code of the compile server. Reads one job per line from stdin:
+#   subdirectory \t executable \t gcc commandline
+# compiles in /host/subdirectory, writing gcc's error output to gcc.stderr,
+# and answers with the return code of gcc once the files belong to the pipeline user ($1).
+# gcc must not inherit the job pipe as its stdin, e.g. #include "/dev/stdin" would block the server otherwise.
+COMPILE_SERVER_CODE = r'''
+set -f
+while IFS=$'\t' read -r directory executable commandline; do
+    if cd "/host/$directory"; then
+        eval "$commandline" < /dev/null 2> gcc.stderr
+        status=$?
+        chown "$1" gcc.stderr "$executable" 2> /dev/null
+        cd /
+    else
+        status=126
+    fi
+    echo $status
+done
+'''
+
+
 def native_gcc(gcc_args, src, dest):
     """Call gcc to compile C file `src` procuding executable `dest`
     
@@ -60,12 +94,166 @@ def native_gcc(gcc_args, src, dest):
     return ' '.join(all_args), cp.returncode, cp.stderr
 
 
-def docker_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
+def start_container(docker_image, docker_container, directory):
+    """
+    Creates and starts the docker container, if required.
+
+    Parametes:
+
+        docker_image (string): image the container is created from
+
+        docker_container (string): name of the container
+
+        directory (string): shared directory, which is mounted at /host inside the container
+
+    Returns: Nothing
+    """
+    # create docker container, if it does not exist already
+    subprocess.run(SUDO_DOCKER + ['create',
+                       '--name', docker_container,
+                       '-v', f'{os.path.abspath(directory)}:/host',
+                       docker_image],
+        stdout=DEVNULL,
+        stderr=DEVNULL)
+
+    # start docker container if required
+    cp = subprocess.run(SUDO_DOCKER + ['start', docker_container], stdout=DEVNULL, stderr=sys.stderr)
+    if cp.returncode != 0:
+        logging.info(cp)
+        raise DockerError(f'Unable to start docker container {docker_container} based on docker image {docker_image}.')
+
+
+class CompileServer:
+    """
+    A compile server running inside a docker container, see COMPILE_SERVER_CODE.
+    """
+
+    def __init__(self, docker_container):
+        """
+        Starts a compile server in a running container.
+
+        Parametes:
+
+            docker_container (string): name of the container
+        """
+        self.process = subprocess.Popen(
+            SUDO_DOCKER + ['exec', '-i', docker_container, 'bash', '-c', COMPILE_SERVER_CODE, 'bash', OWN_UID_GID],
+            stdin=PIPE, stdout=PIPE, stderr=DEVNULL, universal_newlines=True)
+
+    def compile(self, subdirectory, executable, commandline, timeout=COMPILE_TIMEOUT):
+        """
+        Compiles a c file in a subdirectory of the shared directory and waits until gcc terminated.
+        If the server does not answer in time, it is killed and COMPILE_TIMEOUT_RETURN_CODE is returned.
+
+        Parametes:
+
+            subdirectory (string): subdirectory of the shared directory containing the c file
+
+            executable (string): name of the executable gcc writes
+
+            commandline (string): gcc commandline
+
+            timeout (float): seconds to wait for the answer. Optional.
+
+        Returns:
+
+            return_code (int): Return code of gcc, None if the server terminated, e.g. because the container was stopped
+        """
+        try:
+            self.process.stdin.write(f'{subdirectory}\t{executable}\t{commandline}\n')
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            return None
+        # the server answers one line per job, so nothing is buffered while waiting
+        readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not readable:
+            logging.warning(f'Compile server did not answer within {timeout} seconds, it is replaced: {commandline}')
+            self.kill()
+            return COMPILE_TIMEOUT_RETURN_CODE
+        answer = self.process.stdout.readline()
+        if not answer:
+            return None
+        return int(answer)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+
+    def kill(self):
+        """
+        Kills the docker client of the server, so the server finds its input closed.
+        gcc keeps running inside the container until it terminates by itself.
+        """
+        self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+    def alive(self):
+        return self.process.poll() is None
+
+
+# compile servers which are currently not compiling by container, and the process they belong to
+idle_servers = {}
+idle_servers_pid = None
+idle_servers_lock = threading.Lock()
+
+
+def server_compile(docker_image, docker_container, directory, subdirectory, executable, commandline):
+    """
+    Compiles a c file using an idle compile server, a new server is started if there is none.
+    The container is only created and started when a server is started.
+    Can be called from several threads at the same time.
+
+    Parametes:
+
+        docker_image (string): image the container is created from
+
+        docker_container (string): name of the container
+
+        directory (string): shared directory, which is mounted at /host inside the container
+
+        other parameters: see CompileServer.compile()
+
+    Returns:
+
+        return_code (int): Return code of gcc
+    """
+    global idle_servers, idle_servers_pid
+    with idle_servers_lock:
+        # servers inherited from the parent of a forked worker process must not be used
+        if idle_servers_pid != os.getpid():
+            idle_servers, idle_servers_pid = {}, os.getpid()
+        idle = idle_servers.setdefault(docker_container, [])
+        server = idle.pop() if idle else None
+    # an idle server may have terminated since its last compilation, it is replaced by a new one once
+    for _ in range(2):
+        if server is None:
+            start_container(docker_image, docker_container, directory)
+            server = CompileServer(docker_container)
+        return_code = server.compile(subdirectory, executable, commandline)
+        if return_code is not None:
+            # a server killed on timeout is not reused, the next compilation starts a new one
+            if server.alive():
+                with idle_servers_lock:
+                    idle_servers[docker_container].append(server)
+            return return_code
+        server.close()
+        server = None
+    raise DockerError(f'Compile server in docker container {docker_container} terminated.')
+
+
+def docker_gcc(gcc_args, src, dest, docker_image, docker_container, directory, subdirectory=None, server=False):
     """Call gcc to compile C file `src` procuding executable `dest`
 
     - This function uses the gcc found in the given docker image/container.
     - If `directory` exists, it must be empty
         (this is required to avoid overwriting any files)
+    - If `subdirectory` is given, only this subdirectory of `directory` is used
+        and cleared. This allows several compilations to share the container.
     - The container is created and started as needed.
     - The docker image must include a bash as well as a gcc installed at the
       configured path.
@@ -81,6 +269,10 @@ def docker_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
        
        dest (string): path of executable
 
+       subdirectory (string): name of a subdirectory of `directory` used for this compilation. Optional.
+
+       server (boolean): Whether a compile server is used instead of a new `docker exec`. Optional.
+
     Returns: A tuple
         
         commandline (string): Command that was used
@@ -102,6 +294,17 @@ def docker_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
         os.mkdir(directory)
     except:
         pass
+
+    # the shared directory is mounted at /host inside the container
+    container_directory = '/host'
+    mounted_directory = directory
+    if subdirectory is not None:
+        container_directory = f'/host/{subdirectory}'
+        directory = os.path.join(directory, subdirectory)
+        try:
+            os.mkdir(directory)
+        except:
+            pass
     
     if  len(os.listdir(directory)) != 0:
         logging.info(f"clearing {directory}")
@@ -109,19 +312,6 @@ def docker_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
         for f in files:
             os.remove(f)
     
-    # create docker container, if it does not exist already
-    subprocess.run(SUDO_DOCKER + ['create',
-                       '--name', docker_container,
-                       '-v', f'{os.path.abspath(directory)}:/host',
-                       docker_image],
-        stdout=DEVNULL,
-        stderr=DEVNULL)
-   
-    # start docker container if required
-    cp = subprocess.run(SUDO_DOCKER + ['start', docker_container], stdout=DEVNULL, stderr=sys.stderr)
-    if cp.returncode != 0:
-        logging.info(cp)
-        raise DockerError(f'Unable to start docker container {docker_container} based on docker image {docker_image}.')
     # copy c file
     tmp_c_basename = os.path.basename(dest) + '.c'
     tmp_c_path = os.path.join(directory, tmp_c_basename)
@@ -130,25 +320,32 @@ def docker_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
     all_args = gcc_args + ['-o', os.path.basename(dest),
                            os.path.basename(dest) + '.c']
     commandline = ' '.join(all_args)
-    
-    command_full= SUDO_DOCKER + ['exec',
-         '-w', '/host',
-         docker_container,
-         'bash', '-c',
-         f'{commandline} 2> gcc.stderr ; '
-         'echo $? > gcc.return ;'
-         f'chown {OWN_UID_GID} gcc.stderr gcc.return {os.path.basename(dest)}']
-    cp= subprocess.run(command_full,
-        stdout=DEVNULL,
-        stderr=DEVNULL)
+
+    if server:
+        gcc_returncode = server_compile(docker_image, docker_container, mounted_directory,
+                                        subdirectory or '', os.path.basename(dest), commandline)
+    else:
+        start_container(docker_image, docker_container, mounted_directory)
+        command_full= SUDO_DOCKER + ['exec',
+             '-w', container_directory,
+             docker_container,
+             'bash', '-c',
+             f'{commandline} 2> gcc.stderr ; '
+             'echo $? > gcc.return ;'
+             f'chown {OWN_UID_GID} gcc.stderr gcc.return {os.path.basename(dest)}']
+        cp= subprocess.run(command_full,
+            stdout=DEVNULL,
+            stderr=DEVNULL)
+        # collect gcc's returncode
+        with open(os.path.join(directory, 'gcc.return')) as f:
+            gcc_returncode = int(next(f))
+        os.unlink(os.path.join(directory, 'gcc.return'))
     # collect gcc's stderr
     with open(os.path.join(directory, 'gcc.stderr')) as f:
         gcc_stderr = f.read()
     os.unlink(os.path.join(directory, 'gcc.stderr'))
-    # collect gcc's returncode
-    with open(os.path.join(directory, 'gcc.return')) as f:
-        gcc_returncode = int(next(f))
-    os.unlink(os.path.join(directory, 'gcc.return'))
+    if server and gcc_returncode == COMPILE_TIMEOUT_RETURN_CODE:
+        gcc_stderr += f'gcc did not terminate within {COMPILE_TIMEOUT} seconds\n'
     # try to move the executable produced by gcc to `dest`
     if gcc_returncode == 0:
         try:
@@ -160,7 +357,7 @@ def docker_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
     return commandline, gcc_returncode, gcc_stderr
 
 
-def hybrid_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
+def hybrid_gcc(gcc_args, src, dest, docker_image, docker_container, directory, subdirectory=None, server=False):
     """
     Tests in a docker if the code an be compiled without error warnings.
     This is because warnings can differ between the same version of docker for different operating systems. 
@@ -176,6 +373,10 @@ def hybrid_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
 
         dest (sting): path of executable
 
+        subdirectory (string): subdirectory of the shared directory used for the docker compilation. Optional.
+
+        server (boolean): Whether a compile server is used for the docker compilation. Optional.
+
     Returns: A tuple
 
         commandline (string): Command that was used
@@ -186,12 +387,69 @@ def hybrid_gcc(gcc_args, src, dest, docker_image, docker_container, directory):
     
     """
     commandline, gcc_returncode, gcc_stderr = docker_gcc(
-        gcc_args, src, dest, docker_image, docker_container, directory)
+        gcc_args, src, dest, docker_image, docker_container, directory, subdirectory, server)
     if gcc_returncode == 0:
-        native_args = gcc_args.copy()
-        try:
-            native_args.remove('-Werror')
-        except ValueError:
-            pass
-        native_gcc(native_args, src, dest)
+        native_gcc(native_arguments(gcc_args), src, dest)
     return commandline, gcc_returncode, gcc_stderr
+
+
+def native_arguments(gcc_args):
+    """
+    Returns the arguments of the native compilation of `hybrid_gcc`, which are `gcc_args` without '-Werror'.
+    """
+    native_args = gcc_args.copy()
+    try:
+        native_args.remove('-Werror')
+    except ValueError:
+        pass
+    return native_args
+
+
+def speculative_gcc(gcc_args, src, dest, docker_image, docker_container, directory, subdirectory=None, server=False):
+    """
+    Compiles like `hybrid_gcc`, but starts the docker compilation and the native one at the same time.
+    Returns as soon as the native compilation finished, so the native executable can already be used
+    while the docker compilation is still running.
+    Once both finished, `dest` is in the same state as after `hybrid_gcc`: the native executable is removed
+    if the docker compilation failed, and the executable compiled in docker is used if only the native one failed.
+
+    Parametes:
+
+        same as `hybrid_gcc`
+
+    Returns: A tuple
+
+        native_returncode (int): Return code of the native gcc. `dest` exists if it is 0,
+            but may still be removed if the docker compilation fails.
+
+        reference (Future): resolves to the commandline, return code and error output of the docker compilation,
+            like the return value of `hybrid_gcc`
+    """
+    reference = Future()
+    native_done = threading.Event()
+    # the executable compiled in docker has the same name as dest, which appears in the commandline and in gcc's errors
+    reference_directory = os.path.join(os.path.dirname(dest), 'reference')
+    os.makedirs(reference_directory, exist_ok=True)
+    reference_dest = os.path.join(reference_directory, os.path.basename(dest))
+
+    def compile_reference():
+        try:
+            result = docker_gcc(gcc_args, src, reference_dest, docker_image, docker_container, directory,
+                                subdirectory, server)
+            native_done.wait()
+            if result[1] != 0:
+                if os.path.exists(dest):
+                    os.remove(dest)
+            elif not os.path.exists(dest) and os.path.exists(reference_dest):
+                shutil.move(reference_dest, dest)
+            shutil.rmtree(reference_directory, ignore_errors=True)
+            reference.set_result(result)
+        except BaseException as error:
+            reference.set_exception(error)
+
+    threading.Thread(target=compile_reference, daemon=True).start()
+    try:
+        _, native_returncode, _ = native_gcc(native_arguments(gcc_args), src, dest)
+    finally:
+        native_done.set()
+    return native_returncode, reference
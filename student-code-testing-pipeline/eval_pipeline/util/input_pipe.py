@@ -0,0 +1,99 @@
+"""
+Feeds the input of a testcase to the stdin of an executed submission.
+Contains class InputPipe.
+"""
+
+import os
+import errno
+import select
+import threading
+import logging
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+CHUNK_SIZE=1<<20
+# seconds after which a feeder waiting for the pipe to become writable checks whether it has to stop
+POLL_INTERVAL=0.1
+# seconds InputPipe.__exit__() waits for the feeder
+STOP_TIMEOUT=1
+
+
+class InputPipe(object):
+    """
+    Creates an anonymous pipe and copies the contents of a file into it.
+    The file is opened by the pipeline, so the user executing the submission only receives the read end of the pipe
+    and does not need to be able to read the testcase directory.
+    The copy is done by a thread using os.sendfile(), so no additional process is started.
+    The write end is non-blocking, so the thread can be stopped even if a process which escaped the kill of the submission
+    still holds the read end without reading from it.
+    Can be used as a context manager, which returns the read end of the pipe as file object.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (string): Path to the file whose contents are written to the pipe.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path=path
+        read_fd, self.write_fd=os.pipe()
+        os.set_blocking(self.write_fd, False)
+        self.f=os.fdopen(read_fd, 'br')
+        self.stopped=threading.Event()
+        self.feeder=threading.Thread(target=self.feed, daemon=True)
+        self.feeder.start()
+
+    def feed(self):
+        """
+        Writes the contents of the file to the pipe and closes its write end.
+        Stops early if the read end is closed, e.g. because the submission terminated without reading all of its input,
+        or once the pipe is closed by __exit__().
+        Parameters: None
+        Returns: Nothing
+        """
+        try:
+            with open(self.path, 'br') as source:
+                offset=0
+                size=os.fstat(source.fileno()).st_size
+                writable=select.poll()
+                writable.register(self.write_fd, select.POLLOUT)
+                while offset<size and not self.stopped.is_set():
+                    if not writable.poll(POLL_INTERVAL*1000):
+                        continue
+                    try:
+                        try:
+                            sent=os.sendfile(self.write_fd, source.fileno(), offset, CHUNK_SIZE)
+                        except OSError as error:
+                            if error.errno not in (errno.EINVAL, errno.ENOSYS):
+                                raise
+                            # kernels before 2.6.33 can not use sendfile with pipes
+                            source.seek(offset)
+                            sent=os.write(self.write_fd, source.read(CHUNK_SIZE))
+                    except BlockingIOError:
+                        # another writer filled the pipe in the meantime
+                        continue
+                    if sent==0:
+                        break
+                    offset+=sent
+        except BrokenPipeError:
+            pass
+        except OSError as error:
+            logging.warning(f"Unable to write {self.path} to stdin: {error}")
+        finally:
+            os.close(self.write_fd)
+
+    def close(self):
+        self.__exit__()
+
+    def __enter__(self, *args):
+        return self.f
+
+    def __exit__(self, *args):
+        # the feeder never blocks, but waits at most POLL_INTERVAL before it notices that it has to stop
+        self.stopped.set()
+        self.f.close()
+        self.feeder.join(STOP_TIMEOUT)
+        if self.feeder.is_alive():
+            logging.warning(f"Feeding {self.path} to stdin did not stop within {STOP_TIMEOUT} seconds")
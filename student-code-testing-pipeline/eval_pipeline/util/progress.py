@@ -0,0 +1,51 @@
+"""
+Progress of checks which process submissions in several stages, e.g. compiling and checking.
+"""
+
+import threading
+import logging
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+
+class StageProgress:
+    """
+    Counts the submissions which completed each stage. Stages can be advanced from several threads.
+    """
+
+    def __init__(self, total, stages):
+        """
+        Parameters:
+            total (int): number of submissions
+            stages (list of strings): names of the stages in the order the submissions pass them
+        """
+        self.total=total
+        self.completed={stage: 0 for stage in stages}
+        self.lock=threading.Lock()
+
+    def __repr__(self):
+        return f"(StageProgress: {self.completed} of {self.total})"
+
+    def advance(self, stage):
+        """
+        Counts a submission which completed a stage.
+        Parameters:
+            stage (string): name of the stage
+        Returns: Nothing
+        """
+        with self.lock:
+            self.completed[stage]+=1
+
+    def log(self, waiting=None):
+        """
+        Logs the number of submissions which completed each stage.
+        Parameters:
+            waiting (int): number of submissions waiting between the stages. Optional.
+        Returns: Nothing
+        """
+        with self.lock:
+            line=", ".join(f"{stage} {count}/{self.total}" for stage, count in self.completed.items())
+        if waiting is not None:
+            line+=f", {waiting} waiting"
+        logging.info(f"Progress: {line}")
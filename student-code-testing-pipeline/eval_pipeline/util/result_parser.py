@@ -1,5 +1,7 @@
 import re
 import logging
+from collections import Counter
+import xml.etree.ElementTree as ElementTree
 
 from database.valgrind_outputs import ValgrindOutput
 
@@ -29,6 +31,18 @@ re_vg_invalid_write = re.compile(rb'\s*Invalid write of size')
 re_vg_invalid_read = re.compile(rb'\s*Invalid read of size')
 re_time_signal = re.compile(r"Command terminated by signal (\d+)")
 
+# kinds of the leak errors in the XML output of valgrind
+VALGRIND_LEAK_KINDS = ('Leak_DefinitelyLost', 'Leak_IndirectlyLost', 'Leak_PossiblyLost', 'Leak_StillReachable')
+
+# Regular expressions for dealing with AddressSanitizer, LeakSanitizer and UndefinedBehaviorSanitizer reports
+re_san_error = re.compile(rb'==\d+==ERROR: AddressSanitizer')
+re_san_access = re.compile(rb'(?:(READ|WRITE) of size \d+|.*The signal is caused by a (READ|WRITE) memory access)')
+re_san_runtime_error = re.compile(rb'.*: runtime error: ')
+re_san_abort = re.compile(rb'==\d+==ABORTING')
+re_san_leak = re.compile(rb'(Direct|Indirect) leak of (\d+) byte\(s\) in (\d+) object\(s\)')
+re_san_failure = re.compile(rb'.*Sanitizer(?: has encountered a fatal error| does not work under ptrace|: CHECK failed'
+                            rb'| failed to)')
+
 
 class ResultParser:
     @staticmethod
@@ -77,17 +91,17 @@ class ResultParser:
         Returns:
             res (ValgrindOutput object). Sets in res the values:
                 - ok
-                - in_use_at_exit_bytes
+                - in_use_at_exit_bytes, in_use_at_exit_blocks
                 - total_heap_usage_allocs
                 - total_heap_usage_frees
                 - total_heap_usage_bytes
-                - definitely_lost_bytes
-                - indirectly_lost_bytes
-                - possibly_lost_bytes
-                - still_reachable_bytes
-                - suppressed_bytes
-                - summary_errors
-                - summary_suppressed_errors
+                - definitely_lost_bytes, definitely_lost_blocks
+                - indirectly_lost_bytes, indirectly_lost_blocks
+                - possibly_lost_bytes, possibly_lost_blocks
+                - still_reachable_bytes, still_reachable_blocks
+                - suppressed_bytes, suppressed_blocks
+                - summary_errors, summary_contexts
+                - summary_suppressed_errors, summary_suppressed_contexts
                 - invalid_read_count
                 - invalid_write_count
         """
@@ -112,6 +126,7 @@ class ResultParser:
             if line == b'HEAP SUMMARY:\n':
                 in_use_at_exit_tupel = parse_int_tuple(re_vg_heap_summary1.match(next(it)[len(valgrind_head) + 1:]).groups())
                 res.in_use_at_exit_bytes=in_use_at_exit_tupel[0]
+                res.in_use_at_exit_blocks=in_use_at_exit_tupel[1]
                 total_heap_usage = parse_int_tuple(re_vg_heap_summary2.match(next(it)[len(valgrind_head) + 1:]).groups())
                 res.total_heap_usage_allocs=total_heap_usage[0]
                 res.total_heap_usage_frees=total_heap_usage[1]   
@@ -125,16 +140,23 @@ class ResultParser:
                     assert key == mo.group(1).decode('ascii')
                     d[key] = parse_int_tuple(mo.groups()[1:])
                 res.definitely_lost_bytes=d["definitely lost"][0]
+                res.definitely_lost_blocks=d["definitely lost"][1]
                 res.indirectly_lost_bytes=d["indirectly lost"][0]
+                res.indirectly_lost_blocks=d["indirectly lost"][1]
                 res.possibly_lost_bytes=d["possibly lost"][0]
+                res.possibly_lost_blocks=d["possibly lost"][1]
                 res.still_reachable_bytes=d["still reachable"][0]
+                res.still_reachable_blocks=d["still reachable"][1]
                 res.suppressed_bytes=d["suppressed"][0]
+                res.suppressed_blocks=d["suppressed"][1]
                 continue
             mo = re_vg_error_summary.match(line)
             if mo is not None:
                 error_summary = parse_int_tuple(mo.groups()) 
                 res.summary_errors=error_summary[0]
+                res.summary_contexts=error_summary[1]
                 res.summary_suppressed_errors=error_summary[2]
+                res.summary_suppressed_contexts=error_summary[3]
                 continue
             mo = re_vg_invalid_read.match(line)
             if mo is not None:
@@ -147,13 +169,150 @@ class ResultParser:
         return res
 
     @staticmethod
-    def parse_error_file(testcase_result):
+    def parse_valgrind_xml(res, file):
+        """
+        Parses the XML output of valgrind (--xml=yes) created by executing a students submission.
+        The file is parsed incrementally and every element is discarded once it was processed,
+        so the memory used does not depend on the number of errors.
+        Leaks are only contained if valgrind was executed with --leak-check=full --show-leak-kinds=all.
+        The heap usage is not part of the XML output. An incomplete file, e.g. if valgrind stopped at the first error,
+        is parsed up to where it ends.
+
+        Parameters:
+            res (ValgrindOutput object):
+            file (file object): XML output opened in binary mode
+        Returns:
+            res (ValgrindOutput object). Sets in res the values:
+                - ok (like parse_valgrind_file(): True if the submission exited and all heap blocks were freed,
+                  None if the file is empty)
+                - in_use_at_exit_bytes, in_use_at_exit_blocks
+                - definitely_lost_bytes, definitely_lost_blocks
+                - indirectly_lost_bytes, indirectly_lost_blocks
+                - possibly_lost_bytes, possibly_lost_blocks
+                - still_reachable_bytes, still_reachable_blocks
+                - summary_errors, summary_contexts
+                - summary_suppressed_errors, summary_suppressed_contexts
+                - invalid_read_count
+                - invalid_write_count
+        """
+        kinds = Counter()
+        leaks = {kind: [0, 0] for kind in VALGRIND_LEAK_KINDS}
+        # number of occurrences of the errors which are not leaks, by their unique id
+        occurrences = {}
+        suppressed = [0, 0]
+        # the leaks are only checked once the submission exited
+        finished = False
+        root = None
+        depth = 0
+        try:
+            for event, element in ElementTree.iterparse(file, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                # a direct child of the root element is complete
+                if element.tag == 'error':
+                    kind = element.findtext('kind')
+                    kinds[kind] += 1
+                    if kind in leaks:
+                        leaks[kind][0] += int(element.findtext('xwhat/leakedbytes', '0'))
+                        leaks[kind][1] += int(element.findtext('xwhat/leakedblocks', '0'))
+                    else:
+                        occurrences.setdefault(element.findtext('unique'), 1)
+                elif element.tag == 'errorcounts':
+                    for pair in element.iter('pair'):
+                        occurrences[pair.findtext('unique')] = int(pair.findtext('count', '1'))
+                elif element.tag == 'status':
+                    finished = finished or element.findtext('state') == 'FINISHED'
+                elif element.tag == 'suppcounts':
+                    for pair in element.iter('pair'):
+                        suppressed[0] += int(pair.findtext('count', '0'))
+                        suppressed[1] += 1
+                root.clear()
+        except ElementTree.ParseError as error:
+            logging.warning(f"Valgrind XML output is incomplete: {error}")
+        if root is None:
+            res.ok = None
+            return res
+        res.invalid_read_count = kinds['InvalidRead']
+        res.invalid_write_count = kinds['InvalidWrite']
+        res.definitely_lost_bytes, res.definitely_lost_blocks = leaks['Leak_DefinitelyLost']
+        res.indirectly_lost_bytes, res.indirectly_lost_blocks = leaks['Leak_IndirectlyLost']
+        res.possibly_lost_bytes, res.possibly_lost_blocks = leaks['Leak_PossiblyLost']
+        res.still_reachable_bytes, res.still_reachable_blocks = leaks['Leak_StillReachable']
+        res.in_use_at_exit_bytes = sum(leak[0] for leak in leaks.values())
+        res.in_use_at_exit_blocks = sum(leak[1] for leak in leaks.values())
+        leak_contexts = sum(kinds[kind] for kind in leaks)
+        res.summary_errors = sum(occurrences.values()) + leak_contexts
+        res.summary_contexts = len(occurrences) + leak_contexts
+        res.summary_suppressed_errors, res.summary_suppressed_contexts = suppressed
+        # every block in use at exit is reported as a leak of one of the kinds, even if it is still reachable
+        res.ok = finished and res.in_use_at_exit_blocks == 0
+        logging.debug(f"Valgrind errors by kind: {dict(kinds)}")
+        return res
+
+    @staticmethod
+    def parse_sanitizer_file(res, lines):
+        """
+        Parses the reports of AddressSanitizer, LeakSanitizer and UndefinedBehaviorSanitizer written to stderr
+        by executing a submission compiled with sanitizers. The findings are mapped onto the valgrind fields,
+        so they are reported like valgrind findings.
+
+        Parameters:
+            res (ValgrindOutput object):
+            lines (): Contents of stderr of the execution
+        Returns:
+            res (ValgrindOutput object). Sets in res the values:
+                - ok (like parse_valgrind_file(): True if no memory was leaked, invalid accesses do not matter.
+                  None if the sanitizers failed or aborted the submission before its leaks were checked,
+                  so valgrind has to be used instead)
+                - definitely_lost_bytes (direct leaks, None if there are none)
+                - indirectly_lost_bytes (indirect leaks, None if there are none)
+                - summary_errors
+                - invalid_read_count
+                - invalid_write_count
+        """
+        errors = 0
+        leaks = {b'Direct': 0, b'Indirect': 0}
+        for line in lines:
+            if re_san_failure.match(line) is not None or re_san_abort.match(line) is not None:
+                res.ok = None
+                return res
+            mo = re_san_access.match(line)
+            if mo is not None:
+                if b'READ' in mo.groups():
+                    res.invalid_read_count += 1
+                else:
+                    res.invalid_write_count += 1
+                continue
+            if re_san_error.match(line) is not None or re_san_runtime_error.match(line) is not None:
+                errors += 1
+                continue
+            mo = re_san_leak.match(line)
+            if mo is not None:
+                leaks[mo.group(1)] += int(mo.group(2))
+                continue
+        if leaks[b'Direct'] > 0:
+            res.definitely_lost_bytes = leaks[b'Direct']
+        if leaks[b'Indirect'] > 0:
+            res.indirectly_lost_bytes = leaks[b'Indirect']
+        res.summary_errors = errors
+        res.ok = leaks[b'Direct'] == 0 and leaks[b'Indirect'] == 0
+        return res
+
+    @staticmethod
+    def parse_error_file(testcase_result, workspace):
         """
         Parses error file created when execution students submission.
         
         Parameters:
             
             testcase_result (TestcaseResult object)
+            workspace (Workspace object): Workspace of the execution containing test.stderr and test.stdout
             
         Returns: 
             Nothing. Sets in testcase_result the following parameters:
@@ -161,8 +320,8 @@ class ResultParser:
                 - error_line
         """
         testcase_result.error_msg_quality = 0
-        for discriptor, file_path in [('stderr', 'test.stderr'), ('stdout', 'test.stdout')]:
-            with open(file_path, 'br') as file:
+        for discriptor, file_name in [('stderr', workspace.stderr), ('stdout', workspace.stdout)]:
+            with open(file_name, 'br') as file:
                 for line in file:
                     if testcase_result.error_msg_quality == 0:
                         mo = re_letter.search(line)
@@ -0,0 +1,245 @@
+"""
+Executes commands and measures their resource usage with os.wait4().
+
+Commands are started by long-lived runner processes. A runner is started once, usually as the sudo user
+executing the submissions, and executes one command at a time, so one runner is started for every concurrent execution.
+Submissions therefore no longer pay for starting sudo on every execution, and the runner can kill them
+on timeout without sudo.
+The pipeline talks to its runners over unix sockets. The streams of a command are passed as file descriptors.
+
+The maximum resident set size the kernel reports for a process includes the memory it inherited when it was forked.
+Processes forked by the pipeline itself would therefore report the memory of the whole pipeline.
+The runners only import os, resource, signal, socket and array, which keeps this part small.
+
+A runner runs as the same user as the commands it executes, so a command can signal its runner.
+Commands are started in their own session and process group, so kill(0, ...) only reaches the command
+and the whole group is killed once the command terminated. A command can still kill or stop its runner with kill(-1, ...),
+so the pipeline waits at most RUNNER_GRACE seconds longer than the timeout for an answer. If the runner does not answer,
+it is discarded and the command counts as killed.
+"""
+
+import os
+import sys
+import array
+import signal
+import socket
+import subprocess
+import threading
+import logging
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+# seconds a runner may take to answer after the timeout of the command it executes expired
+RUNNER_GRACE=10
+
+# Code of the runner process. Receives one request per message on the socket passed as its stdin:
+#   cwd \0 hold \0 timeout \0 rlimit_data \0 rlimit_stack \0 rlimit_cpu \0 rlimit_fsize \0 argv...
+# along with the file descriptors of stdin, stdout and stderr of the command.
+# Answers with the pid of the started process and, once it terminated,
+# with its wait status, user time, system time and maximum resident set size.
+# If hold is not empty, the command is only executed once the pipeline sent "1",
+# which gives the pipeline the chance to move the process into a cgroup first. Any other message kills it before it is executed.
+# The command is started in a new session. Its process group is killed after timeout seconds and once the command terminated.
+RUNNER_CODE=r'''
+import os, resource, signal, socket, array
+connection=socket.socket(fileno=0)
+pid=0
+def expire(signum=None, frame=None):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+signal.signal(signal.SIGALRM, expire)
+while True:
+    request, ancdata, _, _=connection.recvmsg(65536, socket.CMSG_SPACE(3*array.array("i").itemsize))
+    if not request:
+        break
+    fields=request.split(b"\0")
+    cwd, hold, timeout, limits, argv=fields[0], fields[1], float(fields[2]), [int(limit) for limit in fields[3:7]], fields[7:]
+    streams=array.array("i")
+    streams.frombytes(ancdata[0][2])
+    release, held=os.pipe()
+    pid=os.fork()
+    if pid==0:
+        try:
+            os.setsid()
+            os.close(held)
+            # returns as soon as the runner closed the other end of the pipe
+            os.read(release, 1)
+            for target, stream in enumerate(streams):
+                os.dup2(stream, target)
+            for stream in streams:
+                os.close(stream)
+            # python ignores these signals, the command has to be started with their default handlers like subprocess does
+            for ignored in (signal.SIGPIPE, signal.SIGXFSZ):
+                signal.signal(ignored, signal.SIG_DFL)
+            os.chdir(cwd)
+            for rlimit, limit in zip((resource.RLIMIT_DATA, resource.RLIMIT_STACK, resource.RLIMIT_CPU, resource.RLIMIT_FSIZE), limits):
+                resource.setrlimit(rlimit, (limit, limit))
+            os.execv(argv[0], argv)
+        finally:
+            os._exit(127)
+    os.close(release)
+    for stream in streams:
+        os.close(stream)
+    connection.send(b"%d" % pid)
+    if hold and connection.recv(1)!=b"1":
+        os.kill(pid, signal.SIGKILL)
+    os.close(held)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    _, status, rusage=os.wait4(pid, 0)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    # processes the command left behind
+    expire()
+    connection.send(b"%d %.6f %.6f %d" % (status, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss))
+'''
+
+
+class Rusage:
+    """
+    Resource usage of a terminated process as measured by a runner. Has the same attribute names as resource.struct_rusage.
+    """
+
+    def __init__(self, ru_utime, ru_stime, ru_maxrss, oom_kill=False):
+        self.ru_utime=ru_utime
+        self.ru_stime=ru_stime
+        self.ru_maxrss=ru_maxrss
+        # set if a process was killed because its cgroup exceeded its memory limit
+        self.oom_kill=oom_kill
+
+
+def runner_command(python=sys.executable, prefix=()):
+    """
+    Returns the command line which starts a runner.
+    Parameters:
+        python (string): python interpreter executing the runner. Has to be executable by the user the runner runs as.
+            Optional.
+        prefix (list of strings): e.g. the sudo command for running the runner as another user. Optional.
+    Returns:
+        List of strings
+    """
+    return list(prefix)+[python, '-I', '-S', '-c', RUNNER_CODE]
+
+
+def exit_code(status):
+    """
+    Converts a wait status to a return code like the one of subprocess.Popen, which is negative if the process
+    was terminated by a signal.
+    Parameters:
+        status (int): wait status
+    Returns:
+        Integer
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class Runner:
+    """
+    A runner process which executes one command at a time.
+    """
+
+    def __init__(self, command):
+        """
+        Starts a runner.
+        Parameters:
+            command (list of strings): command line starting the runner, see runner_command()
+        """
+        self.connection, runner_connection=socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.process=subprocess.Popen(command, stdin=runner_connection)
+        runner_connection.close()
+        # set once the runner did not answer, it must not be used again
+        self.broken=False
+
+    def run(self, command, stdin, stdout, stderr, limits, cwd, timeout, cgroup=None):
+        """
+        Executes a command and waits until it terminated.
+        Parameters:
+            command (list of strings): command to execute. The executable has to be given by its path.
+            stdin, stdout, stderr (file objects): streams of the command
+            limits (list of ints): limits for the data segment, the stack size, the CPU time and the size of written files
+            cwd (string): working directory of the command
+            timeout (float): seconds after which the command is killed
+            cgroup (string): cgroup.procs file of the cgroup the command is executed in. Optional.
+        Returns:
+            status (int): wait status of the command. If the runner did not answer, the status of a process
+                killed by SIGKILL, so the command counts as timeout.
+            rusage (Rusage object): resource usage of the command
+        """
+        request='\0'.join([cwd, '1' if cgroup else '', str(timeout)]+[str(limit) for limit in limits]+command)
+        streams=array.array('i', [stream.fileno() for stream in (stdin, stdout, stderr)])
+        self.connection.settimeout(timeout+RUNNER_GRACE)
+        cgroup_error=None
+        try:
+            self.connection.sendmsg([request.encode()], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, streams)])
+            pid=int(self.connection.recv(64))
+            if cgroup:
+                try:
+                    with open(cgroup, 'w') as f:
+                        f.write(str(pid))
+                except OSError as e:
+                    cgroup_error=e
+                # a command outside of its cgroup would escape its limits, so it is killed instead of released
+                self.connection.send(b'1' if cgroup_error is None else b'0')
+            answer=self.connection.recv(256).split()
+            status, rusage=int(answer[0]), Rusage(float(answer[1]), float(answer[2]), int(answer[3]))
+        except (OSError, ValueError, IndexError) as e:
+            # socket.timeout is an OSError, an empty answer of a terminated runner fails to parse
+            logging.warning(f"Runner {self.process.pid} did not answer ({e!r}), it is discarded")
+            self.close()
+            return signal.SIGKILL, Rusage(0, 0, 0)
+        if cgroup_error is not None:
+            raise cgroup_error
+        return status, rusage
+
+    def close(self):
+        """
+        Discards the runner. A runner which was stopped is killed, a runner executed by sudo terminates
+        once it is continued and finds its connection closed.
+        Returns: Nothing
+        """
+        self.broken=True
+        self.connection.close()
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+
+# runners which are currently not executing a command by the command line they were started with,
+# and the process they belong to
+idle_runners={}
+idle_runners_pid=None
+idle_runners_lock=threading.Lock()
+
+
+def run_measured(runner, command, stdin, stdout, stderr, limits, cwd, timeout, cgroup=None):
+    """
+    Executes a command using an idle runner, a new runner is started if there is none.
+    Can be called from several threads at the same time.
+    Parameters:
+        runner (list of strings): command line starting the runner, see runner_command()
+        other parameters: see Runner.run()
+    Returns:
+        status (int): wait status of the command
+        rusage (Rusage object): resource usage of the command
+    """
+    global idle_runners, idle_runners_pid
+    key=tuple(runner)
+    with idle_runners_lock:
+        # runners inherited from the parent of a forked worker process must not be used
+        if idle_runners_pid!=os.getpid():
+            idle_runners, idle_runners_pid={}, os.getpid()
+        idle=idle_runners.setdefault(key, [])
+        process=idle.pop() if idle else Runner(runner)
+    try:
+        result=process.run(command, stdin, stdout, stderr, limits, cwd, timeout, cgroup)
+    except BaseException:
+        process.close()
+        raise
+    if not process.broken:
+        with idle_runners_lock:
+            idle_runners[key].append(process)
+    return result
@@ -0,0 +1,128 @@
+"""
+Workspaces are private directories in which submissions are compiled and executed.
+Every submission and every execution of a testcase gets its own workspace, so several checks can run
+at the same time without overwriting each other's files.
+Workspaces are created below WORKSPACE_ROOT, which should be located on a tmpfs like /dev/shm.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import logging
+
+FORMAT="[%(filename)s:%(lineno)s - %(funcName)s() ] %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+EXECUTABLE_NAME='loesung'
+# executable compiled with sanitizers, see logic.retrieve_and_compile.compile_sanitizer()
+SANITIZER_EXECUTABLE_NAME='loesung_sanitizer'
+
+
+class Workspace:
+    """
+    A uniquely named directory which is removed with all its contents when the workspace is closed.
+    Can be used as a context manager.
+    All paths used while compiling or executing a submission are taken from a workspace.
+    """
+
+    def __init__(self, root=None, sudo=None, prefix='check_'):
+        """
+        Creates a new workspace.
+        Parameters:
+            root (string): Directory the workspace is created in. If it does not exist,
+                the default directory for temporary files is used. Optional.
+            sudo (list of strings): sudo command for the user executing the submissions.
+                Used to remove files this user created in the workspace. Optional.
+            prefix (string): Prefix of the name of the directory. Optional.
+        """
+        if root is not None and not os.path.isdir(root):
+            logging.warning(f"Workspace root {root} does not exist. Using {tempfile.gettempdir()} instead.")
+            root=None
+        self.sudo=sudo
+        self.path=tempfile.mkdtemp(prefix=prefix, dir=root)
+        # The sudo user has to be able to write its valgrind logs to the workspace. The sticky bit prevents
+        # submissions from removing or replacing files of the pipeline, like the executable and the output files,
+        # in this or in another workspace checked at the same time.
+        os.chmod(self.path, 0o1777)
+        # directory containing the executable, which is used as working directory for the executions
+        self.executable_dir=self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "(Workspace: "+self.path+")"
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def executable(self):
+        return os.path.join(self.executable_dir, EXECUTABLE_NAME)
+
+    @property
+    def sanitizer_executable(self):
+        return os.path.join(self.executable_dir, SANITIZER_EXECUTABLE_NAME)
+
+    @property
+    def stdout(self):
+        return self.file('test.stdout')
+
+    @property
+    def stderr(self):
+        return self.file('test.stderr')
+
+    @property
+    def valgrind_out(self):
+        return self.file('test.valgrind.out')
+
+    @property
+    def valgrind_xml(self):
+        return self.file('test.valgrind.xml')
+
+    @property
+    def sanitizer_out(self):
+        return self.file('test.sanitizer')
+
+    def file(self, name):
+        """
+        Returns the path of a file inside the workspace.
+        Parameters:
+            name (string): name of the file
+        Returns:
+            path (string)
+        """
+        return os.path.join(self.path, name)
+
+    def create(self, prefix='exec_'):
+        """
+        Creates a workspace for a single execution inside this workspace.
+        The new workspace uses the executable of this workspace.
+        Parameters:
+            prefix (string): Prefix of the name of the directory. Optional.
+        Returns:
+            Workspace object
+        """
+        workspace=Workspace(self.path, self.sudo, prefix)
+        workspace.executable_dir=self.executable_dir
+        return workspace
+
+    def close(self):
+        """
+        Removes the workspace and all files in it.
+        Directories created by the executed submission belong to the sudo user, so their contents are
+        removed as this user before the workspace itself is removed.
+        Parameters: None
+        Returns: Nothing
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        if os.path.exists(self.path) and self.sudo is not None:
+            subprocess.call(self.sudo+['rm', '-rf', self.path], stderr=subprocess.DEVNULL)
+            shutil.rmtree(self.path, ignore_errors=True)
+        if os.path.exists(self.path):
+            logging.warning(f"Unable to remove workspace {self.path}")